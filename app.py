@@ -2,116 +2,644 @@
 
 # Run this app with `python app.py` and
 # visit http://127.0.0.1:8050/ in your web browser.
-from mimetypes import init
 import os
 import logging
+import signal
+import threading
 import json
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import replace
 from datetime import datetime, timedelta
 import dash
-from dash_bootstrap_components._components.Input import Input
 from dash import dcc
 from dash import html
-import plotly.express as px
-import pandas as pd
 import dash_bootstrap_components as dbc
-import requests
 from dash.dependencies import Input, Output, State, MATCH, ALL 
+from flask import Response, stream_with_context, request, jsonify, abort, g
 
 # Import Utility Functions
-from utility.present import body_present, need_ui
-from utility.control_functions import control_circuit, control_heater_setpoint, control_heater_status, control_lights
+from utility.present import body_active, body_setpoint, body_heat_mode, circuit_state
+from utility.installation import Installation, parse_installations, history_path
+from utility.shared_state import (
+    CommandServer, OwnerClient, SnapshotPublisher, WorkerInstallation, command_socket_path, read_owner_metrics
+)
+from utility.poll_schedule import AdaptiveSchedule
+from utility.snapshot_diff import changed_under
+from utility.history_charts import HISTORY_WINDOWS
+from utility.energy import Tariff, PERIOD_FORMATS
+from utility.view_model import INTERFACE_FEATURE
+from utility.memo import builder_cache_stats
+from utility.metrics import REGISTRY, merge_families, render_families, timed_callback, with_labels
+from utility.profiling import PROFILER, profiled
+from utility.response_cache import ResponseCache
+from utility.batch import parse_operations
+from utility.scenes import SceneStore, scene_from_view
+from utility.logs import configure_logging, RATE_LIMITED
 
 # Import UI elements
-from ui_elements.header import generate_header_layout
-from ui_elements.common import generate_feature_controls
-from ui_elements.body import generate_body_info_layout
-from ui_elements.lights import generate_lights_layout
-from ui_elements.features import gen_features_pumps_cards
+from ui_elements.header import generate_header_layout, header_status
+from ui_elements.body import generate_body_info_layout, body_status_classes, body_water_temp
+from ui_elements.lights import generate_lights_layout, lights_status_classes
+from ui_elements.features import gen_features_pumps_cards, pump_cell_values
+from ui_elements.history import generate_history_card
+from ui_elements.overview import generate_installation_card
+from ui_elements.skeleton import generate_skeleton_layout
+from ui_elements.scenes import generate_scenes_card, scene_options
 
 from dotenv import load_dotenv
 
 load_dotenv()  # take environment variables from .env.
 
-logging.basicConfig(level=logging.DEBUG)
+configure_logging()
 
-# How often to poll api
-# Set to -1 to disable polling
+# How often browsers check for new data
+# Set to -1 for push only mode (browsers only update on server push events)
 UPDATE_INTERVAL =  int(os.getenv('UPDATE_INTERVAL', 5))
+# How often the server polls the api, defaults to UPDATE_INTERVAL (or 5 in push only mode)
+POLL_INTERVAL = int(os.getenv('POLL_INTERVAL', UPDATE_INTERVAL if UPDATE_INTERVAL > 0 else 5))
+# Adaptive polling: never faster/slower than these, and how long to poll fast after a command
+POLL_MIN_INTERVAL = float(os.getenv('POLL_MIN_INTERVAL', min(1, POLL_INTERVAL)))
+POLL_MAX_INTERVAL = float(os.getenv('POLL_MAX_INTERVAL', max(60, POLL_INTERVAL)))
+POLL_BURST_SECONDS = float(os.getenv('POLL_BURST_SECONDS', 10))
+# Seconds without any page reading the data before polling drops to POLL_MAX_INTERVAL
+POLL_IDLE_AFTER = float(os.getenv('POLL_IDLE_AFTER', 120))
+# Stream change events to browsers over Server-Sent Events
+PUSH_UPDATES = os.getenv('PUSH_UPDATES', '1') != '0'
 # Number of polls before data reported as stale
-STALE_INTERVAL = timedelta(seconds = UPDATE_INTERVAL * 5)
+STALE_INTERVAL = timedelta(seconds = POLL_INTERVAL * 5)
+# Share serialized (and gzip compressed) interval responses between pages in the same state
+RESPONSE_CACHE = os.getenv('RESPONSE_CACHE', '1') != '0'
+# SQLite file for temperature/pump history, set to an empty string to disable
+HISTORY_DB = os.getenv('HISTORY_DB', 'pool_history.sqlite3')
+# Electricity price per kWh for pump energy costs, a number or a JSON tariff schedule
+ENERGY_TARIFF = os.getenv('ENERGY_TARIFF', '')
+# Longer gaps between fetches are counted as unmetered. Idle polling and
+# failure backoff both wait up to POLL_MAX_INTERVAL; half of that again
+# covers the fetch itself, its retries and late wakeups.
+ENERGY_MAX_GAP = float(os.getenv('ENERGY_MAX_GAP', max(POLL_INTERVAL * 3, POLL_MAX_INTERVAL * 1.5)))
+# Commands of one batch (or scene) sent to a bridge at the same time
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 4))
+# Seconds a request waits for its batch to finish
+BATCH_TIMEOUT = float(os.getenv('BATCH_TIMEOUT', 60))
+# JSON file the scene presets are kept in, set to an empty string to disable scenes
+SCENES_FILE = os.getenv('SCENES_FILE', 'scenes.json')
+# Profile callbacks, builders and backend calls from startup
+PROFILING = os.getenv('PROFILING', '0') != '0'
+# Serve the /debug/profile routes (start and stop profiling, stacks and memory
+# dumps). They have no authentication, so they are off unless asked for.
+PROFILING_ENABLED = PROFILING or os.getenv('PROFILING_ENABLED', '0') != '0'
+# Multi-worker mode (see gunicorn.conf.py): 'owner' for the one process that polls
+# and sends commands, 'worker' for the web workers; unset for a single process
+WORKER_ROLE = os.getenv('WORKER_ROLE', '')
+# Directory the owner shares snapshots and its command socket in
+SHARED_STATE_DIR = os.getenv('SHARED_STATE_DIR', '')
+if WORKER_ROLE and not SHARED_STATE_DIR:
+    raise RuntimeError('WORKER_ROLE needs SHARED_STATE_DIR')
 # Internal ScreenLogic data refers to pool & spa as 'bodies'
 SUPPORTED_BODY_TYPES = ['pool', 'spa']
 
-current_pool_data = {}
-last_update = datetime.now()
-feature_control_ids = []
 # Override UPDATE_INTERVAL with an environment variable
 
-logging.info(f"Update Interval is {UPDATE_INTERVAL}")
-POOL_API_URL = os.getenv('API_BASE_URL', '')
-logging.info(f"Pool API Base URL is {POOL_API_URL}")
+logging.info('Update Interval is %s, Poll Interval is %s', UPDATE_INTERVAL, POLL_INTERVAL)
+# Serve several bridges from one process with API_BASE_URLS=name=url,name=url
+POOL_API_URLS = parse_installations(os.getenv('API_BASE_URLS', ''), os.getenv('API_BASE_URL', ''))
+logging.info('Pool API Base URLs are %s', POOL_API_URLS)
 # Get external stylesheets
 external_stylesheets = [dbc.icons.FONT_AWESOME, dbc.themes.BOOTSTRAP]
-logging.info(f'External Stylesheets to be retrieved: {external_stylesheets}')
+logging.debug('External Stylesheets to be retrieved: %s', external_stylesheets)
 
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets, suppress_callback_exceptions=True)
+# WSGI entry point, e.g. for gunicorn
+server = app.server
 # This will grab the global data object from the API
 # Other functions will refine that data
 
-def refresh_pool_data():
-    '''Grab the current Pool/Spa data from the API'''
-    global current_pool_data
-    global last_update
-    logging.info(f'Calling backend API at {POOL_API_URL}/all')
-    api_request = requests.get(f'{POOL_API_URL}/all', timeout=0.1)
-    api_request.raise_for_status()
-    # api_request.close()
-    logging.debug(f'API call status = {api_request.status_code}')
-    if api_request.status_code == 200:
-        current_pool_data = api_request.json()
-        last_update = datetime.now()
-        return True
-    
-    return False
-
-
-# This will be scheduled via the interval-component
+installations = {}
+owner_client = OwnerClient(command_socket_path(SHARED_STATE_DIR)) if WORKER_ROLE == 'worker' else None
+for name, api_url in POOL_API_URLS.items():
+    if owner_client is not None:
+        installation = WorkerInstallation(name, api_url, POLL_INTERVAL, SHARED_STATE_DIR, owner_client)
+    else:
+        schedule = AdaptiveSchedule(
+            POLL_INTERVAL, min_interval=POLL_MIN_INTERVAL, max_interval=POLL_MAX_INTERVAL,
+            burst_duration=POLL_BURST_SECONDS, idle_after=POLL_IDLE_AFTER
+        )
+        installation = Installation(name, api_url, POLL_INTERVAL, schedule, batch_concurrency=BATCH_CONCURRENCY)
+    # Before any other listener, so they all see the equipment of the snapshot they get
+    installation.watch_equipment(SUPPORTED_BODY_TYPES)
+    if HISTORY_DB:
+        installation.enable_history(
+            history_path(HISTORY_DB, name, shared=len(POOL_API_URLS) > 1),
+            Tariff.from_setting(ENERGY_TARIFF),
+            max_gap=ENERGY_MAX_GAP
+        )
+    if PUSH_UPDATES:
+        installation.enable_push()
+    installations[name] = installation
+# With several bridges / is an overview and each one has its own page
+MULTI_INSTALLATION = len(installations) > 1
+scene_store = SceneStore(SCENES_FILE) if SCENES_FILE else None
+
+def route_installation(name=None) -> Installation:
+    '''Installation named in a URL, or the only one when there is a single bridge'''
+    if name is None and not MULTI_INSTALLATION:
+        return next(iter(installations.values()))
+    if name not in installations:
+        abort(404)
+    return installations[name]
+
+if HISTORY_DB:
+    @app.server.route('/api/energy')
+    def energy_summary():
+        '''kWh and cost per pump, e.g. /api/energy?period=day&days=30&installation=pool'''
+        installation = route_installation(request.args.get('installation'))
+        period = request.args.get('period', 'day')
+        if period not in PERIOD_FORMATS:
+            return jsonify(error=f'period must be one of {", ".join(PERIOD_FORMATS)}'), 400
+        try:
+            days = float(request.args.get('days', 30))
+        except ValueError:
+            return jsonify(error='days must be a number'), 400
+        return jsonify(installation.energy.summary(period, start=datetime.now().timestamp() - days * 86400))
+
+def batch_response(installation, items, stop_on_failure=True):
+    '''Validate and run a batch, answering with each operation's result.
+        The request waits up to BATCH_TIMEOUT for the batch, holding its
+        server thread meanwhile; commanded values show on every page
+        straight away. With ?wait=0 it answers 202 as soon as the batch is
+        queued, and failed or skipped commands are only reported like other
+        command errors, on the pages.
+    '''
+    try:
+        operations = parse_operations(items, installation.poller.view)
+    except ValueError as err:
+        return jsonify(error=str(err)), 400
+    started = time.perf_counter()
+    future = installation.run_batch(operations, stop_on_failure)
+    queued = [operation.as_dict() for operation in operations]
+    if request.args.get('wait', '1') == '0':
+        return jsonify(queued=queued), 202
+    try:
+        results = future.result(timeout=BATCH_TIMEOUT)
+    except FutureTimeoutError:
+        # The batch carries on; its outcome shows on the pages
+        return jsonify(error=f'The batch did not finish within {BATCH_TIMEOUT:g} seconds', queued=queued), 504
+    return jsonify(
+        ok=all(result['status'] == 'ok' for result in results),
+        seconds=round(time.perf_counter() - started, 3),
+        results=results
+    )
+
+@app.server.route('/api/batch', methods=['POST'])
+def batch_commands():
+    '''Send several commands in one request, e.g. POST /api/batch?installation=pool
+        {"operations": [{"type": "circuit", "circuit_id": 505, "value": 1}, ...], "stop_on_failure": true}
+        See utility.batch.parse_operations for the operation types.
+        Answers {"ok", "seconds", "results"} once every command finished,
+        or 202 {"queued"} straight away with ?wait=0.
+    '''
+    installation = route_installation(request.args.get('installation'))
+    document = request.get_json(silent=True) or {}
+    return batch_response(installation, document.get('operations'), bool(document.get('stop_on_failure', True)))
+
+if scene_store is not None:
+    @app.server.route('/api/scenes')
+    def list_scenes():
+        '''Saved scenes and their operations, e.g. /api/scenes?installation=pool'''
+        installation = route_installation(request.args.get('installation'))
+        return jsonify(scene_store.scenes(installation.name))
+
+    @app.server.route('/api/scenes/<scene>', methods=['PUT', 'DELETE'])
+    def edit_scene(scene):
+        '''Save a scene ({"operations": [...]}) or delete it'''
+        installation = route_installation(request.args.get('installation'))
+        if request.method == 'DELETE':
+            if not scene_store.delete(installation.name, scene):
+                abort(404)
+            return jsonify(deleted=scene)
+        operations = (request.get_json(silent=True) or {}).get('operations')
+        try:
+            parse_operations(operations, installation.poller.view)
+        except ValueError as err:
+            return jsonify(error=str(err)), 400
+        scene_store.save(installation.name, scene, operations)
+        return jsonify(saved=scene)
+
+    @app.server.route('/api/scenes/<scene>/apply', methods=['POST'])
+    def apply_scene_api(scene):
+        '''Run a saved scene as a batch, answering like /api/batch'''
+        installation = route_installation(request.args.get('installation'))
+        operations = scene_store.get(installation.name, scene)
+        if operations is None:
+            abort(404)
+        return batch_response(installation, operations)
+
+if PUSH_UPDATES:
+    @app.server.route('/events')
+    @app.server.route('/events/<name>')
+    def stream_events(name=None):
+        '''Server-Sent Events stream of snapshot changes, see assets/push.js'''
+        installation = route_installation(name)
+        poller = installation.poller
+
+        def current_version():
+            # Sent with every heartbeat; an open stream counts as a page reading the data
+            poller.touch()
+            return poller.snapshot.version
+
+        return Response(
+            stream_with_context(installation.push_events.stream(current_version)),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+def collect_metrics():
+    '''Gauges and counters read from the installations on each /metrics scrape'''
+    if WORKER_ROLE != 'owner':
+        yield from collect_page_metrics()
+    if WORKER_ROLE != 'worker':
+        # With several workers, polls and history belong to the owner alone
+        yield from collect_poll_metrics()
+
+def collect_page_metrics():
+    if PUSH_UPDATES:
+        yield 'screenlogic_push_clients', 'gauge', 'Connected Server-Sent Events streams', [
+            ({'installation': name}, installation.push_events.client_count) for name, installation in installations.items()
+        ]
+    cache_stats = builder_cache_stats()
+    for key in ('hits', 'misses'):
+        yield f'screenlogic_builder_cache_{key}_total', 'counter', f'Card builder cache {key}', [
+            ({'builder': builder}, builder_stats[key]) for builder, builder_stats in cache_stats.items()
+        ]
+
+def collect_poll_metrics():
+    now = datetime.now()
+    stats = {name: installation.poller.stats() for name, installation in installations.items()}
+    yield 'screenlogic_snapshot_age_seconds', 'gauge', 'Seconds since the last successful fetch', [
+        ({'installation': name}, (now - poller_stats['last_success']).total_seconds() if poller_stats['last_success'] else None)
+        for name, poller_stats in stats.items()
+    ]
+    yield 'screenlogic_snapshot_version', 'gauge', 'Current snapshot version', [
+        ({'installation': name}, poller_stats['version']) for name, poller_stats in stats.items()
+    ]
+    yield 'screenlogic_poll_interval_seconds', 'gauge', 'Effective polling interval and why', [
+        ({'installation': name, 'reason': poller_stats['schedule_reason']}, poller_stats['effective_interval'])
+        for name, poller_stats in stats.items()
+    ]
+    for key, metric, help_text in (
+        ('total_polls', 'screenlogic_polls_total', 'Fetches of /all'),
+        ('total_failures', 'screenlogic_poll_failures_total', 'Failed fetches of /all'),
+        ('unchanged_polls', 'screenlogic_unchanged_polls_total', 'Fetches of /all that changed nothing')
+    ):
+        yield metric, 'counter', help_text, [
+            ({'installation': name}, poller_stats[key]) for name, poller_stats in stats.items()
+        ]
+    yield 'screenlogic_backend_circuit_open', 'gauge', '1 while calls to the bridge are paused', [
+        ({'installation': name}, int(poller_stats['circuit_open'])) for name, poller_stats in stats.items()
+    ]
+    if HISTORY_DB:
+        for key, metric, kind in (
+            ('queued', 'screenlogic_history_queued', 'gauge'),
+            ('written', 'screenlogic_history_written_total', 'counter'),
+            ('dropped', 'screenlogic_history_dropped_total', 'counter')
+        ):
+            yield metric, kind, f'History samples {key}', [
+                ({'installation': name}, installation.history.stats()[key]) for name, installation in installations.items()
+            ]
+
+REGISTRY.add_collector(collect_metrics)
+
+@app.server.route('/metrics')
+def metrics():
+    '''Prometheus text format metrics.
+        With several workers, each sample has a process label: the owner's
+        polls and bridge calls come from the file it writes, and every other
+        sample is this worker's own; sum over process for the whole server.
+    '''
+    if WORKER_ROLE == 'worker':
+        text = render_families(merge_families(
+            read_owner_metrics(SHARED_STATE_DIR),
+            with_labels(REGISTRY.collect(), process=f'worker-{os.getpid()}')
+        ))
+    else:
+        text = REGISTRY.render()
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+@app.server.before_request
+def start_request_profile():
+    if PROFILER.enabled:
+        g.profile_started = time.perf_counter()
+
+@app.server.after_request
+def record_request_profile(response):
+    # Covers the callback plus Dash's dispatch and JSON serialization
+    started = g.pop('profile_started', None)
+    if started is not None:
+        PROFILER.record('request', request.path, time.perf_counter() - started)
+    return response
+
+if PROFILING_ENABLED:
+    @app.server.route('/debug/profile')
+    def profile_stats():
+        '''Per call timings recorded since profiling was started'''
+        return jsonify(enabled=PROFILER.enabled, started=PROFILER.started, calls=PROFILER.call_stats())
+
+    @app.server.route('/debug/profile/start', methods=['POST'])
+    def start_profile():
+        '''Start profiling, e.g. /debug/profile/start?sample_interval=0.005&memory=1'''
+        try:
+            sample_interval = float(request.args.get('sample_interval', 0)) or None
+        except ValueError:
+            return jsonify(error='sample_interval must be a number'), 400
+        PROFILER.start(sample_interval, trace_memory=request.args.get('memory', '0') != '0')
+        return jsonify(enabled=True, sample_interval=PROFILER.sample_interval, window=PROFILER.window)
+
+    @app.server.route('/debug/profile/stop', methods=['POST'])
+    def stop_profile():
+        PROFILER.stop()
+        return jsonify(enabled=False)
+
+    @app.server.route('/debug/profile/flamegraph')
+    def profile_flamegraph():
+        '''Sampled stacks of the last ?seconds= (default the whole window) in the
+            collapsed format, e.g. for flamegraph.pl or https://www.speedscope.app.
+            ?idle=1 keeps threads that were only waiting.
+        '''
+        try:
+            seconds = float(request.args.get('seconds', 0)) or None
+        except ValueError:
+            return jsonify(error='seconds must be a number'), 400
+        name = datetime.now().strftime('screenlogic-%Y%m%d-%H%M%S.collapsed')
+        return Response(
+            PROFILER.collapsed(seconds, idle=request.args.get('idle', '0') != '0'),
+            mimetype='text/plain',
+            headers={'Content-Disposition': f'attachment; filename={name}'}
+        )
+
+    @app.server.route('/debug/profile/memory')
+    def profile_memory():
+        '''Where traced memory is held, when profiling was started with memory=1'''
+        try:
+            limit = int(request.args.get('limit', 25))
+        except ValueError:
+            return jsonify(error='limit must be a whole number'), 400
+        return jsonify(top=PROFILER.memory_top(limit))
+
+def start_pollers():
+    '''Fetch from every bridge in the background; pages start as a skeleton until data arrives'''
+    for installation in installations.values():
+        installation.poller.start()
+
+def run_owner():
+    '''Main loop of the owner process in multi-worker mode, started by gunicorn.conf.py.
+        Shares the snapshots with the workers and runs the commands they send
+        until SIGTERM, then flushes the history.
+    '''
+    SnapshotPublisher(SHARED_STATE_DIR, installations).start()
+    CommandServer(command_socket_path(SHARED_STATE_DIR), installations).start()
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stopping.set())
+    signal.signal(signal.SIGINT, lambda *args: stopping.set())
+    while not stopping.wait(1):
+        pass
+    logging.info('Owner process stopping')
+    for installation in installations.values():
+        if installation.history is not None:
+            installation.history.stop(timeout=10)
+
+
+# This will be scheduled via the interval-component, and by server push events
+# The page layout is only built when a browser loads the page; every tick
+# after that just sends the properties that follow the pool state.
 @app.callback(
-    [
-        Output('ConnectedStatus', 'className'),
-        Output('ConnectedStatusTT', 'children'),
-        Output('pageLayout', 'children')
-    ],
-    Input('interval-component', 'n_intervals')
+    output=dict(
+        connected_class=Output('ConnectedStatus', 'className'),
+        connected_tt=Output('ConnectedStatusTT', 'children'),
+        freeze_hidden=Output('FreezeModeStatus', 'hidden'),
+        service_hidden=Output('ServiceModeStatus', 'hidden'),
+        delay_hidden=Output('DelayStatus', 'hidden'),
+        lights_hidden=Output('LightsStatus', 'hidden'),
+        air_temp=Output('outsideTemp', 'children'),
+        water_temps=Output({'type': 'water-temp', 'body': ALL}, 'children'),
+        body_cards=Output({'type': 'body-card', 'body': ALL}, 'className'),
+        body_icons=Output({'type': 'body-icon', 'body': ALL}, 'className'),
+        heater_icons=Output({'type': 'heater-icon', 'body': ALL}, 'className'),
+        power_icons=Output({'type': 'power-button-icon', 'circuitId': ALL, 'body_name': ALL}, 'className', allow_duplicate=True),
+        heater_modes=Output({'type': 'heater-function-buttons', 'body': ALL}, 'value', allow_duplicate=True),
+        setpoint_sliders=Output({'type': 'setpoint-slider', 'id': ALL, 'body': ALL}, 'value', allow_duplicate=True),
+        setpoint_labels=Output({'type': 'setpoint-label', 'id': ALL, 'body': ALL}, 'children', allow_duplicate=True),
+        feature_toggles=Output({'type': 'feature-toggle', 'circuitId': ALL}, 'value', allow_duplicate=True),
+        pump_cells=Output({'type': 'pump-cell', 'pump': ALL, 'field': ALL}, 'children'),
+        lights_card=Output('lights-card', 'class_name'),
+        lights_icon=Output('lights-card-icon', 'className'),
+        lights_power=Output({'type': 'power-button-icon', 'id': 'lights-power-icon'}, 'className'),
+        seen_version=Output('snapshot-version', 'data'),
+        error_open=Output('command-error-toast', 'is_open'),
+        error_text=Output('command-error-toast', 'children'),
+        seen_error=Output('command-error-seq', 'data')
+    ),
+    inputs=dict(
+        n=Input('interval-component', 'n_intervals'),
+        pushed=Input('push-event', 'data'),
+        seen_version=State('snapshot-version', 'data'),
+        seen_error=State('command-error-seq', 'data'),
+        installation=State('installation', 'data')
+    ),
+    prevent_initial_call=True
     )
-def get_pool_data_every(n):
+@timed_callback
+def get_pool_data_every(n, pushed, seen_version, seen_error, installation):
+    installation = installations[installation]
+    poller = installation.poller
+    state_store = installation.state_store
     status_classname = "fa fa-lg mb-1 icon ms-2 me-2 flex-nowrap text-light"
-    success = refresh_pool_data()
-    stale_data = bool((datetime.now() - last_update) > STALE_INTERVAL )
+    # Callbacks only read the shared snapshot; the poller does the fetching
+    poller.touch()
+    stale_data = poller.is_stale(STALE_INTERVAL)
     tt_text = ''
     if not stale_data:
         status_classname += ' fa-eye'
         tt_text = 'Connected to API'
-        logging.info('Pool Data Refreshed')
+        logging.debug('Pool Data Refreshed', extra=RATE_LIMITED)
     else:
         status_classname += ' fa-eye-slash'
-        logging.info('Failed to refresh data')
-        tt_text = 'Connection to API failed'
-    page_layout = make_layout(UPDATE_INTERVAL)
-    return status_classname, tt_text, page_layout
+        logging.warning('Showing stale pool data, %s failed polls', poller.consecutive_failures, extra=RATE_LIMITED)
+        tt_text = f'Connection to API failed ({poller.consecutive_failures} failed polls)'
+    # Roll back commands that were never confirmed, even if nothing was polled since
+    state_store.reconcile()
+    error_seq, errors = state_store.errors_since(seen_error)
+    snapshot = poller.snapshot
+    updates = dict(
+        connected_class=status_classname,
+        connected_tt=tt_text,
+        seen_version=snapshot.version,
+        error_open=True if errors else dash.no_update,
+        error_text=[html.P(message) for message in errors] if errors else dash.no_update,
+        seen_error=error_seq
+    )
+    if seen_version == snapshot.version:
+        # This browser already shows this snapshot
+        outputs = dash.callback_context.outputs_grouping
+        updates.update({key: no_update_for(outputs[key]) for key in UPDATE_GROUPS})
+        return updates
+    # While the poller still has the changesets since the version this
+    # browser shows, only the affected outputs need sending.
+    changes = poller.changes_since(seen_version)
+    updates.update(make_updates(state_store, snapshot.view, dash.callback_context.outputs_grouping, changes))
+    return updates
 
-# Get initial data
-refresh_pool_data()
+# The Dash output key get_pool_data_every is registered under
+POOL_UPDATE_OUTPUT = next(output for output in app.callback_map if 'snapshot-version.data' in output)
+pool_update_cache = ResponseCache()
 
-# Figure out (from the pool data) which bodies I need to create a card for
-bodies_present = []
-for body in SUPPORTED_BODY_TYPES:
-    if body_present(body, current_pool_data):
-        bodies_present.append(body)
-logging.info(f'Bodies Detected: {bodies_present}')
+def pool_update_key(body: dict):
+    '''Everything a get_pool_data_every response depends on, None for other requests.
+        Pages with the same cards, at the same point relative to the current
+        snapshot, get the same response, whatever their n_intervals.
+    '''
+    if body.get('output') != POOL_UPDATE_OUTPUT:
+        return None
+    state = {item['id']: item.get('value') for item in body.get('state', [])}
+    installation = installations.get(state.get('installation'))
+    if installation is None:
+        return None
+    poller = installation.poller
+    # The callback's side effects, which must happen on a cache hit too
+    poller.touch()
+    installation.state_store.reconcile()
+    version = poller.snapshot.version
+    seen_version = state.get('snapshot-version')
+    if seen_version == version:
+        position = 'current'
+    elif poller.changes_since(seen_version) is not None:
+        # A partial update, which depends on where this page is
+        position = seen_version
+    else:
+        position = 'full'
+    stale = poller.is_stale(STALE_INTERVAL)
+    return (
+        installation.name, version, position, state.get('command-error-seq'),
+        poller.consecutive_failures if stale else None,
+        json.dumps(body.get('outputs'), sort_keys=True)
+    )
+
+def send_cached(entry, response=None):
+    '''entry's bytes, compressed if the client accepts it, in response or a new one'''
+    if response is None:
+        response = Response(entry.body, mimetype='application/json')
+    encoding = pool_update_cache.encoding_for(entry, request.headers.get('Accept-Encoding', ''))
+    if encoding is not None:
+        response.set_data(entry.encoded(encoding))
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+if RESPONSE_CACHE:
+    @app.server.before_request
+    def serve_cached_pool_update():
+        if request.method != 'POST' or request.path != '/_dash-update-component':
+            return None
+        key = pool_update_key(request.get_json(silent=True) or {})
+        if key is None:
+            return None
+        entry = pool_update_cache.get(key)
+        if entry is None:
+            g.pool_update_key = key
+            return None
+        return send_cached(entry)
+
+    @app.server.after_request
+    def store_pool_update(response):
+        key = g.pop('pool_update_key', None)
+        if key is None or response.status_code != 200:
+            return response
+        # A response built while a new snapshot arrived may be for either version
+        if installations[key[0]].poller.snapshot.version != key[1]:
+            return response
+        return send_cached(pool_update_cache.put(key, response.get_data()), response)
+
+def no_update_for(output):
+    '''no_update shaped for a single or a wildcard (list of ids) Output'''
+    if isinstance(output, list):
+        return [dash.no_update] * len(output)
+    return dash.no_update
+
+# Which parts of the ScreenLogic payload each interval output is derived from
+UPDATE_GROUPS = {
+    'freeze_hidden': ('meta',),
+    'service_hidden': ('meta',),
+    'delay_hidden': ('meta',),
+    'lights_hidden': ('meta',),
+    'air_temp': ('meta',),
+    'water_temps': ('status.bodies[*].waterTemp', 'status.bodies[*].tempScale'),
+    'body_cards': ('status.bodies[*].active',),
+    'body_icons': ('status.bodies[*].active',),
+    'heater_icons': ('status.bodies[*].heater.active',),
+    'power_icons': ('status.bodies[*].active',),
+    # Resending these resets a slider or button group the user is working on
+    'heater_modes': ('status.bodies[*].modeCode',),
+    'setpoint_sliders': ('status.bodies[*].heater.setpoint.current',),
+    'setpoint_labels': ('status.bodies[*].heater.setpoint.current',),
+    'feature_toggles': ('controllerConfig.bodyArray[*].state',),
+    'pump_cells': ('status.pumps',),
+    'lights_card': ('meta',),
+    'lights_icon': ('meta',),
+    'lights_power': ('meta',)
+}
+
+@profiled()
+def make_updates(state_store, view, outputs, changes=None):
+    '''Compute the new value of every pool-state property rendered in the page.
+        outputs is the callback's outputs_grouping, which lists the ids the
+        browser actually has for each pattern-matched Output.
+        When a changeset is given, outputs it does not touch are left as no_update.
+    '''
+    # Show commanded values over the polled ones until they are confirmed
+    bodies = {
+        body.name: replace(body, active=state_store.value(('body', body.name), body.active))
+        for body in view.bodies
+    }
+    body_classes = {name: body_status_classes(body) for name, body in bodies.items()}
+    pump_values = {pump.key: pump_cell_values(pump) for pump in view.pumps}
+
+    def circuit_value(circuit_id):
+        return state_store.value(('circuit', circuit_id), circuit_state(view, circuit_id))
+
+    def heater_value(command, body_name, polled_value):
+        return state_store.value((command, body_name), polled_value)
 
-lights_present = need_ui(current_pool_data, 3)
-features_present = need_ui(current_pool_data, 2)
+    def ids(name):
+        return [output['id'] for output in outputs[name]]
+
+    updates = header_status(view.meta)
+    lights_classes = lights_status_classes(view.meta.lights_on)
+    updates.update(
+        water_temps=[body_water_temp(bodies[i['body']]) for i in ids('water_temps')],
+        body_cards=[body_classes[i['body']]['card'] for i in ids('body_cards')],
+        body_icons=[body_classes[i['body']]['icon'] for i in ids('body_icons')],
+        heater_icons=[body_classes[i['body']]['heater'] for i in ids('heater_icons')],
+        power_icons=[body_classes[i['body_name']]['power'] for i in ids('power_icons')],
+        heater_modes=[heater_value('mode', i['body'], bodies[i['body']].heater.mode_code) for i in ids('heater_modes')],
+        setpoint_sliders=[heater_value('setpoint', i['body'], bodies[i['body']].heater.setpoint_current) for i in ids('setpoint_sliders')],
+        setpoint_labels=[[f"{heater_value('setpoint', i['body'], bodies[i['body']].heater.setpoint_current)}"] for i in ids('setpoint_labels')],
+        feature_toggles=[bool(circuit_value(i['circuitId'])) for i in ids('feature_toggles')],
+        pump_cells=[pump_values[i['pump']][i['field']] for i in ids('pump_cells')],
+        lights_card=lights_classes['card'],
+        lights_icon=lights_classes['icon'],
+        lights_power=lights_classes['power']
+    )
+    if changes is not None:
+        for key, prefixes in UPDATE_GROUPS.items():
+            if not changed_under(changes, *prefixes):
+                updates[key] = no_update_for(outputs[key])
+    return updates
+
+if PROFILING:
+    PROFILER.start()
+
+# Get initial data, without waiting for it so a slow or rebooting bridge can't stop the app starting
+start_pollers()
 
 @app.callback(
     Output({'type': 'power-button-icon', 'circuitId': MATCH, "body_name": MATCH}, 'className'),
@@ -119,21 +647,19 @@ features_present = need_ui(current_pool_data, 2)
         Input({'type': 'power-button', 'circuitId': MATCH, "body_name": MATCH}, 'id'),
         Input({'type': 'power-button', 'circuitId': MATCH, "body_name": MATCH}, 'n_clicks')
     ],
+    State('installation', 'data'),
     prevent_initial_call=True
 )
-def handle_power_button(id, clicks):
-    body_active = False
+@timed_callback
+def handle_power_button(id, clicks, installation):
+    installation = installations[installation]
+    state_store = installation.state_store
     circuit_id = id.get('circuitId')
-    match_body_index = -1
-    global current_pool_data
-    for i, body in enumerate(current_pool_data.get('status', {}).get('bodies', [])):
-        if body.get('name') == id.get('body_name'):
-            body_active = body.get('active')
-            match_body_index = i
-    print(f"Power Button ID= {id}")
-    print(body_active)
-    new_status = not body_active
-    current_pool_data['status']['bodies'][match_body_index]['active'] = new_status
+    body_name = id.get('body_name')
+    key = ('body', body_name)
+    new_status = not state_store.value(key, body_active(installation.poller.view, body_name))
+    logging.info('Power button for %s switching to %s', body_name, new_status)
+    installation.send_circuit_command(key, circuit_id, new_status, f'Turning {body_name} {"on" if new_status else "off"}')
     color_class = ''
     if new_status:
         color_class = 'text-success'
@@ -147,17 +673,21 @@ def handle_power_button(id, clicks):
         Input({'type': 'feature-toggle', 'circuitId': MATCH}, 'id'),
         Input({'type': 'feature-toggle', 'circuitId': MATCH}, 'value')
     ],
+    State('installation', 'data'),
     prevent_initial_call=True   
 )
-def handle_feature_toggle(id: dict, checked: bool):
+@timed_callback
+def handle_feature_toggle(id: dict, checked: bool, installation: str):
+    installation = installations[installation]
     circuit_id = id.get('circuitId', 0)
     new_mode = 'on' if checked else 'off'
-    logging.info(f"Got Event for circuit {circuit_id}, switching to {new_mode}")
-
-    change_success = control_circuit(POOL_API_URL, circuit_id, int(checked))
-    status = checked if change_success else not checked
-    return status
-    # return checked
+    logging.debug('Got Event for circuit %s, switching to %s', circuit_id, new_mode)
+    key = ('circuit', circuit_id)
+    # The interval callback also sets this value; don't echo the displayed state back to the API
+    if installation.state_store.value(key, circuit_state(installation.poller.view, circuit_id)) == checked:
+        return dash.no_update
+    installation.send_circuit_command(key, circuit_id, checked, f'Switching circuit {circuit_id} {new_mode}')
+    return dash.no_update
 
 # Heater Controls Handlers
 # Handle Slider Move
@@ -167,15 +697,21 @@ def handle_feature_toggle(id: dict, checked: bool):
         Input({'type': 'setpoint-slider', 'id': MATCH, 'body': MATCH}, 'id'),
         Input({'type': 'setpoint-slider', 'id': MATCH, 'body': MATCH}, 'value')
     ],
+    State('installation', 'data'),
     prevent_initial_call=True   
 )
-def handle_heater_setpoint_slider_change(slider_id, value):
+@timed_callback
+def handle_heater_setpoint_slider_change(slider_id, value, installation):
+    installation = installations[installation]
+    state_store = installation.state_store
     body = slider_id.get('body')
-    logging.info(f'Setpoint Slider for {body} changed to {value}.')
-    logging.info(slider_id)
-    logging.info(value)
-    # call_success = control_heater_setpoint(POOL_API_URL, body, value)
-    return value
+    logging.debug('Setpoint Slider for %s changed to %s.', body, value)
+    key = ('setpoint', body)
+    # The interval callback also sets the slider; don't echo the displayed setpoint back to the API
+    if value == state_store.value(key, body_setpoint(installation.poller.view, body)):
+        return dash.no_update
+    installation.send_heater_command(key, value, f'Setting the {body} setpoint to {value}')
+    return [f'{value}']
 
 # Handle Min/Max Buttons
 # Note: Min/Max Buttons only manipulate the slider. The Callback on the Slider does the API call to the back end.
@@ -187,6 +723,7 @@ def handle_heater_setpoint_slider_change(slider_id, value):
     ],
     prevent_initial_call=True    
 )
+@timed_callback
 def handle_setpoint_button(n_clicks, button_values):
     ctx = dash.callback_context
     button_id_dict = json.loads(ctx.triggered[0]['prop_id'].split('.')[0])
@@ -197,34 +734,121 @@ def handle_setpoint_button(n_clicks, button_values):
     elif 'max' in button_id:
         value_index = 1
     else:
-        logging.error(f'Did not find one of the expected button IDs. Expected min or max in id, got {button_id}')
+        logging.error('Did not find one of the expected button IDs. Expected min or max in id, got %s', button_id)
     return_value = button_values[value_index]
-    logging.info(f'{button_id} event received, setting setpoint slider to {return_value}')
+    logging.debug('%s event received, setting setpoint slider to %s', button_id, return_value)
     return [return_value]
 
 @app.callback(
     Output({'type': 'heater-function-buttons', 'body': MATCH}, 'value'),
     Input({'type': 'heater-function-buttons', 'body': MATCH}, 'value'),
+    State('installation', 'data'),
     prevent_initial_call=True
 )
-def handle_heater_mode_change(heat_mode):
+@timed_callback
+def handle_heater_mode_change(heat_mode, installation):
+    installation = installations[installation]
+    state_store = installation.state_store
     ctx = dash.callback_context
     button_info = json.loads(ctx.triggered[0]['prop_id'].split('.')[0])
     body = button_info.get('body')
-    logging.info(f'Got heater mode {heat_mode} for {body}.')
-    # call_success = control_heater_status(POOL_API_URL, body, heat_mode)
-    return heat_mode
+    logging.debug('Got heater mode %s for %s.', heat_mode, body)
+    key = ('mode', body)
+    if heat_mode == state_store.value(key, body_heat_mode(installation.poller.view, body)):
+        return dash.no_update
+    installation.send_heater_command(key, heat_mode, f'Setting the {body} heater mode to {heat_mode}')
+    return dash.no_update
+
+if HISTORY_DB:
+    @app.callback(
+        output=dict(
+            temps=Output('history-temps', 'figure'),
+            power=Output('history-power', 'figure'),
+            key=Output('history-key', 'data')
+        ),
+        inputs=dict(
+            window=Input('history-window', 'value'),
+            n=Input('interval-component', 'n_intervals'),
+            pushed=Input('push-event', 'data'),
+            seen_key=State('history-key', 'data'),
+            installation=State('installation', 'data')
+        )
+    )
+    @timed_callback
+    def update_history_charts(window, n, pushed, seen_key, installation):
+        key, figures = installations[installation].history_charts.figures(window)
+        if key == seen_key:
+            # Figures only change when a rollup bucket closes
+            return dict(temps=dash.no_update, power=dash.no_update, key=dash.no_update)
+        return dict(temps=figures['temps'], power=figures['power'], key=key)
+
+if scene_store is not None:
+    @app.callback(
+        Output('scene-status', 'children'),
+        Input('scene-apply', 'n_clicks'),
+        State('scene-select', 'value'),
+        State('installation', 'data'),
+        prevent_initial_call=True
+    )
+    @timed_callback
+    def apply_scene(n_clicks, scene, installation):
+        installation = installations[installation]
+        operations = scene_store.get(installation.name, scene) if scene else None
+        if operations is None:
+            return dbc.Alert('Pick a scene to apply', color='warning', className='mb-0')
+        try:
+            operations = parse_operations(operations, installation.poller.view)
+        except ValueError as err:
+            return dbc.Alert(f'Could not apply {scene}: {err}', color='danger', className='mb-0')
+        logging.info('Applying scene %s to %s', scene, installation.name)
+        # Don't hold this server thread for the whole batch; the cards follow the
+        # commanded values and failures arrive as command errors
+        installation.run_batch(operations)
+        return f'Applying {scene} ({len(operations)} commands)'
+
+    @app.callback(
+        Output('scene-select', 'options'),
+        Output('scene-select', 'value'),
+        Output('scene-status', 'children', allow_duplicate=True),
+        Input('scene-save', 'n_clicks'),
+        Input('scene-delete', 'n_clicks'),
+        State('scene-name', 'value'),
+        State('scene-lights', 'value'),
+        State('scene-select', 'value'),
+        State('installation', 'data'),
+        prevent_initial_call=True
+    )
+    @timed_callback
+    def edit_scenes(save_clicks, delete_clicks, name, lights, selected, installation):
+        installation = installations[installation]
+        if dash.callback_context.triggered_id == 'scene-delete':
+            if not selected or not scene_store.delete(installation.name, selected):
+                return dash.no_update, dash.no_update, 'Pick a scene to delete'
+            options = scene_options(scene_store.scenes(installation.name))
+            return options, options[0]['value'] if options else None, f'Deleted {selected}'
+        name = (name or '').strip()
+        if not name:
+            return dash.no_update, dash.no_update, 'Give the scene a name'
+        view = installation.poller.view
+        if view is None:
+            return dash.no_update, dash.no_update, 'No data from the pool controller yet'
+        operations = scene_from_view(view, installation.state_store, installation.bodies_present, lights or None)
+        scene_store.save(installation.name, name, operations)
+        return scene_options(scene_store.scenes(installation.name)), name, f'Saved {name} ({len(operations)} commands)'
 
-def make_layout(update_ival):
-    header = html.Header(children=generate_header_layout(current_pool_data), className='mb-3')
+@profiled()
+def make_layout(installation, update_ival):
+    poller = installation.poller
+    view = poller.view
+    header = html.Header(children=generate_header_layout(view.meta), className='mb-3')
     body_layout = []
     body_card_list = []
-    for p_body in bodies_present:
-        body_card = generate_body_info_layout(p_body, current_pool_data)
+    for p_body in installation.bodies_present:
+        body_card = generate_body_info_layout(view.body(p_body), view.body_controls[p_body])
         body_card_list.append(dbc.Col(body_card, width=6, align='middle'))
     row_two_list = []
-    light_card = generate_lights_layout(current_pool_data)
-    features_card = gen_features_pumps_cards(current_pool_data)
+    light_card = generate_lights_layout(view.meta.lights_on)
+    features_card = gen_features_pumps_cards(view.interface_circuits(INTERFACE_FEATURE), view.pumps)
     row_two_list.append(dbc.Col(light_card, width=6, align='middle'))
     row_two_list.append(dbc.Col(features_card, width=6, align='middle')
     )
@@ -234,26 +858,160 @@ def make_layout(update_ival):
         children=body_card_list, class_name='card-list, mb-4'
     ))
     body_layout.append(dbc.Row(children=row_two_list, className='card-list'))
-    if update_ival == abs(update_ival):
-        body_layout.append(
-            dcc.Interval(
-                id='interval-component',
-                interval= update_ival * 1000, # in milliseconds
-                n_intervals=0
-            ))
+    if installation.history is not None:
+        body_layout.append(dbc.Row(
+            children=[dbc.Col(generate_history_card(tuple(HISTORY_WINDOWS), '24h'), width=12)],
+            className='card-list'
+        ))
+    if scene_store is not None:
+        body_layout.append(dbc.Row(
+            children=[dbc.Col(generate_scenes_card(tuple(scene_store.scenes(installation.name))), width=12)],
+            className='card-list'
+        ))
+    # Snapshot version this page was built from, advanced by the interval callback
+    body_layout.append(dcc.Store(id='snapshot-version', data=poller.snapshot.version))
+    body_layout.append(dcc.Store(id='command-error-seq', data=installation.state_store.errors_since(None)[0]))
+    body_layout.append(dbc.Toast(
+        id='command-error-toast', header='Command failed', icon='danger',
+        is_open=False, dismissable=True, duration=10000, className='command-error-toast'
+    ))
+    # Always present so the update callback has its input; disabled in push only mode
+    body_layout.append(
+        dcc.Interval(
+            id='interval-component',
+            interval= abs(update_ival) * 1000, # in milliseconds
+            n_intervals=0,
+            disabled=update_ival < 0
+        ))
     return body_layout
 
-app_layout = make_layout(UPDATE_INTERVAL)
+def installation_content(installation):
+    '''The cards for the equipment detected so far, or a skeleton before the first snapshot'''
+    if installation.poller.view is None:
+        return generate_skeleton_layout(installation.name, installation.poller.consecutive_failures)
+    return make_layout(installation, UPDATE_INTERVAL)
+
+def installation_page(installation):
+    installation.poller.touch()
+    page = [
+        html.Div(children=installation_content(installation), id='installation-content'),
+        # Which installation this page shows, read by every callback
+        dcc.Store(id='installation', data=installation.name),
+        # Equipment the cards were built for, see rebuild_installation_content
+        dcc.Store(id='equipment-version', data=installation.equipment_version),
+        # With push, change events rebuild the cards; the timer only runs
+        # until the first snapshot, to keep the skeleton's failure count current
+        dcc.Interval(
+            id='equipment-interval', interval=POLL_INTERVAL * 1000, n_intervals=0,
+            disabled=PUSH_UPDATES and installation.poller.view is not None
+        ),
+        # Written by assets/push.js when the server pushes a change event
+        dcc.Store(id='push-event')
+    ]
+    if MULTI_INSTALLATION:
+        page.insert(0, html.A([html.I(className='fa fa-arrow-left me-2'), 'All installations'], href='/', className='mb-2 d-block'))
+    return html.Div(children=page, className='full-page', id='pageLayout')
+
+@app.callback(
+    Output('installation-content', 'children'),
+    Output('equipment-version', 'data'),
+    Output('equipment-interval', 'disabled'),
+    Input('equipment-interval', 'n_intervals'),
+    Input('push-event', 'data'),
+    State('equipment-version', 'data'),
+    State('installation', 'data'),
+    prevent_initial_call=True
+)
+@timed_callback
+def rebuild_installation_content(n, pushed, seen_equipment, installation):
+    '''Swap the skeleton for real cards once data arrives, and rebuild them
+        if the controller's equipment changes while the page is open
+    '''
+    installation = installations[installation]
+    installation.poller.touch()
+    if installation.poller.view is None:
+        # Still waiting; refresh the skeleton's failure count
+        return installation_content(installation), dash.no_update, dash.no_update
+    if seen_equipment == installation.equipment_version:
+        return dash.no_update, dash.no_update, PUSH_UPDATES
+    return installation_content(installation), installation.equipment_version, PUSH_UPDATES
 
+def overview_state() -> list:
+    '''What the overview cards show changes only when one of these does'''
+    return [
+        [installation.poller.snapshot.version, installation.poller.is_stale(STALE_INTERVAL)]
+        for installation in installations.values()
+    ]
 
+def overview_cards():
+    cards = []
+    for name, installation in installations.items():
+        view = installation.poller.view
+        card = generate_installation_card(
+            name,
+            view.meta if view is not None else None,
+            view.bodies if view is not None else (),
+            not installation.poller.is_stale(STALE_INTERVAL)
+        )
+        cards.append(dbc.Col(card, width=4))
+    return cards
+
+def overview_page():
+    '''Every installation on one page, refreshed from the pollers on a timer'''
+    return html.Div(children=[
+        html.Header(html.H2('Installations'), className='mb-3'),
+        dbc.Row(children=overview_cards(), id='overview-cards', className='card-list'),
+        dcc.Store(id='overview-state', data=overview_state()),
+        dcc.Interval(
+            id='overview-interval',
+            interval=(UPDATE_INTERVAL if UPDATE_INTERVAL > 0 else POLL_INTERVAL) * 1000,
+            n_intervals=0
+        )
+    ], className='full-page', id='pageLayout')
+
+@app.callback(
+    Output('overview-cards', 'children'),
+    Output('overview-state', 'data'),
+    Input('overview-interval', 'n_intervals'),
+    State('overview-state', 'data'),
+    prevent_initial_call=True
+)
+@timed_callback
+def refresh_overview(n, seen_state):
+    for installation in installations.values():
+        installation.poller.touch()
+    state = overview_state()
+    if state == seen_state:
+        return dash.no_update, dash.no_update
+    return overview_cards(), state
+
+@app.callback(
+    Output('page-content', 'children'),
+    Input('url', 'pathname')
+)
+@timed_callback
+def display_page(pathname):
+    '''/ is the overview, /installation/<name> one installation'''
+    prefix = '/installation/'
+    if pathname and pathname.startswith(prefix):
+        installation = installations.get(pathname[len(prefix):].strip('/'))
+        if installation is not None:
+            return installation_page(installation)
+    return overview_page()
 
-# assume you have a "long-form" data frame
-# see https://plotly.com/python/px-arguments/ for more options
-app.layout = html.Div(children=app_layout, className='full-page', id='pageLayout')
+@timed_callback
+def serve_layout():
+    '''Build the page once per page load from the latest snapshot'''
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug('Builder cache stats: %s', builder_cache_stats())
+    if not MULTI_INSTALLATION:
+        return installation_page(route_installation())
+    # The page for the URL is filled in by display_page
+    return html.Div(children=[dcc.Location(id='url'), html.Div(id='page-content')])
 
-# if UPDATE_INTERVAL != -1:
-#     executor = ThreadPoolExecutor(max_workers=1)
-#     executor.submit(get_pool_data_every)
+app.layout = serve_layout
 
 if __name__ == '__main__':
-    app.run_server(debug=True)
\ No newline at end of file
+    # The pollers were started at import. Flask's reloader would import the app
+    # again in a second process and poll twice; debug mode comes from DASH_DEBUG.
+    app.run(use_reloader=False)
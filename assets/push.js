@@ -0,0 +1,30 @@
+// Server push: forward snapshot change events from /events into the
+// 'push-event' store, which triggers the same partial-update callback as
+// the interval timer. Installation pages (/installation/<name>) listen to
+// that installation's stream. If the server has push disabled, or the page
+// is the multi-installation overview, the endpoint 404s and EventSource
+// gives up without retrying.
+(function () {
+    if (!window.EventSource) {
+        return;
+    }
+    function connect() {
+        if (!window.dash_clientside || !window.dash_clientside.set_props) {
+            // Dash renderer not ready yet
+            setTimeout(connect, 500);
+            return;
+        }
+        var config = JSON.parse(document.getElementById('_dash-config').textContent);
+        var match = window.location.pathname.match(/\/installation\/([^\/]+)/);
+        var path = match ? 'events/' + match[1] : 'events';
+        var source = new EventSource(config.requests_pathname_prefix + path);
+        source.onmessage = function (message) {
+            window.dash_clientside.set_props('push-event', {data: JSON.parse(message.data)});
+        };
+    }
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', connect);
+    } else {
+        connect();
+    }
+})();
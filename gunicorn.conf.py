@@ -0,0 +1,83 @@
+'''gunicorn settings for serving the UI from several worker processes.
+
+    pip install gunicorn   (or: poetry install -E server)
+    gunicorn -c gunicorn.conf.py
+
+The gunicorn master starts one owner process (app.run_owner) next to the
+web workers. The owner is the only process that polls the bridges, records
+history and sends commands; it writes each snapshot to SHARED_STATE_DIR and
+takes commands from the workers over a unix socket there. The workers only
+render pages, so adding workers uses more cores without adding load on the
+bridge, and every worker shows the same snapshot versions.
+
+/metrics, from whichever worker answers the scrape, has the owner's poll,
+bridge and command metrics (written to SHARED_STATE_DIR every few seconds,
+labelled process="owner") and that worker's own page and callback metrics
+(labelled process="worker-<pid>"). Each worker counts from its own start,
+so aggregate per process label, e.g. sum by (callback) (rate(...[5m])),
+rather than reading one scrape as the whole server.
+
+Settings, from the environment:
+    BIND              address to listen on (default 0.0.0.0:8050)
+    WEB_CONCURRENCY   number of web workers (default: number of CPUs)
+    WORKER_THREADS    threads per worker (default 8); every open push
+                      stream (/events) holds one
+    SHARED_STATE_DIR  where the owner shares its state (default: a new
+                      directory in /dev/shm, or the temp directory)
+All the app's own settings (API_BASE_URL, HISTORY_DB, ...) apply as usual.
+'''
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+bind = os.getenv('BIND', '0.0.0.0:8050')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.getenv('WORKER_THREADS', 8))
+wsgi_app = 'app:server'
+# Each worker imports the app itself; nothing is shared by forking
+preload_app = False
+
+_owner = None
+_stopping = threading.Event()
+
+def _start_owner():
+    return subprocess.Popen(
+        [sys.executable, '-c', 'import app; app.run_owner()'],
+        env=dict(os.environ, WORKER_ROLE='owner')
+    )
+
+def _supervise_owner():
+    '''Restart the owner if it dies while gunicorn is still running'''
+    global _owner
+    while not _stopping.is_set():
+        code = _owner.wait()
+        if _stopping.is_set():
+            return
+        logging.error('Owner process exited with %s, restarting it', code)
+        _stopping.wait(1)
+        _owner = _start_owner()
+
+def on_starting(server):
+    global _owner
+    if not os.getenv('SHARED_STATE_DIR'):
+        shm = '/dev/shm' if os.path.isdir('/dev/shm') else None
+        os.environ['SHARED_STATE_DIR'] = tempfile.mkdtemp(prefix='screenlogic-', dir=shm)
+    # Inherited by the workers gunicorn forks from here on
+    os.environ['WORKER_ROLE'] = 'worker'
+    _owner = _start_owner()
+    threading.Thread(target=_supervise_owner, name='owner-supervisor', daemon=True).start()
+    server.log.info('Started owner process %s, sharing state in %s', _owner.pid, os.environ['SHARED_STATE_DIR'])
+
+def on_exit(server):
+    _stopping.set()
+    if _owner is not None and _owner.poll() is None:
+        _owner.terminate()
+        try:
+            _owner.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            _owner.kill()
@@ -0,0 +1,30 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from tools.mock_backend import DEFAULT_FIXTURE, MockBridge, load_frames, make_handler
+from utility.view_model import PoolView
+
+@pytest.fixture
+def pool_data() -> dict:
+    '''The recorded /all payload the mock bridge serves'''
+    with open(DEFAULT_FIXTURE) as f:
+        return json.load(f)
+
+@pytest.fixture
+def pool_view(pool_data) -> PoolView:
+    return PoolView.from_payload(pool_data)
+
+@pytest.fixture
+def mock_bridge():
+    '''Base URL of a tools/mock_backend.py bridge on a free port'''
+    bridge = MockBridge(load_frames([DEFAULT_FIXTURE]))
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(bridge, latency=0, jitter=0, error_rate=0))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
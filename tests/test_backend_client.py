@@ -0,0 +1,55 @@
+import pytest
+import requests
+
+from utility.backend_client import BackendClient, BackendUnavailable, CircuitBreaker
+
+def test_breaker_opens_after_threshold_failures():
+    breaker = CircuitBreaker(threshold=3, reset_after=30)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow()
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(threshold=2, reset_after=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert not breaker.is_open
+
+def test_breaker_lets_one_trial_call_through_after_reset_after():
+    breaker = CircuitBreaker(threshold=1, reset_after=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr('utility.backend_client.time.monotonic', lambda: breaker.opened_at + 0.1)
+        # Half-open: one call, then closed again by its success
+        assert breaker.allow()
+    breaker.record_success()
+    assert not breaker.is_open and breaker.allow()
+
+def test_rejected_commands_do_not_open_the_breaker(mock_bridge):
+    client = BackendClient(mock_bridge, retries=0, breaker=CircuitBreaker(threshold=2))
+    for _ in range(5):
+        with pytest.raises(requests.HTTPError):
+            # The mock bridge answers 404 for commands it does not know
+            client.request('PUT', 'circuit', '/circuit/on/1')
+    assert not client.breaker.is_open
+    assert client.get_all_if_changed()['meta']
+
+def test_unreachable_bridge_opens_the_breaker():
+    client = BackendClient('http://127.0.0.1:9', retries=0, breaker=CircuitBreaker(threshold=2))
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            client.request('GET', 'all', '/all')
+    with pytest.raises(BackendUnavailable):
+        client.request('GET', 'all', '/all')
+
+def test_unchanged_all_is_not_parsed_again(mock_bridge):
+    client = BackendClient(mock_bridge, retries=0)
+    assert client.get_all_if_changed() is not None
+    assert client.get_all_if_changed() is None
+    client.forget_all()
+    assert client.get_all_if_changed() is not None
@@ -0,0 +1,64 @@
+import pytest
+
+from utility.batch import DEFAULT_STAGES, Operation, parse_operations
+from utility.control_functions import LIGHT_COMMANDS
+
+def test_parses_every_operation_type(pool_view):
+    operations = parse_operations([
+        {'type': 'body', 'body': 'spa', 'value': 1},
+        {'type': 'circuit', 'circuit_id': 10, 'value': 0},
+        {'type': 'mode', 'body': 'spa', 'value': 3},
+        {'type': 'setpoint', 'body': 'spa', 'value': 102, 'stage': 5},
+        {'type': 'lights', 'value': 'Caribbean'}
+    ], pool_view)
+    assert operations == [
+        # Body operations switch the body's circuit
+        Operation('body', 'spa', 1, DEFAULT_STAGES['body'], 1),
+        Operation('circuit', 10, 0, DEFAULT_STAGES['circuit'], 10),
+        Operation('mode', 'spa', 3, DEFAULT_STAGES['mode']),
+        Operation('setpoint', 'spa', 102, 5),
+        Operation('lights', None, LIGHT_COMMANDS['caribbean'], DEFAULT_STAGES['lights'])
+    ]
+    assert operations[0].key == ('body', 'spa')
+    assert operations[4].key is None
+
+def test_as_dict_round_trips(pool_view):
+    items = [
+        {'type': 'circuit', 'circuit_id': 10, 'value': 1},
+        {'type': 'setpoint', 'body': 'pool', 'value': 84},
+        {'type': 'lights', 'value': 'party'}
+    ]
+    operations = parse_operations(items, pool_view)
+    assert parse_operations([operation.as_dict() for operation in operations], pool_view) == operations
+
+def test_booleans_count_as_numbers(pool_view):
+    assert parse_operations([{'type': 'body', 'body': 'pool', 'value': False}], pool_view)[0].value == 0
+
+@pytest.mark.parametrize('items, message', [
+    (None, 'non-empty list'),
+    ([], 'non-empty list'),
+    (['circuit'], 'operation 0: must be an object'),
+    ([{'type': 'pump', 'value': 1}], 'type must be one of'),
+    ([{'type': 'circuit', 'circuit_id': 99, 'value': 1}], 'unknown circuit 99'),
+    ([{'type': 'circuit', 'circuit_id': 10, 'value': 2}], 'value must be 0 or 1'),
+    ([{'type': 'circuit', 'circuit_id': 10, 'value': 'on'}], 'value must be a number'),
+    ([{'type': 'body', 'body': 'hot tub', 'value': 1}], 'unknown body'),
+    ([{'type': 'mode', 'body': 'spa', 'value': 9}], 'heater mode must be 0 to 4'),
+    ([{'type': 'setpoint', 'body': 'spa', 'value': 120}], 'spa setpoint must be between 40 and 104'),
+    ([{'type': 'lights', 'value': 'disco'}], 'value must be one of'),
+    ([{'type': 'circuit', 'circuit_id': 10, 'value': 1, 'stage': 'first'}], 'stage must be a whole number'),
+])
+def test_invalid_operations_are_rejected(pool_view, items, message):
+    with pytest.raises(ValueError, match=message):
+        parse_operations(items, pool_view)
+
+def test_the_first_invalid_item_is_named(pool_view):
+    with pytest.raises(ValueError, match='operation 1:'):
+        parse_operations([
+            {'type': 'circuit', 'circuit_id': 10, 'value': 1},
+            {'type': 'circuit', 'circuit_id': 99, 'value': 1}
+        ], pool_view)
+
+def test_no_data_yet():
+    with pytest.raises(ValueError, match='No data'):
+        parse_operations([{'type': 'lights', 'value': 'on'}], None)
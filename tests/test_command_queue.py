@@ -0,0 +1,75 @@
+import asyncio
+import threading
+
+from utility.command_queue import CoalescingCommandQueue
+
+class Recorder:
+    '''send and on_result for a queue, recording what reached the bridge'''
+    def __init__(self, delay: float = 0, succeed: bool = True):
+        self.delay = delay
+        self.succeed = succeed
+        self.sent = []
+        self.results = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.finished = threading.Event()
+
+    async def send(self, key, value):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            self.sent.append((key, value))
+            return self.succeed
+        finally:
+            self.in_flight -= 1
+
+    def on_result(self, key, value, success):
+        self.results.append((key, value, success))
+        self.finished.set()
+
+def wait_for(predicate, timeout: float = 5):
+    event = threading.Event()
+    for _ in range(int(timeout / 0.01)):
+        if predicate():
+            return True
+        event.wait(0.01)
+    return predicate()
+
+def test_burst_is_sent_once_with_the_last_value():
+    recorder = Recorder()
+    queue = CoalescingCommandQueue(recorder.send, recorder.on_result, quiet_period=0.1)
+    for value in (80, 81, 82, 83):
+        queue.push('setpoint', value)
+    assert recorder.finished.wait(5)
+    assert recorder.sent == [('setpoint', 83)]
+    assert recorder.results == [('setpoint', 83, True)]
+
+def test_keys_are_sent_independently():
+    recorder = Recorder()
+    queue = CoalescingCommandQueue(recorder.send, recorder.on_result, quiet_period=0)
+    queue.push(('circuit', 1), 1)
+    queue.push(('circuit', 2), 0)
+    assert wait_for(lambda: len(recorder.results) == 2)
+    assert sorted(recorder.sent) == [(('circuit', 1), 1), (('circuit', 2), 0)]
+
+def test_writes_for_one_key_are_ordered_and_never_overlap():
+    recorder = Recorder(delay=0.1)
+    queue = CoalescingCommandQueue(recorder.send, recorder.on_result, quiet_period=0)
+    queue.push('circuit', 1)
+    assert wait_for(lambda: recorder.in_flight == 1)
+    # Pushed while the first write is in flight: sent after it
+    queue.push('circuit', 0)
+    assert wait_for(lambda: len(recorder.results) == 2)
+    assert recorder.sent == [('circuit', 1), ('circuit', 0)]
+    assert recorder.max_in_flight == 1
+
+def test_failures_are_reported():
+    async def send(key, value):
+        raise RuntimeError('bridge exploded')
+
+    results = []
+    queue = CoalescingCommandQueue(send, lambda *result: results.append(result), quiet_period=0)
+    queue.push('circuit', 1)
+    assert wait_for(lambda: results)
+    assert results == [('circuit', 1, False)]
@@ -0,0 +1,66 @@
+import json
+import logging
+from datetime import datetime
+
+import pytest
+
+from utility.energy import Tariff
+
+# A Monday
+MONDAY = datetime(2026, 1, 5)
+
+def test_flat_rate():
+    tariff = Tariff.from_setting('0.15')
+    assert tariff.rate_at(MONDAY.replace(hour=3)) == 0.15
+    assert tariff.rate_at(MONDAY.replace(hour=15)) == 0.15
+
+def test_empty_setting_is_free():
+    assert Tariff.from_setting('').rate == 0
+
+def test_periods_by_hour_and_weekday():
+    tariff = Tariff.from_setting(
+        '{"rate": 0.20, "currency": "$", "periods": ['
+        '{"hours": [22, 6], "rate": 0.10},'
+        '{"hours": [16, 21], "rate": 0.40, "weekdays": [0, 1, 2, 3, 4]}]}'
+    )
+    assert tariff.currency == '$'
+    # Overnight period wraps past midnight
+    assert tariff.rate_at(MONDAY.replace(hour=23)) == 0.10
+    assert tariff.rate_at(MONDAY.replace(hour=5)) == 0.10
+    assert tariff.rate_at(MONDAY.replace(hour=6)) == 0.20
+    # Weekday peak, end exclusive
+    assert tariff.rate_at(MONDAY.replace(hour=16)) == 0.40
+    assert tariff.rate_at(MONDAY.replace(hour=21)) == 0.20
+    # Not on Saturday
+    assert tariff.rate_at(datetime(2026, 1, 10, 17)) == 0.20
+
+@pytest.mark.parametrize('period', [
+    {'rate': 0.1},
+    {'hours': [1, 30], 'rate': 0.1},
+    {'hours': [1], 'rate': 0.1},
+    {'hours': ['1', '2'], 'rate': 0.1},
+    {'hours': [1, 2]},
+    {'hours': [1, 2], 'rate': 'cheap'},
+    {'hours': [1, 2], 'rate': 0.1, 'weekdays': [7]},
+    'off-peak'
+])
+def test_invalid_period_falls_back_to_the_flat_rate(period, caplog):
+    setting = json.dumps({'rate': 0.2, 'currency': '$', 'periods': [period]})
+    with caplog.at_level(logging.ERROR):
+        tariff = Tariff.from_setting(setting)
+    assert tariff.periods == []
+    assert tariff.rate == 0.2
+    assert tariff.currency == '$'
+    assert 'Ignoring invalid ENERGY_TARIFF' in caplog.text
+
+@pytest.mark.parametrize('setting', ['not json', '[1, 2]', '{"rate": "x"}', '{"unknown": 1}'])
+def test_invalid_setting_is_free(setting, caplog):
+    with caplog.at_level(logging.ERROR):
+        tariff = Tariff.from_setting(setting)
+    assert tariff.rate == 0
+    assert tariff.periods == []
+    assert caplog.records
+
+def test_constructor_rejects_invalid_periods():
+    with pytest.raises(ValueError):
+        Tariff(0.1, [{'hours': [0, 25], 'rate': 1}])
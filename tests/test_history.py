@@ -0,0 +1,77 @@
+import copy
+import sqlite3
+import time
+from datetime import datetime
+
+import pytest
+
+from utility.history import HistoryStore, pick_tier, snapshot_samples
+from utility.history_charts import decimate
+from utility.poller import PoolSnapshot
+from utility.view_model import PoolView
+
+# Two minutes into the hour before last, recent enough to keep raw rows
+START = (time.time() // 3600 - 2) * 3600 + 120
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path / 'history.sqlite3'))
+
+def snapshot_with_air_temp(pool_data, version, air_temp, ts):
+    data = copy.deepcopy(pool_data)
+    data['meta']['airTemp'] = air_temp
+    return PoolSnapshot(version, data, datetime.fromtimestamp(ts), None, PoolView.from_payload(data))
+
+def flush(store):
+    db = sqlite3.connect(store.path)
+    try:
+        store.flush(db)
+    finally:
+        db.close()
+
+def test_snapshot_samples(pool_view):
+    samples = snapshot_samples(pool_view)
+    assert samples['air_temp'] == 72
+    assert samples['water_temp.pool'] == 81
+    assert samples['heater_active.spa'] == 0
+    assert samples['pump_watts.0'] == 780
+
+def test_rollups_keep_mean_min_and_max(store, pool_data):
+    for offset, air_temp in ((0, 70), (20, 74), (40, 72), (70, 80)):
+        store.record(snapshot_with_air_temp(pool_data, offset, air_temp, START + offset))
+    flush(store)
+    end = START + 3600
+    raw = store.query('air_temp', START, end, tier='raw')
+    assert [row[1] for row in raw] == [70, 74, 72, 80]
+    minutes = store.query('air_temp', START - 120, end, tier='minute')
+    assert minutes == [(START, 72.0, 70, 74), (START + 60, 80.0, 80, 80)]
+    hours = store.query('air_temp', START - 3600, end, tier='hour')
+    assert hours == [(START - 120, 74.0, 70, 80)]
+
+def test_republished_snapshot_is_recorded_once(store, pool_data):
+    snapshot = snapshot_with_air_temp(pool_data, 1, 70, START)
+    store.record(snapshot)
+    # A command republishes the same readings as a new version
+    store.record(PoolSnapshot(2, snapshot.data, snapshot.fetched_at, None, snapshot.view))
+    flush(store)
+    assert store.query('air_temp', START - 3600, START + 3600, tier='hour')[0][1:] == (70.0, 70, 70)
+    assert store.read('SELECT count FROM rollup_hour WHERE series = ?', ('air_temp',)) == [(1,)]
+
+def test_pick_tier():
+    now = START
+    assert pick_tier(now - 3600, now, now=now) == 'raw'
+    assert pick_tier(now - 2 * 86400, now, now=now) == 'minute'
+    assert pick_tier(now - 60 * 86400, now, now=now) == 'hour'
+
+def test_decimate_weights_the_mean_by_sample_count():
+    rows = [
+        # bucket, count, total, min, max
+        (0, 1, 10.0, 10, 10),
+        (60, 3, 60.0, 15, 25),
+        (120, 2, 10.0, 4, 6),
+    ]
+    assert decimate(rows, 120) == [(0, 70.0 / 4, 10, 25), (120, 5.0, 4, 6)]
+
+def test_decimate_at_the_tier_width_keeps_every_bucket():
+    rows = [(0, 2, 4.0, 1, 3), (60, 1, 5.0, 5, 5)]
+    assert decimate(rows, 60) == [(0, 2.0, 1, 3), (60, 5.0, 5, 5)]
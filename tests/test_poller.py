@@ -0,0 +1,18 @@
+from utility.poller import changes_since
+
+CHANGESETS = [(3, {'a': 1}), (4, {'b': 1}), (5, None), (6, {'c': 1}), (7, {'d': 1})]
+
+def test_changes_since_merges_every_later_changeset():
+    assert changes_since(CHANGESETS, 5) == {'c': 1, 'd': 1}
+    assert changes_since(CHANGESETS, 6) == {'d': 1}
+
+def test_changes_since_needs_every_version_in_between():
+    # Version 5 changed everything
+    assert changes_since(CHANGESETS, 4) is None
+    # Versions 2 and older are no longer kept
+    assert changes_since(CHANGESETS, 1) is None
+
+def test_changes_since_current_or_unknown_version():
+    assert changes_since(CHANGESETS, 7) is None
+    assert changes_since(CHANGESETS, None) is None
+    assert changes_since([], 3) is None
@@ -0,0 +1,38 @@
+from utility.snapshot_diff import MISSING, changed_under, diff_snapshots
+
+def test_identical_payloads_have_no_changes(pool_data):
+    assert diff_snapshots(pool_data, pool_data) == {}
+
+def test_diff_reports_changed_leaves():
+    old = {'meta': {'airTemp': 70}, 'status': {'bodies': [{'waterTemp': 80}, {'waterTemp': 90}]}}
+    new = {'meta': {'airTemp': 71}, 'status': {'bodies': [{'waterTemp': 80}, {'waterTemp': 91}]}}
+    assert diff_snapshots(old, new) == {
+        'meta.airTemp': (70, 71),
+        'status.bodies[1].waterTemp': (90, 91)
+    }
+
+def test_diff_marks_added_and_removed_keys():
+    changes = diff_snapshots({'a': 1, 'list': [1]}, {'b': 2, 'list': [1, 2]})
+    assert changes == {'a': (1, MISSING), 'b': (MISSING, 2), 'list[1]': (MISSING, 2)}
+
+def test_diff_notices_type_changes():
+    assert diff_snapshots({'a': 1}, {'a': 1.0}) == {'a': (1, 1.0)}
+
+def test_changed_under_prefixes():
+    changes = {'status.bodies[0].waterTemp': (80, 81)}
+    assert changed_under(changes, 'status.bodies')
+    assert changed_under(changes, 'status.bodies[0].waterTemp')
+    assert not changed_under(changes, 'status.bodies[1]')
+    assert not changed_under(changes, 'meta')
+    # Not a path segment match
+    assert not changed_under(changes, 'status.bodies[0].water')
+
+def test_changed_under_parent_change_covers_children():
+    assert changed_under({'status': None}, 'status.bodies[0].waterTemp')
+
+def test_changed_under_wildcards():
+    changes = {'controllerConfig.bodyArray[3].state': (0, 1)}
+    assert changed_under(changes, 'controllerConfig.bodyArray[*].state')
+    assert not changed_under(changes, 'controllerConfig.bodyArray[*].name')
+    assert changed_under({'controllerConfig.bodyArray[*].state': None}, 'controllerConfig.bodyArray[2].state')
+    assert not changed_under({'status.bodies[0].active': None}, 'status.bodies[*].heater.setpoint.current')
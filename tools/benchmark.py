@@ -0,0 +1,364 @@
+'''Load and latency benchmark of the dashboard against the mock bridge.
+
+    python tools/benchmark.py [--clients 10] [--duration 30] [--tick 1]
+                              [--command-every 10] [--latency 20] [--jitter 10]
+                              [--error-rate 0] [--etag] [--history]
+
+Starts tools/mock_backend.py and the app (on the Flask development server,
+with its own poller) as subprocesses, then runs --clients simulated
+browsers. Each loads the page once, fires get_pool_data_every every --tick
+seconds like the interval component does, and every --command-every
+seconds sends one control callback (a feature toggle, body power button,
+setpoint slider or heater mode) picked at random from its page.
+
+Reports p50/p95/p99 latency per callback, the rate of requests the app
+made to the bridge, response bytes per tick, and the app's CPU and RSS.
+Pass --json to get the same numbers as one JSON object, e.g. to compare
+runs before and after a change.
+'''
+import argparse
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_for(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.1)
+    raise SystemExit(f'{url} did not come up within {timeout}s')
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+# The Dash wire format, as the renderer sends it
+
+def walk_layout(node, components: dict):
+    '''{id key: props} of every component with an id in a serialized layout'''
+    if isinstance(node, dict):
+        if {'props', 'type', 'namespace'} <= node.keys():
+            props = node['props']
+            if 'id' in props:
+                components[id_key(props['id'])] = props
+            walk_layout(props, components)
+        else:
+            for value in node.values():
+                walk_layout(value, components)
+    elif isinstance(node, list):
+        for value in node:
+            walk_layout(value, components)
+
+def id_key(component_id) -> str:
+    '''Ids as the renderer writes them in changedPropIds, dict ids with sorted keys'''
+    if isinstance(component_id, dict):
+        return json.dumps(component_id, sort_keys=True, separators=(',', ':'))
+    return component_id
+
+def parse_specs(output: str) -> list:
+    '''[(id or id pattern, property)] of a dependency's output string'''
+    if output.startswith('..'):
+        output = output[2:-2]
+    specs = []
+    for part in output.split('...'):
+        component_id, prop = part.rsplit('.', 1)
+        specs.append((json.loads(component_id) if component_id.startswith('{') else component_id, prop.split('@')[0]))
+    return specs
+
+def matches(pattern, component_id, bound: dict) -> bool:
+    if not isinstance(pattern, dict) or not isinstance(component_id, dict):
+        return pattern == component_id
+    if pattern.keys() != component_id.keys():
+        return False
+    for key, value in pattern.items():
+        if value == ['MATCH']:
+            if bound.get(key) != component_id[key]:
+                return False
+        elif value != ['ALL'] and value != component_id[key]:
+            return False
+    return True
+
+class Page:
+    '''One simulated browser tab: the layout it loaded and the callbacks it can fire'''
+    def __init__(self, session: requests.Session, base_url: str, dependencies: list):
+        self.session = session
+        self.base_url = base_url
+        self.dependencies = dependencies
+        self.components = {}
+        walk_layout(session.get(f'{base_url}/_dash-layout', timeout=30).json(), self.components)
+        # Component ids as sent by the app, keyed the way walk_layout keys them
+        self.ids = {key: props['id'] for key, props in self.components.items()}
+
+    def dependency(self, input_id, prop: str) -> dict:
+        for dependency in self.dependencies:
+            for spec in dependency['inputs']:
+                if spec['property'] == prop and (spec['id'] == input_id or
+                                                 (isinstance(input_id, dict) and spec['id'].startswith('{') and
+                                                  matches(json.loads(spec['id']), input_id, input_id))):
+                    return dependency
+        return None
+
+    def resolve(self, pattern, prop: str, bound: dict, values: dict):
+        '''Request entries for one spec: a list for ALL patterns, a dict otherwise'''
+        if isinstance(pattern, str) and pattern.startswith('{'):
+            pattern = json.loads(pattern)
+        found = [component_id for component_id in self.ids.values() if matches(pattern, component_id, bound)]
+
+        def entry(component_id):
+            item = {'id': component_id, 'property': prop}
+            if values is not None:
+                override = values.get((id_key(component_id), prop))
+                item['value'] = component_id if prop == 'id' else \
+                    override if override is not None else self.components[id_key(component_id)].get(prop)
+            return item
+
+        if isinstance(pattern, dict) and ['ALL'] in pattern.values():
+            return [entry(component_id) for component_id in found]
+        return entry(found[0] if found else pattern)
+
+    def fire(self, input_id, prop: str, value, overrides: dict = None) -> tuple:
+        '''POST the callback triggered by input_id.prop changing to value.
+            Returns (name, status, seconds, response bytes, response JSON or None).
+        '''
+        dependency = self.dependency(input_id, prop)
+        bound = input_id if isinstance(input_id, dict) else {}
+        values = dict(overrides or {})
+        values[(id_key(input_id), prop)] = value
+        body = {
+            'output': dependency['output'],
+            'outputs': [self.resolve(pattern, output_prop, bound, None)
+                        for pattern, output_prop in parse_specs(dependency['output'])],
+            'inputs': [self.resolve(spec['id'], spec['property'], bound, values) for spec in dependency['inputs']],
+            'state': [self.resolve(spec['id'], spec['property'], bound, values) for spec in dependency['state']],
+            'changedPropIds': [f'{id_key(input_id)}.{prop}']
+        }
+        if not dependency['output'].startswith('..'):
+            body['outputs'] = body['outputs'][0]
+        started = time.perf_counter()
+        try:
+            response = self.session.post(f'{self.base_url}/_dash-update-component', json=body, timeout=30)
+        except requests.RequestException:
+            # Counted as an error with status 0
+            return callback_name(dependency), 0, time.perf_counter() - started, 0, None
+        elapsed = time.perf_counter() - started
+        data = response.json() if response.status_code == 200 else None
+        return callback_name(dependency), response.status_code, elapsed, len(response.content), data
+
+def callback_name(dependency: dict) -> str:
+    '''A readable name for a callback, from its first input'''
+    spec = dependency['inputs'][0]
+    component_id = spec['id']
+    if component_id.startswith('{'):
+        component_id = json.loads(component_id).get('type', component_id)
+    return f'{component_id}.{spec["property"]}'
+
+# Control callbacks a client picks from, as (id type, property, new value)
+CONTROLS = {
+    'feature-toggle': ('value', lambda props: not props.get('value')),
+    'power-button': ('n_clicks', lambda props: (props.get('n_clicks') or 0) + 1),
+    'setpoint-slider': ('value', lambda props: random.randint(props.get('min', 80), props.get('max', 104))),
+    'heater-function-buttons': ('value', lambda props: random.choice([o['value'] for o in props.get('options', [])] or [0]))
+}
+
+class Client(threading.Thread):
+    def __init__(self, base_url: str, dependencies: list, args, results: list, stop: threading.Event):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.dependencies = dependencies
+        self.args = args
+        self.results = results
+        self.stop_event = stop
+
+    def run(self):
+        session = requests.Session()
+        page = Page(session, self.base_url, self.dependencies)
+        controls = [component_id for component_id in page.ids.values()
+                    if isinstance(component_id, dict) and component_id.get('type') in CONTROLS
+                    and page.dependency(component_id, CONTROLS[component_id['type']][0])]
+        seen_version, seen_error, n = None, 0, 0
+        # Spread the clients over the tick like browsers opened at different times
+        self.stop_event.wait(random.uniform(0, self.args.tick))
+        next_command = time.monotonic() + random.uniform(0, self.args.command_every)
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            n += 1
+            overrides = {('snapshot-version', 'data'): seen_version, ('command-error-seq', 'data'): seen_error}
+            result = page.fire('interval-component', 'n_intervals', n, overrides)
+            self.results.append(('get_pool_data_every',) + result[1:4])
+            response = (result[4] or {}).get('response', {})
+            seen_version = response.get('snapshot-version', {}).get('data', seen_version)
+            seen_error = response.get('command-error-seq', {}).get('data', seen_error)
+            if self.args.command_every > 0 and controls and started >= next_command:
+                component_id = random.choice(controls)
+                prop, new_value = CONTROLS[component_id['type']]
+                value = new_value(page.components[id_key(component_id)])
+                result = page.fire(component_id, prop, value)
+                self.results.append((component_id['type'],) + result[1:4])
+                next_command = started + self.args.command_every
+            self.stop_event.wait(max(0, self.args.tick - (time.monotonic() - started)))
+
+def process_usage(pid: int) -> tuple:
+    '''(CPU seconds, RSS MB, peak RSS MB) of a process, from /proc'''
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    memory = {}
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if name in ('VmRSS', 'VmHWM'):
+                memory[name] = int(value.split()[0]) / 1024
+    return cpu, memory.get('VmRSS', 0), memory.get('VmHWM', 0)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the dashboard against the mock bridge')
+    parser.add_argument('--clients', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=30, help='seconds to measure for')
+    parser.add_argument('--tick', type=float, default=1, help='seconds between interval callbacks per client')
+    parser.add_argument('--command-every', type=float, default=10, help='seconds between control callbacks per client, 0 for none')
+    parser.add_argument('--poll-interval', type=int, default=1, help="the app's POLL_INTERVAL")
+    parser.add_argument('--latency', type=float, default=20, help='mock bridge latency in ms')
+    parser.add_argument('--jitter', type=float, default=10, help='mock bridge jitter in ms')
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of mock bridge requests that fail')
+    parser.add_argument('--drift', type=float, default=5, help='seconds between mock temperature changes')
+    parser.add_argument('--etag', action='store_true', help='mock bridge sends ETags')
+    parser.add_argument('--history', action='store_true', help='record history to a temporary database')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    backend_port, app_port = free_port(), free_port()
+    backend_url, app_url = f'http://127.0.0.1:{backend_port}', f'http://127.0.0.1:{app_port}'
+    mock_command = [
+        sys.executable, os.path.join(ROOT, 'tools', 'mock_backend.py'), '--port', str(backend_port),
+        '--latency', str(args.latency), '--jitter', str(args.jitter),
+        '--error-rate', str(args.error_rate), '--drift', str(args.drift)
+    ] + (['--etag'] if args.etag else [])
+    workdir = tempfile.mkdtemp(prefix='screenlogic-bench-')
+    env = dict(
+        os.environ, API_BASE_URL=backend_url, API_BASE_URLS='', POLL_INTERVAL=str(args.poll_interval),
+        UPDATE_INTERVAL=str(max(1, round(args.tick))), PUSH_UPDATES='0', LOG_LEVEL='WARNING',
+        HISTORY_DB=os.path.join(workdir, 'history.sqlite3') if args.history else ''
+    )
+    app_command = [
+        sys.executable, '-c',
+        f'import app; app.app.run(host="127.0.0.1", port={app_port}, debug=False, threaded=True)'
+    ]
+    processes = []
+    try:
+        processes.append(subprocess.Popen(mock_command, stdout=subprocess.DEVNULL))
+        wait_for(f'{backend_url}/stats')
+        processes.append(subprocess.Popen(app_command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL))
+        server = processes[-1]
+        wait_for(f'{app_url}/metrics')
+        # The page only has its cards once the poller has the first snapshot
+        deadline = time.monotonic() + 30
+        while 'snapshot-version' not in requests.get(f'{app_url}/_dash-layout', timeout=10).text:
+            if time.monotonic() > deadline:
+                raise SystemExit('The app never got data from the mock bridge')
+            time.sleep(0.2)
+        dependencies = requests.get(f'{app_url}/_dash-dependencies', timeout=10).json()
+
+        results, stop = [], threading.Event()
+        clients = [Client(app_url, dependencies, args, results, stop) for _ in range(args.clients)]
+        for client in clients:
+            client.start()
+        # Measure from once every client has loaded its page
+        time.sleep(max(2, args.tick))
+        results.clear()
+        backend_before = requests.get(f'{backend_url}/stats', timeout=5).json()
+        cpu_before = process_usage(server.pid)[0]
+        started = time.monotonic()
+        rss_samples = []
+        while time.monotonic() - started < args.duration:
+            rss_samples.append(process_usage(server.pid)[1])
+            time.sleep(0.5)
+        elapsed = time.monotonic() - started
+        cpu_after, rss, peak_rss = process_usage(server.pid)
+        backend_after = requests.get(f'{backend_url}/stats', timeout=5).json()
+        stop.set()
+        for client in clients:
+            client.join(timeout=10)
+        report(args, list(results), elapsed, backend_before, backend_after,
+               (cpu_after - cpu_before) / elapsed, rss_samples, peak_rss)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait(timeout=10)
+
+def report(args, results, elapsed, backend_before, backend_after, cpu_share, rss_samples, peak_rss):
+    callbacks = {}
+    for name, status, seconds, size in results:
+        entry = callbacks.setdefault(name, {'latency': [], 'bytes': [], 'errors': 0})
+        entry['latency'].append(seconds)
+        entry['bytes'].append(size)
+        if status not in (200, 204):
+            entry['errors'] += 1
+
+    def delta(key):
+        return backend_after['requests'].get(key, 0) - backend_before['requests'].get(key, 0)
+
+    summary = {
+        'clients': args.clients,
+        'seconds': round(elapsed, 1),
+        'callbacks': {
+            name: {
+                'count': len(entry['latency']),
+                'errors': entry['errors'],
+                'p50_ms': round(percentile(entry['latency'], 0.5) * 1000, 2),
+                'p95_ms': round(percentile(entry['latency'], 0.95) * 1000, 2),
+                'p99_ms': round(percentile(entry['latency'], 0.99) * 1000, 2),
+                'mean_bytes': round(statistics.mean(entry['bytes']))
+            } for name, entry in sorted(callbacks.items())
+        },
+        'backend': {
+            'all_per_second': delta('all') / elapsed,
+            'put_per_second': delta('put') / elapsed,
+            'not_modified': backend_after['not_modified'] - backend_before['not_modified'],
+            'errors': backend_after['errors'] - backend_before['errors'],
+            'bytes_per_second': (backend_after['bytes_sent'] - backend_before['bytes_sent']) / elapsed
+        },
+        'server': {
+            'cpu_percent': cpu_share * 100,
+            'rss_mb': statistics.mean(rss_samples) if rss_samples else 0,
+            'peak_rss_mb': peak_rss
+        }
+    }
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print(f'{args.clients} clients for {elapsed:.0f}s, tick {args.tick}s')
+    print(f'{"callback":28} {"count":>7} {"errors":>6} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"bytes":>8}')
+    for name, entry in summary['callbacks'].items():
+        print(f'{name:28} {entry["count"]:7} {entry["errors"]:6} {entry["p50_ms"]:8.1f} '
+              f'{entry["p95_ms"]:8.1f} {entry["p99_ms"]:8.1f} {entry["mean_bytes"]:8.0f}')
+    backend = summary['backend']
+    print(f'backend: {backend["all_per_second"]:.2f} /all per s, {backend["put_per_second"]:.2f} PUT per s, '
+          f'{backend["not_modified"]} not modified, {backend["errors"]} errors, '
+          f'{backend["bytes_per_second"] / 1024:.1f} KiB/s')
+    server = summary['server']
+    print(f'server: {server["cpu_percent"]:.1f}% CPU, {server["rss_mb"]:.1f} MB RSS '
+          f'(peak {server["peak_rss_mb"]:.1f} MB)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+'''Measure import time and memory of the UI's module set in a fresh interpreter.
+
+    python tools/measure_startup.py
+
+Compares the modules app.py imports at startup against the same set plus
+pandas and plotly.express, which app.py used to import.
+'''
+import json
+import subprocess
+import sys
+
+APP_MODULES = [
+    'dash', 'dash.dcc', 'dash.html', 'dash_bootstrap_components', 'flask', 'requests', 'dotenv'
+]
+OLD_EXTRA_MODULES = ['pandas', 'plotly.express']
+
+PROBE = '''
+import importlib, json, resource, sys, time
+started = time.perf_counter()
+for module in sys.argv[1:]:
+    importlib.import_module(module)
+elapsed = time.perf_counter() - started
+print(json.dumps({'seconds': elapsed, 'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+'''
+
+def measure(modules, runs=5):
+    '''Best-of-runs import time and peak RSS for importing modules'''
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE, *modules], capture_output=True, text=True, check=True
+        ).stdout
+        results.append(json.loads(output))
+    return min(r['seconds'] for r in results), min(r['max_rss_mb'] for r in results)
+
+def main():
+    for label, modules in [
+        ('current startup', APP_MODULES),
+        ('with pandas + plotly.express', APP_MODULES + OLD_EXTRA_MODULES)
+    ]:
+        seconds, rss = measure(modules)
+        print(f'{label:30} {seconds * 1000:8.0f} ms  {rss:7.1f} MB max RSS')
+
+if __name__ == '__main__':
+    main()
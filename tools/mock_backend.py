@@ -0,0 +1,232 @@
+'''Stand-in ScreenLogic REST bridge for development and benchmarks.
+
+    python tools/mock_backend.py [--port 8081] [--fixture tools/fixtures/all.json]
+                                 [--frame-seconds 5] [--drift 10]
+                                 [--latency 20] [--jitter 10] [--error-rate 0.01]
+                                 [--etag]
+
+Serves /all from recorded payloads: each --fixture is a JSON file or a
+directory of them, replayed in order one frame every --frame-seconds.
+--drift walks the water and air temperatures by a degree every so many
+seconds, so a single recording still produces changes.
+
+PUTs to /circuit/{id}/{state}, /{body}/heater/setpoint/{temp},
+/{body}/heater/mode/{mode} and /lights/{command} change the state that
+every later /all reports, like the real bridge.
+
+Every response waits --latency ms +/- --jitter ms, and --error-rate of
+them fail with a 503. /stats returns request counts and bytes served.
+'''
+import argparse
+import copy
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'all.json')
+
+# Light commands that turn the lights off; every other one turns them on
+LIGHTS_OFF = 0
+
+def load_frames(paths) -> list:
+    '''Recorded /all payloads from files, or directories of *.json files, in order'''
+    frames = []
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.json'))
+        else:
+            files = [path]
+        for file in files:
+            with open(file) as f:
+                frames.append(json.load(f))
+    if not frames:
+        raise SystemExit(f'No recorded payloads found in {paths}')
+    return frames
+
+class MockBridge:
+    '''The state behind the mock: recorded frames plus the commands sent since'''
+    def __init__(self, frames, frame_seconds: float = 5, drift: float = 0, etag: bool = False):
+        self.frames = frames
+        self.frame_seconds = frame_seconds
+        self.drift = drift
+        self.etag = etag
+        self.started = time.monotonic()
+        # Commands received, applied on top of whichever frame is playing
+        self.circuits = {}
+        self.heater = {}
+        self.lights = None
+        self._commands = 0
+        self._rendered = None
+        self._lock = threading.Lock()
+        self.stats = {'requests': {}, 'errors': 0, 'not_modified': 0, 'bytes_sent': 0}
+
+    def count(self, kind: str, sent: int = 0):
+        with self._lock:
+            self.stats['requests'][kind] = self.stats['requests'].get(kind, 0) + 1
+            self.stats['bytes_sent'] += sent
+
+    def _position(self) -> tuple:
+        elapsed = time.monotonic() - self.started
+        frame = int(elapsed / self.frame_seconds) % len(self.frames) if self.frame_seconds > 0 else 0
+        step = int(elapsed / self.drift) if self.drift > 0 else 0
+        return frame, step
+
+    def body(self) -> tuple:
+        '''(JSON bytes, ETag) of the current /all; rebuilt only when something changed'''
+        frame, step = self._position()
+        with self._lock:
+            key = (frame, step, self._commands)
+            if self._rendered is None or self._rendered[0] != key:
+                data = self._apply(copy.deepcopy(self.frames[frame]), step)
+                content = json.dumps(data).encode()
+                tag = '"' + hashlib.blake2b(content, digest_size=8).hexdigest() + '"'
+                self._rendered = (key, content, tag)
+            return self._rendered[1], self._rendered[2]
+
+    def _apply(self, data: dict, step: int) -> dict:
+        # A slow triangle wave, so temperatures stay plausible however long it runs
+        offset = (step % 6) - 3 if step % 12 < 6 else 3 - (step % 6)
+        if step:
+            data['meta']['airTemp'] += offset
+        for body in data['status']['bodies']:
+            if step:
+                body['waterTemp'] += offset // 2
+            if body['circuitId'] in self.circuits:
+                body['active'] = bool(self.circuits[body['circuitId']])
+            setpoint = self.heater.get((body['name'], 'setpoint'))
+            if setpoint is not None:
+                body['heater']['setpoint']['current'] = setpoint
+            mode = self.heater.get((body['name'], 'mode'))
+            if mode is not None:
+                body['modeCode'] = mode
+        for circuit in data['controllerConfig']['bodyArray']:
+            if self.lights is not None and circuit['interface'] == 3:
+                circuit['state'] = int(self.lights != LIGHTS_OFF)
+            if circuit['circuitId'] in self.circuits:
+                circuit['state'] = self.circuits[circuit['circuitId']]
+        if self.lights is not None:
+            data['meta']['lightsOn'] = self.lights != LIGHTS_OFF
+        return data
+
+    def command(self, path: str) -> bool:
+        '''Apply a PUT; False when the path is not a known command'''
+        match = re.fullmatch(r'/circuit/(\d+)/(\d+)', path)
+        with self._lock:
+            if match:
+                circuit_id, state = map(int, match.groups())
+                self.circuits[circuit_id] = state
+            elif match := re.fullmatch(r'/(\w+)/heater/(setpoint|mode)/(\d+)', path):
+                body, kind, value = match.groups()
+                self.heater[(body, kind)] = int(value)
+            elif match := re.fullmatch(r'/lights/(\d+)', path):
+                self.lights = int(match.group(1))
+                # A light command overrides individual light circuit switches
+                self.circuits = {key: value for key, value in self.circuits.items()
+                                 if not self._is_light(key)}
+            else:
+                return False
+            self._commands += 1
+        return True
+
+    def _is_light(self, circuit_id: int) -> bool:
+        return any(circuit['circuitId'] == circuit_id and circuit['interface'] == 3
+                   for circuit in self.frames[0]['controllerConfig']['bodyArray'])
+
+def make_handler(bridge: MockBridge, latency: float, jitter: float, error_rate: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _delay(self):
+            seconds = (latency + random.uniform(-jitter, jitter)) / 1000
+            if seconds > 0:
+                time.sleep(seconds)
+
+        def _send(self, status: int, content: bytes = b'', headers: dict = None):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            if status != 304:
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            if status != 304:
+                self.wfile.write(content)
+
+        def _failed(self) -> bool:
+            if random.random() < error_rate:
+                with bridge._lock:
+                    bridge.stats['errors'] += 1
+                self._send(503, b'{"error": "mock failure"}')
+                return True
+            return False
+
+        def do_GET(self):
+            if self.path == '/stats':
+                with bridge._lock:
+                    stats = dict(bridge.stats, requests=dict(bridge.stats['requests']),
+                                 uptime=time.monotonic() - bridge.started)
+                self._send(200, json.dumps(stats).encode())
+                return
+            if self.path != '/all':
+                self._send(404, b'{"error": "not found"}')
+                return
+            self._delay()
+            if self._failed():
+                return
+            content, tag = bridge.body()
+            if bridge.etag and self.headers.get('If-None-Match') == tag:
+                with bridge._lock:
+                    bridge.stats['not_modified'] += 1
+                bridge.count('all')
+                self._send(304, headers={'ETag': tag})
+                return
+            bridge.count('all', len(content))
+            self._send(200, content, {'ETag': tag} if bridge.etag else None)
+
+        def do_PUT(self):
+            self._delay()
+            if self._failed():
+                return
+            if not bridge.command(self.path):
+                self._send(404, b'{"error": "unknown command"}')
+                return
+            bridge.count('put')
+            self._send(200, b'{"success": true}')
+
+    return Handler
+
+def serve(port: int, bridge: MockBridge, latency: float = 0, jitter: float = 0, error_rate: float = 0):
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(bridge, latency, jitter, error_rate))
+    server.daemon_threads = True
+    print(f'Mock bridge on http://127.0.0.1:{port} ({len(bridge.frames)} recorded frames)', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in ScreenLogic REST bridge')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--fixture', action='append', help='recorded /all payload, or a directory of them')
+    parser.add_argument('--frame-seconds', type=float, default=5, help='seconds each recorded frame is served')
+    parser.add_argument('--drift', type=float, default=0, help='seconds between temperature changes, 0 for none')
+    parser.add_argument('--latency', type=float, default=0, help='ms added to every response')
+    parser.add_argument('--jitter', type=float, default=0, help='+/- ms of random extra latency')
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of requests answered with a 503')
+    parser.add_argument('--etag', action='store_true', help='send ETags and answer If-None-Match with 304')
+    args = parser.parse_args()
+    bridge = MockBridge(load_frames(args.fixture or [DEFAULT_FIXTURE]), args.frame_seconds, args.drift, args.etag)
+    serve(args.port, bridge, args.latency, args.jitter, args.error_rate)
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,21 @@
-import logging
 from dash import html, dcc
 import dash_bootstrap_components as dbc
+
+from utility.memo import memoize_builder
+from utility.profiling import profiled
 from ui_elements.common import generate_feature_controls
 
-# Generate individual body (of water, i.e. pool/spa) layouts
-def generate_body_info_layout(body_name, pool_data):
-    '''Generate a UI card per body present'''
-    # print(body_name)
-    body_info = {}
-    body_control_data = []
-    body_icons = {
-        'pool': 'swimming-pool',
-        'spa': 'hot-tub'
-    }
-    for body in pool_data['status']['bodies']:
-        if body['name'] == body_name:
-            body_info = body
-    if body_info['active']:
+BODY_ICONS = {
+    'pool': 'swimming-pool',
+    'spa': 'hot-tub'
+}
+
+@profiled()
+def body_status_classes(body_info):
+    '''classNames of the parts of a body card that follow the body/heater state.
+        Shared by the card builder and the interval update callback.
+    '''
+    if body_info.active:
         card_icon_color_class = 'text-primary'
         text_color_class = 'text-success'
         card_border_class = 'card border-primary'
@@ -25,53 +24,57 @@ def generate_body_info_layout(body_name, pool_data):
         text_color_class = ''
         card_border_class = ''
 
-    if body_info['heater']['active']:
+    if body_info.heater_active:
         heater_color_class = 'text-warning'
     else:
         heater_color_class = ''
-    # Figure out what controls go on this card
-    interface_id = body_info['interfaceId']
-    for circuit in pool_data['controllerConfig']['bodyArray']:
-        if circuit.get('interface') == interface_id and circuit.get('name').lower() != body_name:
-            body_control_data.append(
-                {
-                    "label": circuit.get('name'),
-                    "value": circuit.get('state'),
-                    "circuit_id": circuit.get('circuitId'),
-                    "name_index": circuit.get('nameIndex')
-                }
-            )
-    body_control_data.sort(key=lambda k: k.get('name_index'))
+    return {
+        'card': f"w-90, {card_border_class}",
+        'icon': f"fa fa-{BODY_ICONS[body_info.name]} fa-lg {card_icon_color_class} mt-2",
+        'heater': f'fa fa-fire fa-lg mt-2 {heater_color_class}',
+        'power': f'fa fa-power-off fa-lg {text_color_class}'
+    }
+
+@profiled()
+def body_water_temp(body_info):
+    return f"{body_info.water_temp}° {body_info.temp_scale}"
+
+# Generate individual body (of water, i.e. pool/spa) layouts
+@memoize_builder()
+def generate_body_info_layout(body_info, controls):
+    '''Generate a UI card for one body.
+        controls are the Circuit records shown as switches on the card.
+    '''
+    body_name = body_info.name
+    status_classes = body_status_classes(body_info)
     body_controls = []
-    for control in body_control_data:
+    for control in controls:
         body_controls.append(
-            generate_feature_controls(
-                control.get('label'), control.get('circuit_id'), bool(control.get('value'))
-            )
+            generate_feature_controls(control.name, control.circuit_id, control.state)
         )
     card = dbc.Card([
         dbc.CardHeader(
             [
                 dbc.Row(children=[
                     dbc.Col(
-                        html.I(className=f"fa fa-{body_icons[body_name]} fa-lg {card_icon_color_class} mt-2"), 
+                        html.I(className=status_classes['icon'], id={'type': 'body-icon', 'body': body_name}),
                         width='auto', class_name='p-2 bd-highlight'
                         ),
                     dbc.Col([
-                        html.H4(children=body_info['name'].capitalize(), className=""),
+                        html.H4(children=body_name.capitalize(), className=""),
                     ], width='auto', className='bd-highlight p-2'),
                     dbc.Col([
-                        html.H6(children=f"{body_info['waterTemp']}° {body_info['tempScale']}", className="")
+                        html.H6(children=body_water_temp(body_info), className="", id={'type': 'water-temp', 'body': body_name})
                     ], width='auto', className='bd-highlight p-2 mt-1 ms-3'),
                     dbc.Col(
-                        html.I(className=f'fa fa-fire fa-lg mt-2 {heater_color_class}', hidden=bool(not body_info.get('heater', {}).get('equipPresent', {}).get('heater', {})) ), width=1, class_name='ms-auto p-2 bd-highlight'),
+                        html.I(className=status_classes['heater'], id={'type': 'heater-icon', 'body': body_name}, hidden=not body_info.heater_present), width=1, class_name='ms-auto p-2 bd-highlight'),
                     dbc.Col(
                         dbc.Button(
-                            html.I(className=f'fa fa-power-off fa-lg {text_color_class}',
+                            html.I(className=status_classes['power'],
                             id={
                                 "type": "power-button-icon",
-                                "circuitId": body_info.get('circuitId'),
-                                "body_name": body_info.get('name') 
+                                "circuitId": body_info.circuit_id,
+                                "body_name": body_name 
                             }
                             ),
                             class_name='btn-pwr-circle me-0',
@@ -79,8 +82,8 @@ def generate_body_info_layout(body_name, pool_data):
                             n_clicks=0,
                             id={
                                 "type" : "power-button",
-                                "circuitId": body_info.get('circuitId'),
-                                "body_name": body_info.get('name')
+                                "circuitId": body_info.circuit_id,
+                                "body_name": body_name
                             }
                         ), 
                         width=1, class_name='p-2 bd-highlight'
@@ -96,33 +99,27 @@ def generate_body_info_layout(body_name, pool_data):
             ),
             html.Hr(),
             html.Div(
-                children=generate_body_heater_controls(body_info),
+                children=generate_body_heater_controls(body_info.heater),
             )
                 
             
         ])
-    ], className=f"w-90, {card_border_class}")
+    ], className=status_classes['card'], id={'type': 'body-card', 'body': body_name})
     return card
 
 # Generate Heater controls for each card
-def generate_body_heater_controls(body_info):
-    setpoint_config = body_info.get('heater', {}).get('setpoint',{})
-    heater_options_present = []
+@memoize_builder()
+def generate_body_heater_controls(heater):
+    body_name = heater.body_name
     heater_buttons = [
         {"label": "Off", "value": 0},  
     ]
-    for key in body_info.get('heater', {}).get('equipPresent'):
-        if not key.endswith('isheater'):
-            if body_info.get('heater', {}).get('equipPresent',{}).get(key):
-                heater_options_present.append(key)
-    print(heater_options_present)
-    for option in heater_options_present:
+    for option in heater.options:
         if option == "heater":
             heater_buttons.append({"label": "Heater", "value": 3})
         if option == "solar":
             heater_buttons.append({"label": "Solar", "value": 1})
             heater_buttons.append({"label": "Solar Preferred", "value": 2})
-    logging.info(f'Need {len(heater_buttons)} buttons for heater controls')
     controls = []
     heater_slider = html.Div(children = [
         dbc.Row([
@@ -131,15 +128,15 @@ def generate_body_heater_controls(body_info):
         dbc.Row([
             dbc.Col([
                 dbc.Button(
-                    setpoint_config.get('min'),
+                    heater.setpoint_min,
                     class_name='btn-setpoint-circle mx-0',
                     color="light",
                     n_clicks=0,
-                    value=setpoint_config.get('min'),
+                    value=heater.setpoint_min,
                     id={
                         'type': 'setpoint-button',
-                        'id': f'{body_info.get("name")}-setpoint-min',
-                        'body': body_info.get("name")
+                        'id': f'{body_name}-setpoint-min',
+                        'body': body_name
                     }
             )], width=1, class_name='mx-0 p-2 bd-highlight'),
             dbc.Col(
@@ -147,37 +144,37 @@ def generate_body_heater_controls(body_info):
                     dcc.Slider(
                         id={
                             'type': 'setpoint-slider',
-                            'id': f'{body_info.get("name")}-setpoint',
-                            'body': body_info.get("name")
+                            'id': f'{body_name}-setpoint',
+                            'body': body_name
                         },
                         step=1,
-                        min=setpoint_config.get('min', 40),
-                        max=setpoint_config.get('max', 104),
-                        value=setpoint_config.get('current', 0),
+                        min=heater.setpoint_min if heater.setpoint_min is not None else 40,
+                        max=heater.setpoint_max if heater.setpoint_max is not None else 104,
+                        value=heater.setpoint_current or 0,
                         className='mx-0')
                 ], 
                 class_name='mx-0 mt-3 ms-auto p-2 bd-highlight'
             ),
             dbc.Col([dbc.Button(
-                setpoint_config.get('max'),
+                heater.setpoint_max,
                 class_name='btn-setpoint-circle mx-0',
                 color="light",
                 n_clicks=0,
-                value=setpoint_config.get('max'),
+                value=heater.setpoint_max,
                 id={
                     'type': 'setpoint-button',
-                    'id': f'{body_info.get("name")}-setpoint-max',
-                    'body': body_info.get("name")
+                    'id': f'{body_name}-setpoint-max',
+                    'body': body_name
                 }
             )], width=1, class_name='mx-0 mb-0 ms-auto p-2 bd-highlight'),
             dbc.Col([
-                dbc.Label(children=[f'{setpoint_config.get("current")}'], class_name='h5 me-0 mt-2',
+                dbc.Label(children=[f'{heater.setpoint_current}'], class_name='h5 me-0 mt-2',
                 id={
                     'type': 'setpoint-label',
-                    'id': f'{body_info.get("name")}-setpoint',
-                    'body': body_info.get("name")
+                    'id': f'{body_name}-setpoint',
+                    'body': body_name
                 }),
-                dbc.Label(f'° {body_info.get("tempScale")}', class_name='h5')       
+                dbc.Label(f'° {heater.temp_scale}', class_name='h5')       
                 ], 
                 width=2, class_name='mx-0 mb-0 p-2 bd-highlight') 
             ]
@@ -188,14 +185,14 @@ def generate_body_heater_controls(body_info):
                     dbc.RadioItems(
                         id={
                             'type': 'heater-function-buttons',
-                            'body': body_info.get("name")
+                            'body': body_name
                             },
                         class_name="btn-group btn-group-toggle",
                         input_class_name="btn-check",
                         label_class_name="btn btn-outline-primary",
                         label_checked_class_name="active",
                         options=heater_buttons,
-                        value=body_info.get('modeCode', 0)
+                        value=heater.mode_code
                     ), 
                 className="ms-2 radio-group")
             )
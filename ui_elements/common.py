@@ -1,7 +1,9 @@
-import logging
 import dash_bootstrap_components as dbc
 
+from utility.profiling import profiled
+
 # Generate the body controls (Feature Toggles)
+@profiled()
 def generate_feature_controls(name: str, circuit_id, checked: bool):
     control_id = {
         "type": "feature-toggle",
@@ -13,5 +15,4 @@ def generate_feature_controls(name: str, circuit_id, checked: bool):
         value=checked, 
         class_name='me-5'
         )
-    logging.info(f"Switch control id: {control_id.get('circuit_id')} generated")
     return body_control
\ No newline at end of file
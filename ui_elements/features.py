@@ -1,31 +1,64 @@
 
 from dash import html
 import dash_bootstrap_components as dbc
-import pandas as pd
 
+from utility.memo import memoize_builder
+from utility.profiling import profiled
 from ui_elements.common import generate_feature_controls
 
-def gen_features_pumps_cards(pool_data):
-    '''Generate layout for Feature Controls'''
-    # Figure out what features go in the card
-    body_array = pool_data.get('controllerConfig', {}).get('bodyArray')
-    features_data = []
-    for circuit in body_array:
-        if circuit.get('interface') == 2:
-            features_data.append(
-                {
-                    "label": circuit.get('name'),
-                    "value": circuit.get('state'),
-                    "circuit_id": circuit.get('circuitId'),
-                    "name_index": circuit.get('nameIndex')
-                }
-            )
+PUMP_COLUMNS = ['Pump', 'Type', 'Status', 'Speed (RPM)', 'Power Usage (Watts)']
+# Pump table cells that change between polls, keyed by the 'field' of their id
+PUMP_LIVE_FIELDS = {
+    'Status': 'status',
+    'Speed (RPM)': 'rpm',
+    'Power Usage (Watts)': 'watts'
+}
+
+@profiled()
+def pump_cell_values(pump):
+    '''Values for the live cells of one pump row'''
+    return {
+        'status': 'Running' if pump.running else 'Off',
+        'rpm': pump.rpm,
+        'watts': pump.watts
+    }
+
+@profiled()
+def generate_pumps_table(pumps):
+    '''Pumps table with an addressable id on every live cell'''
+    rows = []
+    for pump in pumps:
+        key = pump.key
+        live_values = pump_cell_values(pump)
+        pump_data = {
+            'Pump': key,
+            'Type' : pump.type_name,
+        }
+        cells = []
+        for column in PUMP_COLUMNS:
+            field = PUMP_LIVE_FIELDS.get(column)
+            if field:
+                cells.append(html.Td(live_values[field], id={'type': 'pump-cell', 'pump': key, 'field': field}))
+            else:
+                cells.append(html.Td(pump_data[column]))
+        rows.append(html.Tr(cells))
+    return dbc.Table(
+        [
+            html.Thead(html.Tr([html.Th(column) for column in PUMP_COLUMNS])),
+            html.Tbody(rows)
+        ],
+        striped=True, borderless=True, hover=True
+    )
+
+@memoize_builder()
+def gen_features_pumps_cards(features, pumps):
+    '''Generate layout for Feature Controls and the Pumps table.
+        features are the feature Circuit records, pumps the Pump records.
+    '''
     features_array = []
-    for control in features_data:
+    for control in features:
             features_array.append(
-                generate_feature_controls(
-                    control.get('label'), control.get('circuit_id'), bool(control.get('value'))
-                )
+                generate_feature_controls(control.name, control.circuit_id, control.state)
             )
     card_list = []
     ## Generate the Card
@@ -48,20 +81,6 @@ def gen_features_pumps_cards(pool_data):
         )
     ])
     # Pumps card
-    pumps_array = pool_data.get('status', {}).get('pumps', {})
-    pumps_transformed = []
-    for key in pumps_array:
-        pump = pumps_array.get(key)
-        pump_status = 'Running' if pump.get('isRunning') else 'Off'
-        pump_data = {
-            'Pump': key,
-            'Type' : pump.get('pumpTypeName'),
-            'Status': pump_status,
-            'Speed (RPM)' : pump.get('pumpRPMs'),
-            'Power Usage (Watts)' : pump.get('pumpWatts'),
-        }
-        pumps_transformed.append(pump_data)
-    pump_df = pd.DataFrame(pumps_transformed)
     pumps_card = dbc.Card([
         dbc.CardHeader(
             [
@@ -77,7 +96,7 @@ def gen_features_pumps_cards(pool_data):
         ),
             ]),
     dbc.CardBody(
-        dbc.Table.from_dataframe(pump_df, striped=True, borderless=True, hover=True)
+        generate_pumps_table(pumps)
     )
     ], class_name='mt-2')
     card_list.append(features_card)
@@ -1,28 +1,44 @@
 from dash import html
 import dash_bootstrap_components as dbc
 
+from utility.memo import memoize_builder
+from utility.profiling import profiled
+
+@profiled()
+def header_status(meta):
+    '''Values of the header properties that change between polls'''
+    return {
+        'freeze_hidden': not meta.freeze_mode,
+        'service_hidden': not meta.service_mode,
+        'delay_hidden': not meta.cleaner_delay,
+        'lights_hidden': not meta.lights_on,
+        'air_temp': [f"{meta.air_temp}° {meta.temp_scale}"]
+    }
+
 # Generate the Header layout
-def generate_header_layout(pool_data):
+@memoize_builder()
+def generate_header_layout(meta):
+    status = header_status(meta)
     header = dbc.Nav(children=[
         html.Div(children=[
         html.Span(children=[
             html.Span(children='ScreenLogic', className='navbar-brand h1 me-1'),
             html.I(className='fa fa-info-circle fa-md icon align-middle mb-1 ms-2 text-light', id='PoolInfoIcon', n_clicks=0),
             dbc.Tooltip(
-                f"{pool_data['meta']['server']['name']}", 
+                f"{meta.server_name}", 
                 placement='right', target='PoolInfoIcon', className='bs-tooltip-right'
             )], id='PoolInfo', className='nav-item'),
         html.Span(
             children=[
                 html.I(className=f"fa fa-icicles fa-lg icon mb-1 ms-2 me-2 flex-nowrap text-light",
-                    id='FreezeModeStatus', hidden=bool(not pool_data['meta']['freezeMode'])
+                    id='FreezeModeStatus', hidden=status['freeze_hidden']
                     ),
-                html.I(className=f"fa fa-tools fa-lg icon mb-1 ms-2 me-2 flex-nowrap text-light", id='ServiceModeStatus', hidden=bool(not pool_data['meta']['serviceMode'])),
-                html.I(className=f"fa fa-clock fa-lg icon mb-1 ms-2 me-2 flex-nowrap text-light", style={}, id='DelayStatus', hidden=bool(not pool_data['meta']['cleanerDelay'])),
-                html.I(className=f"fa fa-lightbulb fa-lg mb-1 icon ms-2 me-2 flex-nowrap text-light", id='LightsStatus', hidden=bool(not pool_data['meta']['lightsOn'])),
+                html.I(className=f"fa fa-tools fa-lg icon mb-1 ms-2 me-2 flex-nowrap text-light", id='ServiceModeStatus', hidden=status['service_hidden']),
+                html.I(className=f"fa fa-clock fa-lg icon mb-1 ms-2 me-2 flex-nowrap text-light", style={}, id='DelayStatus', hidden=status['delay_hidden']),
+                html.I(className=f"fa fa-lightbulb fa-lg mb-1 icon ms-2 me-2 flex-nowrap text-light", id='LightsStatus', hidden=status['lights_hidden']),
                 html.I(className=f"fa fa-eye fa-lg mb-1 icon ms-2 me-2 flex-nowrap text-light", id='ConnectedStatus'),
                 dbc.Tooltip(children = ['Connected to API'], placement='bottom-end', target='ConnectedStatus', id='ConnectedStatusTT'),
-                html.Span(children=[f"{pool_data['meta']['airTemp']}° {pool_data['meta']['tempScale']}"], className='navbar-item h5 ms-4 text-light', id='outsideTemp'
+                html.Span(children=status['air_temp'], className='navbar-item h5 ms-4 text-light', id='outsideTemp'
                 ),
                 dbc.Tooltip('Outside Air Temperature', placement='bottom-end', target='outsideTemp', id='AirTempTT')
             ], className='nav-item'
@@ -0,0 +1,46 @@
+from dash import dcc
+from dash import html
+import dash_bootstrap_components as dbc
+
+from utility.memo import memoize_builder
+
+@memoize_builder(maxsize=1)
+def generate_history_card(windows, default_window):
+    '''Generate layout for the History charts.
+        The figures are filled in by a callback after the page loads, so
+        building the page never waits on the history database.
+    '''
+    window_buttons = dbc.RadioItems(
+        id='history-window',
+        class_name="btn-group btn-group-toggle",
+        input_class_name="btn-check",
+        label_class_name="btn btn-outline-primary",
+        label_checked_class_name="active",
+        options=[{"label": window, "value": window} for window in windows],
+        value=default_window
+    )
+    history_card = dbc.Card([
+        dbc.CardHeader(
+            [
+                dbc.Row(children=[
+                    dbc.Col(
+                        html.I(className="fa fa-chart-line fa-lg mt-2"),
+                        width='auto', class_name='p-2 bd-highlight'
+                        ),
+                    dbc.Col([
+                        html.H4(children='History', className="card-title")
+                    ], width='auto', className='p-2'),
+                    dbc.Col(html.Div(window_buttons, className='radio-group'), width='auto', class_name='ms-auto p-2')
+            ]
+        ),
+            ]),
+    dbc.CardBody([
+        html.H5('Temperature'),
+        dcc.Graph(id='history-temps', config={'displayModeBar': False}),
+        html.H5('Pump Power'),
+        dcc.Graph(id='history-power', config={'displayModeBar': False}),
+        # Cache key of the figures this page shows
+        dcc.Store(id='history-key')
+    ])
+    ], class_name='mt-4')
+    return history_card
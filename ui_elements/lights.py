@@ -2,9 +2,13 @@
 from dash import html
 import dash_bootstrap_components as dbc
 
-def generate_lights_layout(pool_data):
-    '''Generate layout for Lights Controls'''
-    if pool_data.get('meta', {}).get('lightsOn'):
+from utility.memo import memoize_builder
+from utility.profiling import profiled
+
+@profiled()
+def lights_status_classes(lights_on: bool):
+    '''classNames of the parts of the lights card that follow the lights state'''
+    if lights_on:
         card_icon_color_class = 'text-warning'
         text_color_class = 'text-success'
         card_border_class = 'card border-primary'
@@ -12,6 +16,19 @@ def generate_lights_layout(pool_data):
         card_icon_color_class = ''
         text_color_class = ''
         card_border_class = ''
+    return {
+        'card': f"w-90, {card_border_class}",
+        'icon': f"fa fa-lightbulb fa-lg {card_icon_color_class} mt-2",
+        'power': f'fa fa-power-off fa-lg {text_color_class}'
+    }
+
+@memoize_builder()
+def generate_lights_layout(lights_on: bool):
+    '''Generate layout for Lights Controls.
+        Takes only what it reads from Meta, so other readings (e.g. the
+        air temperature) don't miss the cache.
+    '''
+    status_classes = lights_status_classes(lights_on)
     button_color = 'secondary'
     intellibrite_labels = [
         'Party',
@@ -40,7 +57,7 @@ def generate_lights_layout(pool_data):
             [
                 dbc.Row(children=[
                     dbc.Col(
-                        html.I(className=f"fa fa-lightbulb fa-lg {card_icon_color_class} mt-2"), 
+                        html.I(className=status_classes['icon'], id='lights-card-icon'),
                         width='auto', class_name='p-2 bd-highlight'
                         ),
                     dbc.Col([
@@ -66,7 +83,7 @@ def generate_lights_layout(pool_data):
                     # Power Button Column
                     dbc.Col(
                         dbc.Button(
-                            html.I(className=f'fa fa-power-off fa-lg {text_color_class}',
+                            html.I(className=status_classes['power'],
                             id={
                                 "type": "power-button-icon",
                                 "id": "lights-power-icon"
@@ -106,5 +123,5 @@ def generate_lights_layout(pool_data):
             )
         ]
         )
-    ], class_name=f"w-90, {card_border_class}")
+    ], class_name=status_classes['card'], id='lights-card')
     return light_card
\ No newline at end of file
@@ -0,0 +1,44 @@
+from dash import html
+import dash_bootstrap_components as dbc
+
+from utility.memo import memoize_builder
+from ui_elements.body import BODY_ICONS
+
+@memoize_builder(maxsize=32)
+def generate_installation_card(name, meta, bodies, connected):
+    '''Summary card for one installation on the overview page.
+        meta and bodies are the installation's view model records (None
+        before its first successful poll).
+    '''
+    status_icon = 'fa-eye text-success' if connected else 'fa-eye-slash text-danger'
+    rows = []
+    if meta is not None:
+        rows.append(html.P([
+            html.I(className='fa fa-temperature-half me-2'),
+            f'Outside {meta.air_temp}° {meta.temp_scale}'
+        ]))
+    for body in bodies:
+        active_class = 'text-success' if body.active else 'text-secondary'
+        rows.append(html.P([
+            html.I(className=f"fa fa-{BODY_ICONS.get(body.name, 'water')} me-2 {active_class}"),
+            f'{body.name.capitalize()} {body.water_temp}° {body.temp_scale}',
+            html.I(className='fa fa-fire ms-2 text-warning') if body.heater_active else None
+        ]))
+    installation_card = dbc.Card([
+        dbc.CardHeader(
+            [
+                dbc.Row(children=[
+                    dbc.Col(
+                        html.I(className=f'fa fa-lg {status_icon} mt-2'),
+                        width='auto', class_name='p-2 bd-highlight'
+                        ),
+                    dbc.Col([
+                        html.H4(children=meta.server_name if meta is not None else name, className="card-title")
+                    ], width='auto', className='p-2')
+            ]
+        ),
+            ]),
+    dbc.CardBody(rows or [html.P('Waiting for data')]),
+    dbc.CardFooter(html.A('Open', href=f'/installation/{name}', className='btn btn-primary'))
+    ], class_name='mb-4')
+    return installation_card
@@ -0,0 +1,50 @@
+from dash import dcc
+from dash import html
+import dash_bootstrap_components as dbc
+
+from utility.control_functions import LIGHT_COMMANDS
+
+def scene_options(scene_names) -> list:
+    return [{'label': name, 'value': name} for name in sorted(scene_names)]
+
+def generate_scenes_card(scene_names):
+    '''Generate layout for the Scenes card.
+        Applying a scene sends all of its commands as one batch; saving
+        stores what the page shows now under the given name.
+    '''
+    options = scene_options(scene_names)
+    lights_options = [{'label': 'Leave lights as they are', 'value': ''}] + [
+        {'label': name.title(), 'value': name} for name in LIGHT_COMMANDS
+    ]
+    scenes_card = dbc.Card([
+        dbc.CardHeader(
+            dbc.Row(children=[
+                dbc.Col(
+                    html.I(className="fa fa-sliders fa-lg mt-2"),
+                    width='auto', class_name='p-2 bd-highlight'
+                    ),
+                dbc.Col([
+                    html.H4(children='Scenes', className="card-title")
+                ], width='auto', className='p-2')
+            ])
+        ),
+        dbc.CardBody([
+            dbc.Row([
+                dbc.Col(dcc.Dropdown(
+                    id='scene-select', options=options,
+                    value=options[0]['value'] if options else None,
+                    placeholder='No scenes saved yet', clearable=False
+                )),
+                dbc.Col(dbc.Button('Apply', id='scene-apply', color='primary'), width='auto'),
+                dbc.Col(dbc.Button('Delete', id='scene-delete', color='secondary', outline=True), width='auto')
+            ], className='mb-3'),
+            html.H5('Save the current settings'),
+            dbc.Row([
+                dbc.Col(dbc.Input(id='scene-name', placeholder='Scene name', maxLength=40)),
+                dbc.Col(dcc.Dropdown(id='scene-lights', options=lights_options, value='', clearable=False)),
+                dbc.Col(dbc.Button('Save', id='scene-save', color='secondary'), width='auto')
+            ], className='mb-3'),
+            html.Div(id='scene-status')
+        ])
+    ], class_name='mt-4')
+    return scenes_card
@@ -0,0 +1,26 @@
+from dash import html
+import dash_bootstrap_components as dbc
+
+from utility.profiling import profiled
+
+@profiled()
+def generate_skeleton_layout(name, failures):
+    '''Placeholder page shown until the first snapshot arrives.
+        The real cards replace it as soon as the poller has data.
+    '''
+    status = f'No answer from the pool controller yet ({failures} failed polls), still trying' if failures \
+        else 'Connecting to the pool controller'
+    return [
+        html.Header(children=dbc.Navbar(
+            dbc.Container([
+                dbc.NavbarBrand(name, className='ms-2')
+            ], fluid=True),
+            color='primary', dark=True
+        ), className='mb-3'),
+        dbc.Card([
+            dbc.CardBody([
+                dbc.Spinner(color='primary', size='sm', spinner_class_name='me-2'),
+                html.Span(status)
+            ])
+        ])
+    ]
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import threading
+import time
+from functools import partial
+
+from utility.backend_client import BACKEND_ERRORS, BACKEND_SECONDS, BackendUnavailable, get_client, is_bridge_failure
+from utility.profiling import PROFILER
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+class AsyncBackendClient:
+    '''asyncio counterpart of BackendClient for one ScreenLogic API.
+        Shares timeouts and the circuit breaker with the sync client. Uses
+        aiohttp when it is installed; otherwise each call runs the sync
+        client in the loop's default executor.
+        Must only be used from a single event loop (see utility.async_runner).
+    '''
+    def __init__(self, base_url: str, concurrency: int = 8, retries: int = 2, backoff: float = 0.2):
+        self.base_url = base_url
+        self.sync_client = get_client(base_url)
+        self.breaker = self.sync_client.breaker
+        self.timeouts = self.sync_client.timeouts
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self._session = None
+        self._semaphore = None
+
+    def _ensure_session(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        if aiohttp is not None and self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector)
+
+    async def request(self, method: str, endpoint: str, path: str):
+        '''Send one request and return the decoded JSON body (None for PUTs)'''
+        self._ensure_session()
+        async with self._semaphore:
+            if self._session is None:
+                response = await asyncio.get_running_loop().run_in_executor(
+                    None, partial(self.sync_client.request, method, endpoint, path)
+                )
+                return response.json() if method == 'GET' else None
+            if not self.breaker.allow():
+                BACKEND_ERRORS.inc(endpoint=endpoint, method=method, error='BackendUnavailable')
+                raise BackendUnavailable(f'{self.base_url} is unavailable, not calling {path}')
+            started = time.perf_counter()
+            try:
+                return await self._aiohttp_request(method, endpoint, path)
+            except Exception as err:
+                if is_bridge_failure(getattr(err, 'status', None) if isinstance(err, aiohttp.ClientResponseError) else None):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                BACKEND_ERRORS.inc(endpoint=endpoint, method=method, error=type(err).__name__)
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                BACKEND_SECONDS.observe(elapsed, endpoint=endpoint, method=method)
+                if PROFILER.enabled:
+                    PROFILER.record('backend', f'{method} {endpoint}', elapsed)
+
+    async def _aiohttp_request(self, method, endpoint, path):
+        timeout = aiohttp.ClientTimeout(total=self.timeouts[endpoint])
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._session.request(method, f'{self.base_url}{path}', timeout=timeout) as response:
+                    response.raise_for_status()
+                    body = await response.json(content_type=None) if method == 'GET' else None
+                    self.breaker.record_success()
+                    return body
+            except aiohttp.ClientConnectionError:
+                # Same policy as the sync client: connection errors are safe to retry
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(self.backoff * (2 ** attempt))
+
+    async def put(self, endpoint: str, path: str) -> bool:
+        '''PUT a control command, True when the bridge accepted it'''
+        try:
+            await self.request('PUT', endpoint, path)
+        except Exception as err:
+            logging.error('PUT %s failed: %s', path, err)
+            return False
+        return True
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_async_client(base_url: str) -> AsyncBackendClient:
+    '''Return the process-wide async client for base_url'''
+    with _clients_lock:
+        client = _clients.get(base_url)
+        if client is None:
+            client = _clients[base_url] = AsyncBackendClient(base_url)
+        return client
@@ -0,0 +1,30 @@
+from utility.async_backend_client import get_async_client
+
+# Control commands for the bridge, run them on utility.async_runner
+
+async def control_circuit(api_endpoint: str, circuit_id: int, new_state: int) -> bool:
+    '''Generic API call to change a standard Pentair Circuit'''
+    return await get_async_client(api_endpoint).put('circuit', f'/circuit/{circuit_id}/{new_state}')
+
+async def control_heater_status(api_endpoint: str, body: str, new_mode: int) -> bool:
+    '''API call to control the various heater modes
+        Heater Modes are:
+        0: Off
+        1: Solar
+        2: Solar Preferred
+        3: Heat Pump
+        4: No Change
+    '''
+    return await get_async_client(api_endpoint).put('heater', f'/{body}/heater/mode/{new_mode}')
+
+async def control_heater_setpoint(api_endpoint: str, body: str, temp: int) -> bool:
+    '''API Call to modify the heater setpoint.
+        Temperature should be an integer in the Temp Scale your pool is configured for
+    '''
+    return await get_async_client(api_endpoint).put('heater', f'/{body}/heater/setpoint/{temp}')
+
+async def control_lights(api_endpoint: str, light_command: int) -> bool:
+    '''API Control for controling lights.
+        light_command is one of the values of utility.control_functions.LIGHT_COMMANDS
+    '''
+    return await get_async_client(api_endpoint).put('lights', f'/lights/{light_command}')
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_loop = None
+_loop_thread = None
+_loop_lock = threading.Lock()
+# One thread, so work handed off the loop still runs in the order it was handed off
+_off_loop = ThreadPoolExecutor(max_workers=1, thread_name_prefix='off-loop')
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    '''Return the background event loop, starting its thread on first use.
+        Control commands run here so no Dash request thread waits on the bridge.
+    '''
+    global _loop, _loop_thread
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name='control-loop', daemon=True)
+            _loop_thread.start()
+        return _loop
+
+def call_off_loop(function, *args):
+    '''Call function(*args) now, unless on the background loop: then hand it
+        to a helper thread, so blocking work (snapshot listeners write to
+        disk) never holds up the other commands on the loop.
+    '''
+    if threading.current_thread() is _loop_thread:
+        future = _off_loop.submit(function, *args)
+        future.add_done_callback(_log_failure)
+        return
+    function(*args)
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logging.error('Work handed off the control loop failed', exc_info=future.exception())
+
+def submit(coro, on_done=None):
+    '''Schedule a coroutine on the background loop and return its concurrent Future.
+        on_done(result) is called from the loop thread when the coroutine
+        finishes; an exception counts as a False result.
+    '''
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    if on_done is not None:
+        def _done(fut):
+            try:
+                result = fut.result()
+            except Exception:
+                logging.exception('Background command failed')
+                result = False
+            on_done(result)
+        future.add_done_callback(_done)
+    return future
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utility.metrics import Counter, Histogram
+from utility.profiling import PROFILER
+
+try:
+    # Optional, several times faster than the json module on /all payloads
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# Seconds to wait for each kind of backend call, override with API_TIMEOUT_<NAME>
+DEFAULT_TIMEOUTS = {
+    'all': 2.0,
+    'circuit': 5.0,
+    'heater': 5.0,
+    'lights': 5.0
+}
+
+BACKEND_SECONDS = Histogram(
+    'screenlogic_backend_request_seconds', 'Time for one backend call, retries included', ('endpoint', 'method')
+)
+BACKEND_ERRORS = Counter(
+    'screenlogic_backend_errors_total', 'Failed backend calls by error type', ('endpoint', 'method', 'error')
+)
+
+class BackendUnavailable(requests.RequestException):
+    '''Raised without touching the network while the circuit breaker is open'''
+
+def is_bridge_failure(status) -> bool:
+    '''Whether an answer with this HTTP status (None: no answer at all) counts
+        against the circuit breaker. A 4xx is the bridge refusing one command,
+        it is up and answering; only connection errors, timeouts and 5xx say
+        it is unwell.
+    '''
+    return status is None or status >= 500
+
+class CircuitBreaker:
+    '''Stop calling a bridge that keeps failing.
+        After `threshold` consecutive failures the breaker opens and calls
+        fail fast for `reset_after` seconds; then a single trial call is let
+        through (half-open) and its result closes or re-opens the breaker.
+    '''
+    def __init__(self, threshold: int = 5, reset_after: float = 30):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_after:
+                # Half-open: let this call through, push the next trial out
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logging.warning('Backend failed %s times in a row, pausing calls for %ss', self.failures, self.reset_after)
+                self.opened_at = time.monotonic()
+
+class BackendClient:
+    '''Shared HTTP client for one ScreenLogic API.
+        Keeps connections alive in a pool, applies per-endpoint timeouts,
+        retries failed connections with backoff and fails fast through a
+        circuit breaker while the bridge is down.
+    '''
+    def __init__(self, base_url: str, timeouts: dict = None, retries: int = 2,
+                 backoff: float = 0.2, pool_size: int = 4, breaker: CircuitBreaker = None):
+        self.base_url = base_url
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        for name in self.timeouts:
+            env_timeout = os.getenv(f'API_TIMEOUT_{name.upper()}')
+            if env_timeout:
+                self.timeouts[name] = float(env_timeout)
+        self.timeouts.update(timeouts or {})
+        self.breaker = breaker or CircuitBreaker()
+        # Connection errors are retried for every method since the request never
+        # reached the bridge; read errors and 5xx only for idempotent GETs.
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({'GET'}),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # Validators of the last /all body, for conditional fetches
+        self._all_etag = None
+        self._all_digest = None
+
+    def request(self, method: str, endpoint: str, path: str, headers: dict = None) -> requests.Response:
+        '''Send one request to the bridge; endpoint picks the timeout'''
+        if not self.breaker.allow():
+            BACKEND_ERRORS.inc(endpoint=endpoint, method=method, error='BackendUnavailable')
+            raise BackendUnavailable(f'{self.base_url} is unavailable, not calling {path}')
+        started = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, f'{self.base_url}{path}', headers=headers, timeout=self.timeouts[endpoint]
+            )
+            response.raise_for_status()
+        except requests.RequestException as err:
+            status = err.response.status_code if err.response is not None else None
+            if is_bridge_failure(status):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            BACKEND_ERRORS.inc(endpoint=endpoint, method=method, error=type(err).__name__)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            BACKEND_SECONDS.observe(elapsed, endpoint=endpoint, method=method)
+            if PROFILER.enabled:
+                PROFILER.record('backend', f'{method} {endpoint}', elapsed)
+        self.breaker.record_success()
+        return response
+
+    def get_all_if_changed(self):
+        '''Fetch /all, returning None when it is unchanged since the last call.
+            Sends If-None-Match when the bridge gave an ETag; otherwise the
+            body is hashed and only parsed when the hash differs.
+        '''
+        headers = {'If-None-Match': self._all_etag} if self._all_etag else None
+        response = self.request('GET', 'all', '/all', headers=headers)
+        if response.status_code == 304:
+            return None
+        digest = hashlib.blake2b(response.content, digest_size=16).digest()
+        if digest == self._all_digest:
+            return None
+        data = json_loads(response.content)
+        # Only remember validators of bodies that parsed
+        self._all_etag = response.headers.get('ETag')
+        self._all_digest = digest
+        return data
+
+    def forget_all(self):
+        '''Make the next get_all_if_changed() return the body even if unchanged'''
+        self._all_etag = None
+        self._all_digest = None
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(base_url: str) -> BackendClient:
+    '''Return the process-wide client for base_url, creating it on first use'''
+    with _clients_lock:
+        client = _clients.get(base_url)
+        if client is None:
+            client = _clients[base_url] = BackendClient(base_url)
+        return client
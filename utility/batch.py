@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+
+from utility.async_control_functions import control_circuit, control_heater_setpoint, control_heater_status, control_lights
+from utility.control_functions import LIGHT_COMMANDS
+
+# Stage an operation runs in when it does not give one: bodies and circuits
+# first (switching a body sets its valves and pump), then its heater, then lights
+DEFAULT_STAGES = {
+    'body': 0,
+    'circuit': 0,
+    'mode': 1,
+    'setpoint': 1,
+    'lights': 2
+}
+# Heater modes, see utility.async_control_functions.control_heater_status
+HEATER_MODES = range(5)
+
+@dataclass(frozen=True)
+class Operation:
+    '''One command of a batch.
+        kind and target match the PoolStateStore keys ('circuit', 7),
+        ('body', 'spa'), ('setpoint', 'spa'), ('mode', 'spa'); lights have
+        no target. circuit_id is the circuit switched by circuit and body
+        operations.
+    '''
+    kind: str
+    target: object
+    value: int
+    stage: int
+    circuit_id: int = None
+
+    @property
+    def key(self):
+        '''State store key, None for commands the UI keeps no overlay for'''
+        return None if self.kind == 'lights' else (self.kind, self.target)
+
+    def describe(self) -> str:
+        if self.kind == 'lights':
+            name = next((name for name, value in LIGHT_COMMANDS.items() if value == self.value), self.value)
+            return f'Setting the lights to {name}'
+        if self.kind in ('body', 'circuit'):
+            return f'Turning {self.kind} {self.target} {"on" if self.value else "off"}'
+        if self.kind == 'setpoint':
+            return f'Setting the {self.target} setpoint to {self.value}'
+        return f'Setting the {self.target} heater mode to {self.value}'
+
+    def as_dict(self) -> dict:
+        '''The operation in the form parse_operations() accepts'''
+        entry = {'type': self.kind, 'value': self.value, 'stage': self.stage}
+        if self.kind == 'circuit':
+            entry['circuit_id'] = self.target
+        elif self.kind != 'lights':
+            entry['body'] = self.target
+        return entry
+
+    async def send(self, api_url: str) -> bool:
+        if self.kind in ('body', 'circuit'):
+            return await control_circuit(api_url, self.circuit_id, self.value)
+        if self.kind == 'setpoint':
+            return await control_heater_setpoint(api_url, self.target, self.value)
+        if self.kind == 'mode':
+            return await control_heater_status(api_url, self.target, self.value)
+        return await control_lights(api_url, self.value)
+
+def parse_operations(items: list, view) -> list:
+    '''Validate a batch request against the installation's equipment.
+        Each item is one of
+            {"type": "body", "body": "spa", "value": 1}
+            {"type": "circuit", "circuit_id": 10, "value": 0}
+            {"type": "mode", "body": "spa", "value": 3}
+            {"type": "setpoint", "body": "spa", "value": 102}
+            {"type": "lights", "value": "caribbean"}  (a name or number of LIGHT_COMMANDS)
+        with an optional "stage"; stages run in increasing order.
+        Raises ValueError naming the first invalid item.
+    '''
+    if not isinstance(items, list) or not items:
+        raise ValueError('operations must be a non-empty list')
+    if view is None:
+        raise ValueError('No data from the pool controller yet')
+    return [_parse_operation(index, item, view) for index, item in enumerate(items)]
+
+def _parse_operation(index: int, item, view) -> Operation:
+    def invalid(reason):
+        return ValueError(f'operation {index}: {reason}')
+
+    if not isinstance(item, dict):
+        raise invalid('must be an object')
+    kind = item.get('type')
+    if kind not in DEFAULT_STAGES:
+        raise invalid(f'type must be one of {", ".join(DEFAULT_STAGES)}')
+    stage = item.get('stage', DEFAULT_STAGES[kind])
+    value = item.get('value')
+    if not isinstance(stage, int):
+        raise invalid('stage must be a whole number')
+    if kind == 'lights':
+        if isinstance(value, str):
+            value = LIGHT_COMMANDS.get(value.lower())
+        if value not in LIGHT_COMMANDS.values():
+            raise invalid(f'value must be one of {", ".join(LIGHT_COMMANDS)}')
+        return Operation(kind, None, value, stage)
+    if not isinstance(value, (int, bool)):
+        raise invalid('value must be a number')
+    value = int(value)
+    if kind == 'circuit':
+        circuit = view.circuit(item.get('circuit_id'))
+        if circuit is None:
+            raise invalid(f'unknown circuit {item.get("circuit_id")!r}')
+        if value not in (0, 1):
+            raise invalid('value must be 0 or 1')
+        return Operation(kind, circuit.circuit_id, value, stage, circuit.circuit_id)
+    body = view.body(item.get('body'))
+    if body is None:
+        raise invalid(f'unknown body {item.get("body")!r}')
+    if kind == 'body':
+        if value not in (0, 1):
+            raise invalid('value must be 0 or 1')
+        return Operation(kind, body.name, value, stage, body.circuit_id)
+    if kind == 'mode':
+        if value not in HEATER_MODES:
+            raise invalid(f'heater mode must be {HEATER_MODES.start} to {HEATER_MODES.stop - 1}')
+        return Operation(kind, body.name, value, stage)
+    low, high = body.heater.setpoint_min, body.heater.setpoint_max
+    if low is not None and high is not None and not low <= value <= high:
+        raise invalid(f'{body.name} setpoint must be between {low} and {high}')
+    return Operation(kind, body.name, value, stage)
+
+async def run_batch(installation, operations: list, concurrency: int = 4, stop_on_failure: bool = True) -> list:
+    '''Send operations stage by stage, at most concurrency at a time.
+        Every operation of a stage is sent before the next stage starts.
+        With stop_on_failure, stages after one with a failed operation are
+        skipped. Commanded values show in the UI straight away and go
+        through the installation's state store like single commands.
+        Returns one result per operation, in the order given.
+    '''
+    semaphore = asyncio.Semaphore(concurrency)
+    state_store = installation.state_store
+    results = [None] * len(operations)
+
+    async def run(index, operation):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                success = await operation.send(installation.api_url)
+            except Exception:
+                logging.exception('%s failed', operation.describe())
+                success = False
+        if operation.key is not None:
+            state_store.command_finished(operation.key, operation.value, success)
+        results[index] = _result(operation, 'ok' if success else 'failed', time.perf_counter() - started)
+        return success
+
+    failed = False
+    for stage in sorted({operation.stage for operation in operations}):
+        batch = [(index, operation) for index, operation in enumerate(operations) if operation.stage == stage]
+        if failed and stop_on_failure:
+            for index, operation in batch:
+                results[index] = _result(operation, 'skipped', 0)
+            continue
+        for index, operation in batch:
+            if operation.key is not None:
+                state_store.expect(operation.key, operation.value, operation.describe())
+        outcomes = await asyncio.gather(*(run(index, operation) for index, operation in batch))
+        failed = failed or not all(outcomes)
+    # Failed commands with an overlay were rolled back and reported by the state store
+    for operation, result in zip(operations, results):
+        if operation.key is None and result['status'] == 'failed':
+            state_store.report_error(f'{operation.describe()} was rejected by the controller')
+    skipped = sum(result['status'] == 'skipped' for result in results)
+    if skipped:
+        state_store.report_error(f'{skipped} commands of the batch were skipped after a failure')
+    # Lights have no overlay to confirm; fetch soon so the lights card follows
+    installation.poller.burst()
+    return results
+
+def _result(operation: Operation, status: str, seconds: float) -> dict:
+    return dict(operation.as_dict(), description=operation.describe(), status=status, seconds=round(seconds, 3))
@@ -0,0 +1,67 @@
+import asyncio
+import logging
+import threading
+
+from utility.async_runner import get_loop
+from utility.metrics import Counter
+
+COALESCED_COMMANDS = Counter(
+    'screenlogic_coalesced_commands_total', 'Queued commands by outcome: sent, or superseded by a newer value', ('result',)
+)
+
+class CoalescingCommandQueue:
+    '''Collapse bursts of commands for the same key into one write.
+        Every push restarts a quiet-period timer for its key and replaces the
+        value waiting to be sent, so dragging a slider across ten degrees
+        sends only the value it was released on. Writes for one key never
+        overlap; a value pushed while a write is in flight is sent after it.
+        send is a coroutine function send(key, value) -> bool and
+        on_result(key, value, success) is called from the loop thread.
+    '''
+    def __init__(self, send, on_result=None, quiet_period: float = 0.75):
+        self.send = send
+        self.on_result = on_result
+        self.quiet_period = quiet_period
+        self._pending = {}
+        self._timers = {}
+        self._locks = {}
+        self._state_lock = threading.Lock()
+
+    def push(self, key, value):
+        '''Queue value for key, replacing any value not yet sent'''
+        with self._state_lock:
+            superseded = key in self._pending
+            self._pending[key] = value
+        if superseded:
+            COALESCED_COMMANDS.inc(result='superseded')
+        get_loop().call_soon_threadsafe(self._restart_timer, key)
+
+    def _restart_timer(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        self._timers[key] = get_loop().call_later(
+            self.quiet_period, lambda: asyncio.ensure_future(self._flush(key))
+        )
+
+    async def _flush(self, key):
+        self._timers.pop(key, None)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            with self._state_lock:
+                if key not in self._pending:
+                    return
+                value = self._pending[key]
+            COALESCED_COMMANDS.inc(result='sent')
+            try:
+                success = await self.send(key, value)
+            except Exception:
+                logging.exception('Command %s=%s failed', key, value)
+                success = False
+            with self._state_lock:
+                # Only clear the slot if nothing newer arrived during the write
+                if self._pending.get(key) == value and key not in self._timers:
+                    del self._pending[key]
+        logging.info('Command %s=%s %s', key, value, 'accepted' if success else 'rejected')
+        if self.on_result is not None:
+            self.on_result(key, value, success)
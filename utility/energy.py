@@ -0,0 +1,208 @@
+import json
+import logging
+import threading
+from datetime import datetime
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS energy_hourly (
+    pump TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    wh REAL NOT NULL,
+    cost REAL NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (pump, hour)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS energy_unmetered (
+    pump TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (pump, hour)
+) WITHOUT ROWID;
+'''
+
+# Summary period -> strftime format of its label, in local time
+PERIOD_FORMATS = {
+    'hour': '%Y-%m-%d %H:00',
+    'day': '%Y-%m-%d',
+    'month': '%Y-%m',
+}
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _check_period(period):
+    '''Raise ValueError unless period is a valid Tariff period'''
+    if not isinstance(period, dict):
+        raise ValueError(f'period must be an object, not {period!r}')
+    hours = period.get('hours')
+    if (not isinstance(hours, list) or len(hours) != 2
+            or not all(isinstance(hour, int) and not isinstance(hour, bool) and 0 <= hour <= 24 for hour in hours)):
+        raise ValueError(f'period hours must be [start, end] with whole hours 0-24, not {hours!r}')
+    if not _is_number(period.get('rate')):
+        raise ValueError(f'period rate must be a number, not {period.get("rate")!r}')
+    weekdays = period.get('weekdays', [])
+    if not isinstance(weekdays, list) or not all(isinstance(day, int) and 0 <= day <= 6 for day in weekdays):
+        raise ValueError(f'period weekdays must be a list of 0 (Monday) to 6, not {weekdays!r}')
+
+class Tariff:
+    '''Electricity price per kWh by hour of day and weekday.
+        periods are {'hours': [start, end], 'rate': price, 'weekdays': [0-6]}
+        with end exclusive and Monday = 0; weekdays defaults to every day.
+        The first matching period wins, otherwise rate applies.
+    '''
+    def __init__(self, rate: float = 0, periods: list = (), currency: str = ''):
+        if not _is_number(rate):
+            raise ValueError(f'rate must be a number, not {rate!r}')
+        for period in periods:
+            _check_period(period)
+        self.rate = rate
+        self.periods = list(periods)
+        self.currency = currency
+        # Rate for each (weekday, hour), looked up once per sample
+        self._rates = [[self._match(weekday, hour) for hour in range(24)] for weekday in range(7)]
+
+    @classmethod
+    def from_setting(cls, setting: str) -> 'Tariff':
+        '''Parse ENERGY_TARIFF: a flat rate ("0.15") or a JSON object of Tariff's arguments'''
+        if not setting:
+            return cls()
+        try:
+            value = json.loads(setting)
+        except ValueError as err:
+            logging.error('Ignoring invalid ENERGY_TARIFF %r: %s', setting, err)
+            return cls()
+        try:
+            if isinstance(value, (int, float)):
+                return cls(rate=value)
+            return cls(**value)
+        except (ValueError, TypeError, KeyError) as err:
+            # Keep the flat rate and currency if those are usable
+            rate = value.get('rate', 0) if isinstance(value, dict) else 0
+            rate = rate if _is_number(rate) else 0
+            currency = value.get('currency', '') if isinstance(value, dict) else ''
+            logging.error('Ignoring invalid ENERGY_TARIFF %r, using the flat rate %s: %s', setting, rate, err)
+            return cls(rate=rate, currency=currency if isinstance(currency, str) else '')
+
+    def _match(self, weekday: int, hour: int) -> float:
+        for period in self.periods:
+            start, end = period['hours']
+            in_hours = start <= hour < end if start <= end else (hour >= start or hour < end)
+            if in_hours and weekday in period.get('weekdays', range(7)):
+                return period['rate']
+        return self.rate
+
+    def rate_at(self, moment: datetime) -> float:
+        return self._rates[moment.weekday()][moment.hour]
+
+    def describe(self) -> dict:
+        return {'rate': self.rate, 'periods': self.periods, 'currency': self.currency}
+
+class EnergyMeter:
+    '''Integrates polled pump watts into Wh and cost per pump per hour.
+        Register sample() as a poller sample listener. Each fetch adds the
+        previous reading held over the time since the previous fetch, so the
+        work per sample is constant. Intervals longer than max_gap (the API
+        was down, or the poller stalled) are counted as unmetered rather than
+        guessed at; those seconds are stored per pump and hour too, so every
+        process reading the database reports them. Hourly totals are
+        buffered in memory and written by the history writer thread.
+    '''
+    def __init__(self, store, tariff: Tariff, max_gap: float = 60):
+        self.store = store
+        self.tariff = tariff
+        self.max_gap = max_gap
+        # pump -> (timestamp, watts) of its last reading
+        self._last = {}
+        # (pump, hour) -> [wh, cost, seconds] not yet written
+        self._pending = {}
+        # (pump, hour) -> unmetered seconds not yet written
+        self._unmetered = {}
+        self._lock = threading.Lock()
+        store.add_writer(_SCHEMA, self._write)
+
+    def sample(self, fetched_at: datetime, view):
+        if view is None:
+            return
+        now = fetched_at.timestamp()
+        with self._lock:
+            for pump in view.pumps:
+                watts = pump.watts if isinstance(pump.watts, (int, float)) else 0
+                last = self._last.get(pump.key)
+                self._last[pump.key] = (now, watts)
+                if last is None:
+                    continue
+                since, last_watts = last
+                elapsed = now - since
+                if elapsed <= 0:
+                    continue
+                if elapsed > self.max_gap:
+                    for hour, start, seconds in _hours(since, now):
+                        self._unmetered[(pump.key, hour)] = self._unmetered.get((pump.key, hour), 0.0) + seconds
+                    continue
+                self._add(pump.key, since, now, last_watts)
+
+    def _add(self, pump: str, start: float, end: float, watts: float):
+        # Each hour gets its own share and rate
+        for hour, start, seconds in _hours(start, end):
+            wh = watts * seconds / 3600
+            totals = self._pending.setdefault((pump, hour), [0.0, 0.0, 0.0])
+            totals[0] += wh
+            totals[1] += wh / 1000 * self.tariff.rate_at(datetime.fromtimestamp(start))
+            totals[2] += seconds
+
+    def _write(self, db):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            unmetered, self._unmetered = self._unmetered, {}
+        if unmetered:
+            db.executemany(
+                'INSERT INTO energy_unmetered (pump, hour, seconds) VALUES (?, ?, ?) '
+                'ON CONFLICT (pump, hour) DO UPDATE SET seconds = seconds + excluded.seconds',
+                [(pump, hour, seconds) for (pump, hour), seconds in unmetered.items()]
+            )
+        if pending:
+            db.executemany(
+                'INSERT INTO energy_hourly (pump, hour, wh, cost, seconds) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (pump, hour) DO UPDATE SET wh = wh + excluded.wh, '
+                'cost = cost + excluded.cost, seconds = seconds + excluded.seconds',
+                [(pump, hour, wh, cost, seconds) for (pump, hour), (wh, cost, seconds) in pending.items()]
+            )
+
+    def summary(self, period: str = 'day', start: float = 0, end: float = None) -> dict:
+        '''kWh and cost per pump per hour, day or month (local time) between start and end'''
+        rows = self.store.read(
+            f"SELECT pump, strftime('{PERIOD_FORMATS[period]}', hour, 'unixepoch', 'localtime') AS label, "
+            'SUM(wh), SUM(cost), SUM(seconds) FROM energy_hourly '
+            'WHERE hour >= ? AND hour < ? GROUP BY pump, label ORDER BY pump, label',
+            (start, end if end is not None else 2 ** 62)
+        )
+        # Every pump misses the same gaps; report the pump that missed the most
+        unmetered = self.store.read(
+            'SELECT COALESCE(MAX(seconds), 0) FROM (SELECT SUM(seconds) AS seconds FROM energy_unmetered '
+            'WHERE hour >= ? AND hour < ? GROUP BY pump)',
+            (start, end if end is not None else 2 ** 62)
+        )[0][0]
+        pumps = {}
+        for pump, label, wh, cost, seconds in rows:
+            pumps.setdefault(pump, []).append({
+                'period': label,
+                'kwh': round(wh / 1000, 3),
+                'cost': round(cost, 4),
+                'metered_hours': round(seconds / 3600, 2)
+            })
+        return {
+            'period': period,
+            'tariff': self.tariff.describe(),
+            'pumps': pumps,
+            'total_kwh': round(sum(entry['kwh'] for entries in pumps.values() for entry in entries), 3),
+            'total_cost': round(sum(entry['cost'] for entries in pumps.values() for entry in entries), 4),
+            'unmetered_hours': round(unmetered / 3600, 2)
+        }
+
+def _hours(start: float, end: float):
+    '''(hour, start, seconds) of each clock hour the span start-end falls in'''
+    while start < end:
+        hour = int(start // 3600) * 3600
+        until = min(end, hour + 3600)
+        yield hour, start, until - start
+        start = until
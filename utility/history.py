@@ -0,0 +1,243 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from utility.logs import RATE_LIMITED
+
+# Retention per tier, in seconds (None keeps rows forever)
+RAW_RETENTION = 24 * 3600
+MINUTE_RETENTION = 30 * 24 * 3600
+HOUR_RETENTION = None
+
+# Rollup tiers: table name and bucket width in seconds
+ROLLUPS = (('rollup_minute', 60), ('rollup_hour', 3600))
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS samples_raw (
+    series TEXT NOT NULL,
+    ts REAL NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (series, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_minute (
+    series TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    total REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (series, bucket)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_hour (
+    series TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    total REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (series, bucket)
+) WITHOUT ROWID;
+'''
+
+def snapshot_samples(view) -> dict:
+    '''Series name -> value for everything worth keeping history of'''
+    samples = {'air_temp': view.meta.air_temp}
+    for body in view.bodies:
+        samples[f'water_temp.{body.name}'] = body.water_temp
+        samples[f'heater_active.{body.name}'] = int(body.heater_active)
+    for pump in view.pumps:
+        samples[f'pump_rpm.{pump.key}'] = pump.rpm
+        samples[f'pump_watts.{pump.key}'] = pump.watts
+    return {series: value for series, value in samples.items() if isinstance(value, (int, float))}
+
+class HistoryStore:
+    '''Append-only SQLite history of temperatures, pump and heater readings.
+        Register record() as a poller listener. Samples are queued and written
+        in batches by a background thread, so the poll loop never waits on
+        disk. Each raw sample is also folded into minute and hour rollups;
+        raw rows are kept for a day, minute rollups for 30 days and hourly
+        rollups forever.
+    '''
+    def __init__(self, path: str, flush_interval: float = 5, carry_forward: float = 60, max_queued: int = 10000):
+        self.path = path
+        self.flush_interval = flush_interval
+        # The poller only publishes changes, so a steady reading is written
+        # again this often to keep the rollups continuous
+        self.carry_forward = carry_forward
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._latest = {}
+        # fetched_at of the last snapshot recorded
+        self._last_fetched = None
+        self._last_written = 0
+        self._last_pruned = 0
+        self._local = threading.local()
+        self._thread_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._writers = []
+        self.dropped = 0
+        self.written = 0
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    def add_writer(self, schema: str, write):
+        '''Let another recorder share this database and writer thread.
+            schema is run once now; write(db) is called on every flush, on the
+            writer thread, and should write whatever it has buffered.
+        '''
+        with self._connect() as db:
+            db.executescript(schema)
+        self._writers.append(write)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=10)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        return db
+
+    def _reader(self) -> sqlite3.Connection:
+        # One read connection per thread; WAL lets them run alongside the writer
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = self._connect()
+        return db
+
+    def record(self, snapshot):
+        '''Queue the readings of a published snapshot'''
+        if snapshot.view is None or snapshot.fetched_at is None:
+            return
+        # A republished snapshot (a command sent or rolled back) carries the
+        # readings of a fetch already recorded; the rollups would count them twice
+        if snapshot.fetched_at == self._last_fetched:
+            return
+        self._last_fetched = snapshot.fetched_at
+        try:
+            self._queue.put_nowait((snapshot.fetched_at.timestamp(), snapshot_samples(snapshot.view)))
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        '''Start the writer thread. Safe to call more than once.'''
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+            self._thread.start()
+        logging.info('Started history writer, database %s', self.path)
+
+    def stop(self, timeout: float = None):
+        '''Stop the writer thread after a last flush, waiting up to timeout seconds for it'''
+        self._stop.set()
+        if timeout is not None and self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        db = self._connect()
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush(db)
+            except sqlite3.Error:
+                logging.exception('Failed to write history to %s', self.path, extra=RATE_LIMITED)
+        self.flush(db)
+        db.close()
+
+    def _drain(self) -> list:
+        rows = []
+        while True:
+            try:
+                ts, samples = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            rows.extend((series, ts, value) for series, value in samples.items())
+            self._latest.update(samples)
+            self._last_written = max(self._last_written, ts)
+        now = time.time()
+        if not rows and self._latest and now - self._last_written >= self.carry_forward:
+            rows = [(series, now, value) for series, value in self._latest.items()]
+            self._last_written = now
+        return rows
+
+    def flush(self, db: sqlite3.Connection):
+        '''Write everything queued so far in a single transaction'''
+        rows = self._drain()
+        if rows:
+            with db:
+                db.executemany('INSERT OR REPLACE INTO samples_raw (series, ts, value) VALUES (?, ?, ?)', rows)
+                for table, width in ROLLUPS:
+                    db.executemany(
+                        f'INSERT INTO {table} (series, bucket, count, total, min, max) VALUES (?, ?, 1, ?, ?, ?) '
+                        'ON CONFLICT (series, bucket) DO UPDATE SET count = count + 1, total = total + excluded.total, '
+                        'min = MIN(min, excluded.min), max = MAX(max, excluded.max)',
+                        [(series, int(ts // width) * width, value, value, value) for series, ts, value in rows]
+                    )
+            self.written += len(rows)
+        for write in self._writers:
+            with db:
+                write(db)
+        if time.time() - self._last_pruned > 3600:
+            self.prune(db)
+
+    def prune(self, db: sqlite3.Connection):
+        '''Drop rows that have aged out of their tier'''
+        now = time.time()
+        with db:
+            db.execute('DELETE FROM samples_raw WHERE ts < ?', (now - RAW_RETENTION,))
+            db.execute('DELETE FROM rollup_minute WHERE bucket < ?', (now - MINUTE_RETENTION,))
+            if HOUR_RETENTION is not None:
+                db.execute('DELETE FROM rollup_hour WHERE bucket < ?', (now - HOUR_RETENTION,))
+        self._last_pruned = now
+
+    def series(self) -> list:
+        '''Names of every series with hourly history'''
+        return [row[0] for row in self._reader().execute('SELECT DISTINCT series FROM rollup_hour ORDER BY series')]
+
+    def query(self, series: str, start: float, end: float = None, tier: str = None) -> list:
+        '''(timestamp, mean, min, max) rows for series between start and end.
+            tier is 'raw', 'minute' or 'hour'; by default the finest tier
+            that still covers start and keeps the row count chart sized.
+        '''
+        end = time.time() if end is None else end
+        tier = tier or pick_tier(start, end)
+        if tier == 'raw':
+            return self._reader().execute(
+                'SELECT ts, value, value, value FROM samples_raw WHERE series = ? AND ts BETWEEN ? AND ? ORDER BY ts',
+                (series, start, end)
+            ).fetchall()
+        table = f'rollup_{tier}'
+        return self._reader().execute(
+            f'SELECT bucket, total / count, min, max FROM {table} WHERE series = ? AND bucket BETWEEN ? AND ? ORDER BY bucket',
+            (series, start, end)
+        ).fetchall()
+
+    def read(self, sql: str, params: tuple = ()) -> list:
+        '''Run a read-only query on this thread's connection'''
+        return self._reader().execute(sql, params).fetchall()
+
+    def query_rollup(self, tier: str, start: float, end: float) -> list:
+        '''(series, bucket, count, total, min, max) rows of every series with
+            start <= bucket < end, for charts that aggregate buckets further.
+        '''
+        return self._reader().execute(
+            f'SELECT series, bucket, count, total, min, max FROM rollup_{tier} '
+            'WHERE bucket >= ? AND bucket < ? ORDER BY series, bucket',
+            (start, end)
+        ).fetchall()
+
+    def stats(self) -> dict:
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+        }
+
+def pick_tier(start: float, end: float, now: float = None) -> str:
+    now = time.time() if now is None else now
+    span = end - start
+    if start >= now - RAW_RETENTION and span <= 6 * 3600:
+        return 'raw'
+    if start >= now - MINUTE_RETENTION and span <= 7 * 24 * 3600:
+        return 'minute'
+    return 'hour'
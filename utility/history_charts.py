@@ -0,0 +1,148 @@
+import threading
+import time
+from datetime import datetime
+
+# Window label -> (span in seconds, rollup tier it is drawn from)
+HISTORY_WINDOWS = {
+    '1h': (3600, 'minute'),
+    '24h': (24 * 3600, 'minute'),
+    '7d': (7 * 24 * 3600, 'hour'),
+    '30d': (30 * 24 * 3600, 'hour'),
+}
+TIER_WIDTHS = {'minute': 60, 'hour': 3600}
+
+# Chart name -> (series name prefixes, y axis title)
+HISTORY_CHARTS = {
+    'temps': (('water_temp.', 'air_temp'), 'Temperature'),
+    'power': (('pump_watts.',), 'Watts'),
+}
+
+class _WindowFigures:
+    __slots__ = ('closed_until', 'buckets', 'figures')
+
+    def __init__(self, closed_until, buckets, figures):
+        self.closed_until = closed_until
+        # series -> [(bucket, count, total, min, max)] at the tier's resolution
+        self.buckets = buckets
+        self.figures = figures
+
+class HistoryCharts:
+    '''Chart figures for each history window, drawn from the rollup tables.
+        Every series is decimated to at most max_points (mean line plus a
+        min/max band), so a 30 day chart costs the same to send and render as
+        a 1 hour one. Figures are cached per window and only rebuilt when a
+        rollup bucket closes; the rebuild reads just the newly closed buckets.
+    '''
+    def __init__(self, store, max_points: int = 240, grace: float = 15):
+        self.store = store
+        self.max_points = max_points
+        # Rollup buckets keep receiving samples until the history writer has
+        # flushed, so a bucket counts as closed this long after it ends
+        self.grace = grace
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def figures(self, window: str, now: float = None) -> tuple:
+        '''(cache key, {chart name: figure}) for window.
+            The key only changes when the figures do, so callers can skip
+            sending figures a browser already has.
+        '''
+        span, tier = HISTORY_WINDOWS[window]
+        width = TIER_WIDTHS[tier]
+        now = time.time() if now is None else now
+        closed_until = int((now - self.grace) // width) * width
+        with self._lock:
+            cached = self._windows.get(window)
+            if cached is None or cached.closed_until != closed_until:
+                cached = self._refresh(window, cached, span, tier, closed_until)
+                self._windows[window] = cached
+        return f'{window}:{closed_until}', cached.figures
+
+    def _refresh(self, window, cached, span, tier, closed_until) -> _WindowFigures:
+        start = closed_until - span
+        if cached is None or cached.closed_until < start:
+            buckets, fetch_from = {}, start
+        else:
+            # Keep what is still inside the window, fetch only the new buckets
+            buckets = {series: [row for row in rows if row[0] >= start] for series, rows in cached.buckets.items()}
+            fetch_from = cached.closed_until
+        for series, bucket, count, total, low, high in self.store.query_rollup(tier, fetch_from, closed_until):
+            if _chart_for(series):
+                buckets.setdefault(series, []).append((bucket, count, total, low, high))
+        decimate_width = _decimate_width(span, TIER_WIDTHS[tier], self.max_points)
+        figures = {
+            chart: _figure(
+                {series: decimate(rows, decimate_width) for series, rows in buckets.items() if _chart_for(series) == chart},
+                axis_title
+            )
+            for chart, (_, axis_title) in HISTORY_CHARTS.items()
+        }
+        return _WindowFigures(closed_until, buckets, figures)
+
+def _chart_for(series: str):
+    for chart, (prefixes, _) in HISTORY_CHARTS.items():
+        if series.startswith(prefixes):
+            return chart
+    return None
+
+def _decimate_width(span: float, width: int, max_points: int) -> int:
+    '''Smallest multiple of the tier width that fits span into max_points'''
+    multiple = max(1, -(-span // (width * max_points)))
+    return int(width * multiple)
+
+def decimate(rows: list, width: int) -> list:
+    '''Merge (bucket, count, total, min, max) rows into width-second buckets.
+        Returns (bucket, mean, min, max) rows; the mean is weighted by sample
+        count so merged buckets agree with the raw data.
+    '''
+    merged = []
+    for bucket, count, total, low, high in rows:
+        start = bucket // width * width
+        if merged and merged[-1][0] == start:
+            _, m_count, m_total, m_low, m_high = merged[-1]
+            merged[-1] = (start, m_count + count, m_total + total, min(m_low, low), max(m_high, high))
+        else:
+            merged.append((start, count, total, low, high))
+    return [(start, total / count, low, high) for start, count, total, low, high in merged]
+
+def series_label(series: str) -> str:
+    '''Legend name for a series, e.g. water_temp.pool -> Pool'''
+    kind, _, name = series.partition('.')
+    if kind == 'air_temp':
+        return 'Air'
+    if kind == 'pump_watts':
+        return f'Pump {name}'
+    return name.capitalize()
+
+def _figure(series_points: dict, axis_title: str) -> dict:
+    '''Plotly figure dict: a mean line and a shaded min/max band per series.
+        Built as a plain dict so plotly is never imported by the server.
+    '''
+    traces = []
+    for series, points in sorted(series_points.items()):
+        label = series_label(series)
+        x = [datetime.fromtimestamp(point[0]).isoformat() for point in points]
+        traces.append({
+            'type': 'scatter', 'x': x, 'y': [point[3] for point in points], 'mode': 'lines',
+            'line': {'width': 0}, 'legendgroup': label, 'showlegend': False, 'hoverinfo': 'skip'
+        })
+        traces.append({
+            'type': 'scatter', 'x': x, 'y': [point[2] for point in points], 'mode': 'lines',
+            'line': {'width': 0}, 'fill': 'tonexty', 'fillcolor': 'rgba(128, 128, 128, 0.2)',
+            'legendgroup': label, 'showlegend': False, 'hoverinfo': 'skip'
+        })
+        traces.append({
+            'type': 'scatter', 'x': x, 'y': [round(point[1], 1) for point in points], 'mode': 'lines',
+            'name': label, 'legendgroup': label
+        })
+    return {
+        'data': traces,
+        'layout': {
+            'height': 250,
+            'margin': {'l': 50, 'r': 10, 't': 10, 'b': 30},
+            'xaxis': {'type': 'date'},
+            'yaxis': {'title': {'text': axis_title}},
+            'legend': {'orientation': 'h'},
+            'uirevision': axis_title
+        }
+    }
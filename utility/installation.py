@@ -0,0 +1,145 @@
+import logging
+import os
+
+from utility.async_control_functions import control_circuit as async_control_circuit
+from utility.async_control_functions import control_heater_setpoint as async_control_heater_setpoint
+from utility.async_control_functions import control_heater_status as async_control_heater_status
+from utility.async_runner import submit
+from utility.batch import run_batch
+from utility.command_queue import CoalescingCommandQueue
+from utility.energy import EnergyMeter
+from utility.history import HistoryStore
+from utility.history_charts import HistoryCharts
+from utility.poller import PoolDataPoller
+from utility.present import body_present
+from utility.push import EventBroadcaster
+from utility.state_store import PoolStateStore
+
+class Installation:
+    '''Everything the UI keeps for one ScreenLogic bridge.
+        Each installation has its own poller thread, snapshot, state store
+        and command queue, so a slow or dead bridge never delays the others.
+    '''
+    def __init__(self, name: str, api_url: str, poll_interval: float, schedule=None, batch_concurrency: int = 4):
+        self.name = name
+        self.api_url = api_url
+        # A single poller owns the fetch of /all for this bridge
+        self.poller = self._create_poller(poll_interval, schedule)
+        # Commands show up in the UI immediately and are reconciled against later polls
+        self.state_store = self._create_state_store(poll_interval)
+        # Slider drags and mode flips are coalesced per body into one write of the final value
+        self.heater_commands = CoalescingCommandQueue(self._send_heater_command, on_result=self.state_store.command_finished)
+        # Circuit switches go out at once, but in order per circuit; a flip
+        # made while one is in flight replaces any not yet sent
+        self.circuit_commands = CoalescingCommandQueue(
+            self._send_circuit_command, on_result=self.state_store.command_finished, quiet_period=0
+        )
+        # State store key -> circuit it switches
+        self._circuit_ids = {}
+        # Commands of a batch sent to the bridge at the same time
+        self.batch_concurrency = batch_concurrency
+        self.history = None
+        self.history_charts = None
+        self.energy = None
+        self.push_events = None
+        # Equipment found in the latest snapshot; equipment_version goes up
+        # whenever it changes so open pages know to rebuild their cards
+        self.supported_body_types = ()
+        self.bodies_present = []
+        self.equipment_version = 0
+        self._equipment = None
+
+    def _create_poller(self, poll_interval: float, schedule):
+        return PoolDataPoller(self.api_url, poll_interval, schedule)
+
+    def _create_state_store(self, poll_interval: float):
+        return PoolStateStore(self.poller, confirm_timeout=max(15, poll_interval * 3))
+
+    def enable_history(self, path: str, tariff, max_gap: float):
+        '''Record history and pump energy in the SQLite file at path'''
+        self.history = HistoryStore(path)
+        self.poller.add_listener(self.history.record)
+        self.history.start()
+        self.history_charts = HistoryCharts(self.history)
+        # Pump energy is kept in the history database, so it needs history enabled
+        self.energy = EnergyMeter(self.history, tariff, max_gap=max_gap)
+        self.poller.add_sample_listener(self.energy.sample)
+
+    def enable_push(self):
+        self.push_events = EventBroadcaster()
+        self.poller.add_listener(self.push_events.publish)
+
+    def watch_equipment(self, supported_body_types):
+        '''Detect equipment from every published snapshot, starting with the first one to arrive'''
+        self.supported_body_types = tuple(supported_body_types)
+        self.poller.add_listener(self.detect_equipment)
+
+    def detect_equipment(self, snapshot=None):
+        '''Figure out (from the pool data) which cards this installation needs'''
+        view = self.poller.view
+        if view is None:
+            return
+        equipment = _equipment_signature(view)
+        if equipment == self._equipment:
+            return
+        self.bodies_present = [body for body in self.supported_body_types if body_present(body, view)]
+        self._equipment = equipment
+        self.equipment_version += 1
+        logging.info('%s: Bodies Detected: %s', self.name, self.bodies_present)
+
+    def send_circuit_command(self, key, circuit_id, new_state, description):
+        '''Show new_state straight away and send the command from the background loop'''
+        self.state_store.expect(key, new_state, description)
+        self._circuit_ids[key] = circuit_id
+        self.circuit_commands.push(key, new_state)
+
+    def send_heater_command(self, key, value, description):
+        '''Show value straight away and send it once the slider or mode settles'''
+        self.state_store.expect(key, value, description)
+        self.heater_commands.push(key, value)
+
+    def run_batch(self, operations, stop_on_failure: bool = True):
+        '''Send parsed batch operations (see utility.batch) from the background loop.
+            Returns a concurrent Future of the per-operation results.
+        '''
+        return submit(run_batch(self, operations, self.batch_concurrency, stop_on_failure))
+
+    async def _send_circuit_command(self, key, value):
+        return await async_control_circuit(self.api_url, self._circuit_ids[key], int(value))
+
+    async def _send_heater_command(self, key, value):
+        command, body = key
+        if command == 'setpoint':
+            return await async_control_heater_setpoint(self.api_url, body, value)
+        return await async_control_heater_status(self.api_url, body, value)
+
+def _equipment_signature(view) -> tuple:
+    '''Everything that decides which cards and controls a page has, but none
+        of the readings or circuit states that change while it is open.
+    '''
+    return (
+        tuple((body.name, body.heater_present, body.heater.options) for body in view.bodies),
+        tuple((circuit.circuit_id, circuit.interface, circuit.name) for circuit in view.circuits),
+        tuple(pump.key for pump in view.pumps)
+    )
+
+def parse_installations(setting: str, default_url: str) -> dict:
+    '''Parse API_BASE_URLS, "name=url,name=url", into {name: url}.
+        Without it the single API_BASE_URL is served as installation "pool".
+    '''
+    if not setting:
+        return {'pool': default_url}
+    urls = {}
+    for entry in setting.split(','):
+        name, sep, url = entry.strip().partition('=')
+        if not sep or not name or not url:
+            raise ValueError(f'API_BASE_URLS entries must look like name=url, got {entry!r}')
+        urls[name.strip()] = url.strip()
+    return urls
+
+def history_path(path: str, name: str, shared: bool) -> str:
+    '''Per-installation history file: pool_history.sqlite3 -> pool_history-<name>.sqlite3'''
+    if not shared:
+        return path
+    root, ext = os.path.splitext(path)
+    return f'{root}-{name}{ext}'
@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+import threading
+import time
+
+# Pass as extra= on messages logged every poll or callback tick
+RATE_LIMITED = {'rate_limited': True}
+
+class RateLimitFilter(logging.Filter):
+    '''Let each rate limited message through at most once per interval.
+        Messages are told apart by their unformatted template, so with lazy
+        %-style arguments "Polled %s" is one message whatever the values.
+        The next one let through reports how many were dropped.
+    '''
+    def __init__(self, interval: float = 60):
+        super().__init__()
+        self.interval = interval
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, 'rate_limited', False):
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            last, suppressed = self._last.get(key, (None, 0))
+            if last is not None and now - last < self.interval:
+                self._last[key] = (last, suppressed + 1)
+                return False
+            self._last[key] = (now, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        return f'{text} ({suppressed} similar suppressed)' if suppressed else text
+
+class JsonFormatter(logging.Formatter):
+    '''One JSON object per line, for log shippers'''
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def configure_logging():
+    '''Set up the root logger from the environment.
+        LOG_LEVEL: DEBUG, INFO (default), WARNING, ...
+        LOG_FORMAT: text (default) or json
+        LOG_RATE_LIMIT: seconds between repeats of a per-tick message (default 60, 0 disables)
+    '''
+    level = os.getenv('LOG_LEVEL', 'INFO').upper()
+    handler = logging.StreamHandler()
+    if os.getenv('LOG_FORMAT', 'text').lower() == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    rate_limit = float(os.getenv('LOG_RATE_LIMIT', 60))
+    if rate_limit > 0:
+        handler.addFilter(RateLimitFilter(rate_limit))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+    # Per-request chatter (every backend call and retry, every Dash callback
+    # POST) is only wanted when debugging; poll failures are already logged,
+    # rate limited, by the poller
+    debugging = root.level <= logging.DEBUG
+    logging.getLogger('urllib3').setLevel(logging.DEBUG if debugging else logging.ERROR)
+    logging.getLogger('werkzeug').setLevel(logging.INFO if debugging else logging.WARNING)
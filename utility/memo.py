@@ -0,0 +1,47 @@
+import functools
+
+from utility.metrics import Histogram
+from utility.profiling import PROFILER
+
+BUILDER_SECONDS = Histogram('screenlogic_builder_seconds', 'Time to build a card on a cache miss', ('builder',))
+
+# Every memoized builder, by name, for hit-rate reporting
+_builders = {}
+
+def memoize_builder(maxsize: int = 16):
+    '''Cache a component builder's output in a bounded LRU.
+        The builder must take only hashable view model records (or tuples of
+        them), so the cache key is exactly the slice of pool data the card
+        renders and a card is rebuilt only when that slice changes.
+        The returned component tree is shared between callers and must not
+        be modified.
+    '''
+    def decorator(builder):
+        name = builder.__qualname__
+        profiled = PROFILER.wrap('builder', name, builder)
+
+        @functools.wraps(builder)
+        def timed(*args, **kwargs):
+            # Only runs on a cache miss
+            with BUILDER_SECONDS.time(builder=name):
+                return profiled(*args, **kwargs)
+
+        cached = functools.lru_cache(maxsize=maxsize)(timed)
+        _builders[name] = cached
+        return cached
+    return decorator
+
+def builder_cache_stats() -> dict:
+    '''Hits, misses, hit rate and size of every memoized builder'''
+    stats = {}
+    for name, cached in _builders.items():
+        info = cached.cache_info()
+        lookups = info.hits + info.misses
+        stats[name] = {
+            'hits': info.hits,
+            'misses': info.misses,
+            'hit_rate': info.hits / lookups if lookups else None,
+            'size': info.currsize,
+            'maxsize': info.maxsize
+        }
+    return stats
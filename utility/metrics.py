@@ -0,0 +1,174 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+from utility.profiling import PROFILER
+
+# Seconds; covers a fast LAN fetch up to a timed-out bridge
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(label, '')) for label in self.labels)
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, dict(zip(self.labels, key)), value) for key, value in self._values.items()]
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One count per bucket, then +Inf count and sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            values = {key: list(counts) for key, counts in self._values.items()}
+        for key, counts in values.items():
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', dict(labels, le=_number(bound)), cumulative))
+            cumulative += counts[len(self.buckets)]
+            samples.append((f'{self.name}_bucket', dict(labels, le='+Inf'), cumulative))
+            samples.append((f'{self.name}_count', labels, cumulative))
+            samples.append((f'{self.name}_sum', labels, counts[-1]))
+        return samples
+
+class Registry:
+    '''Metrics rendered by /metrics, in the Prometheus text format.
+        Counters and histograms register themselves; collectors are called
+        on every scrape and return (name, kind, help, [(labels, value)])
+        for values that are cheaper to read than to track, e.g. gauges.
+    '''
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def collect(self) -> list:
+        '''Every metric as (name, kind, help, [(sample name, labels, value)])'''
+        families = [(metric.name, metric.kind, metric.help, metric.samples()) for metric in self._metrics]
+        for collector in self._collectors:
+            for name, kind, help, samples in collector():
+                families.append((name, kind, help, [(name, labels, value) for labels, value in samples]))
+        return families
+
+    def render(self) -> str:
+        return render_families(self.collect())
+
+def with_labels(families: list, **labels) -> list:
+    '''families with labels added to every sample, e.g. the process they came from'''
+    return [
+        (name, kind, help, [(sample_name, dict(sample_labels, **labels), value) for sample_name, sample_labels, value in samples])
+        for name, kind, help, samples in families
+    ]
+
+def merge_families(*sources) -> list:
+    '''One family per metric name, with the samples of every source; a name
+        may appear only once in the text format
+    '''
+    merged = {}
+    for families in sources:
+        for name, kind, help, samples in families:
+            if name in merged:
+                merged[name][3].extend(samples)
+            else:
+                merged[name] = (name, kind, help, list(samples))
+    return list(merged.values())
+
+def render_families(families: list) -> str:
+    lines = []
+    for name, kind, help, samples in families:
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(_sample_line(sample_name, labels, value) for sample_name, labels, value in samples)
+    return '\n'.join(lines) + '\n'
+
+def _number(value) -> str:
+    if value is None:
+        return 'NaN'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _sample_line(name: str, labels: dict, value) -> str:
+    if labels:
+        label_text = ','.join(f'{label}="{_escape(text)}"' for label, text in labels.items())
+        return f'{name}{{{label_text}}} {_number(value)}'
+    return f'{name} {_number(value)}'
+
+REGISTRY = Registry()
+
+CALLBACK_SECONDS = Histogram('screenlogic_callback_seconds', 'Dash callback run time', ('callback',))
+CALLBACK_ERRORS = Counter('screenlogic_callback_errors_total', 'Dash callbacks that raised', ('callback',))
+
+def timed_callback(callback):
+    '''Record a Dash callback's run time; goes below @app.callback'''
+    name = callback.__name__
+    profiled = PROFILER.wrap('callback', name, callback)
+
+    @functools.wraps(callback)
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return profiled(*args, **kwargs)
+        except Exception as err:
+            # PreventUpdate and friends are control flow, not failures
+            if type(err).__module__.split('.')[0] != 'dash':
+                CALLBACK_ERRORS.inc(callback=name)
+            raise
+        finally:
+            CALLBACK_SECONDS.observe(time.perf_counter() - started, callback=name)
+    return timed
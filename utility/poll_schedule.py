@@ -0,0 +1,55 @@
+import random
+import threading
+import time
+
+class AdaptiveSchedule:
+    '''Decides how long the poller waits before its next fetch.
+        In order of precedence:
+        - backoff: after failures, interval * 2^failures with +/- jitter
+        - burst: min_interval for burst_duration seconds after a command,
+          so the change is confirmed quickly
+        - idle: max_interval while no page has read the data for idle_after
+        - unchanged: twice the interval once nothing changed for unchanged_after
+        - normal: the configured interval
+        Every result is kept between min_interval and max_interval.
+    '''
+    def __init__(self, interval: float, min_interval: float = 1, max_interval: float = 60,
+                 burst_duration: float = 10, idle_after: float = 120, unchanged_after: float = 300,
+                 jitter: float = 0.2):
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.burst_duration = burst_duration
+        self.idle_after = idle_after
+        self.unchanged_after = unchanged_after
+        self.jitter = jitter
+        self._burst_until = 0
+        self._lock = threading.Lock()
+
+    def start_burst(self):
+        with self._lock:
+            self._burst_until = time.monotonic() + self.burst_duration
+
+    def is_idle(self, poller, now: float = None) -> bool:
+        '''True when no page has read this poller's data for idle_after seconds'''
+        now = time.monotonic() if now is None else now
+        return poller.last_client_seen is None or now - poller.last_client_seen > self.idle_after
+
+    def next_interval(self, poller, now: float = None) -> tuple:
+        '''(seconds until the next fetch, reason)'''
+        now = time.monotonic() if now is None else now
+        if poller.consecutive_failures:
+            # Cap the exponent, the result is clamped to max_interval anyway
+            backoff = self.interval * 2 ** min(poller.consecutive_failures, 16)
+            backoff *= 1 + random.uniform(-self.jitter, self.jitter)
+            return self._clamp(backoff), 'backoff'
+        if now < self._burst_until:
+            return self.min_interval, 'burst'
+        if self.is_idle(poller, now):
+            return self.max_interval, 'idle'
+        if now - poller.last_change > self.unchanged_after:
+            return self._clamp(self.interval * 2), 'unchanged'
+        return self._clamp(self.interval), 'normal'
+
+    def _clamp(self, seconds: float) -> float:
+        return min(self.max_interval, max(self.min_interval, seconds))
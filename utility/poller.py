@@ -0,0 +1,289 @@
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+import requests
+
+from utility.backend_client import get_client
+from utility.logs import RATE_LIMITED
+from utility.metrics import Histogram
+from utility.snapshot_diff import diff_snapshots
+from utility.view_model import PoolView
+
+POLL_SECONDS = Histogram(
+    'screenlogic_poll_seconds', 'Fetch, diff and parse of /all by outcome', ('backend', 'result')
+)
+# Changesets kept for pages that missed a few versions, e.g. a background
+# tab whose interval was throttled, or several commands in one tick
+CHANGE_HISTORY = 16
+
+@dataclass(frozen=True)
+class PoolSnapshot:
+    '''One published copy of the /all payload.
+        version increases by one every time the fetched data changes, so
+        callbacks can tell whether they have already seen a snapshot.
+        changes holds the paths that differ from the previous version, or
+        None when readers should treat everything as changed.
+        view is the parsed PoolView of data (None before the first fetch).
+    '''
+    version: int = 0
+    data: dict = field(default_factory=dict)
+    fetched_at: Optional[datetime] = None
+    changes: dict = field(default_factory=dict)
+    view: Optional[PoolView] = None
+
+def changes_since(changesets, version) -> Optional[dict]:
+    '''All paths changed after version, from (version, changes) pairs in order.
+        None when a version in between is no longer kept, or changed everything,
+        so the reader has to treat everything as changed.
+    '''
+    if version is None:
+        return None
+    merged = {}
+    expected = version + 1
+    for changeset_version, changes in changesets:
+        if changeset_version <= version:
+            continue
+        if changeset_version != expected or changes is None:
+            return None
+        merged.update(changes)
+        expected += 1
+    # Nothing newer than version at all: the reader is not behind this history
+    return merged if expected > version + 1 else None
+
+class PoolDataPoller:
+    '''Process-wide poller that owns the fetch of /all.
+        A single daemon thread fetches on a fixed cadence (or one set by an
+        AdaptiveSchedule) and publishes a new PoolSnapshot; callbacks only
+        ever read the latest snapshot, so backend load is independent of the
+        number of connected browsers.
+    '''
+    def __init__(self, api_url: str, interval: float, schedule=None):
+        self.api_url = api_url
+        self.interval = interval
+        self.schedule = schedule
+        self.client = get_client(api_url)
+        self._snapshot = PoolSnapshot()
+        self._changesets = deque(maxlen=CHANGE_HISTORY)
+        # Guards publishing a snapshot; never held across a fetch
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._listeners = []
+        self._sample_listeners = []
+        # Poll statistics
+        self.last_attempt = None
+        self.last_success = None
+        self.last_latency = None
+        self.consecutive_failures = 0
+        self.total_failures = 0
+        self.total_polls = 0
+        self.unchanged_polls = 0
+        self.last_change = time.monotonic()
+        self.last_client_seen = None
+        self.effective_interval = interval
+        self.schedule_reason = 'fixed'
+
+    @property
+    def snapshot(self) -> PoolSnapshot:
+        return self._snapshot
+
+    @property
+    def data(self) -> dict:
+        return self._snapshot.data
+
+    @property
+    def view(self) -> PoolView:
+        return self._snapshot.view
+
+    def poll_once(self) -> bool:
+        '''Fetch /all once and publish a new snapshot on success.
+            The fetch, diff and parse happen without holding _lock, so
+            republish() (and with it every command) never waits on the bridge.
+        '''
+        # Only one fetch at a time; the payload only ever changes here
+        with self._fetch_lock:
+            self.last_attempt = datetime.now()
+            self.total_polls += 1
+            started = time.perf_counter()
+            base = self._snapshot
+            try:
+                # None when the body is byte-for-byte unchanged, skipping all parsing
+                pool_data = self.client.get_all_if_changed()
+                self.last_latency = time.perf_counter() - started
+                if pool_data is None:
+                    changes, view = {}, base.view
+                else:
+                    changes = diff_snapshots(base.data, pool_data)
+                    # Only parse payloads that changed; this also validates them
+                    view = PoolView.from_payload(pool_data) if changes else base.view
+            except ValueError as err:
+                # The body didn't parse or validate; fetch it in full again next time
+                self.client.forget_all()
+                return self._failed(started, err)
+            except requests.RequestException as err:
+                return self._failed(started, err)
+            POLL_SECONDS.observe(time.perf_counter() - started, backend=self.api_url, result='changed' if changes else 'unchanged')
+            self.last_success = datetime.now()
+            self.consecutive_failures = 0
+            fetched_at = self.last_success
+            snapshot = None
+            if not changes:
+                # Nothing moved, keep the current version so readers skip work
+                self.unchanged_polls += 1
+            else:
+                with self._lock:
+                    # A republish() since base only bumped the version, the data is still base.data
+                    snapshot = self._publish(PoolSnapshot(self._snapshot.version + 1, pool_data, fetched_at, changes, view))
+                self.last_change = time.monotonic()
+                logging.debug('Published snapshot %s with %s changes in %.3fs', snapshot.version, len(changes), self.last_latency)
+        self._notify_sample(fetched_at, view)
+        if snapshot is not None:
+            self._notify(snapshot)
+        return True
+
+    def _failed(self, started, err) -> bool:
+        self.last_latency = time.perf_counter() - started
+        POLL_SECONDS.observe(self.last_latency, backend=self.api_url, result='failed')
+        self.consecutive_failures += 1
+        self.total_failures += 1
+        logging.warning('Failed to fetch %s/all: %s', self.api_url, err, extra=RATE_LIMITED)
+        return False
+
+    def republish(self, changes: dict = None):
+        '''Publish the current data again as a new version.
+            Used when what pages should display changed without the payload
+            changing, e.g. a pending command was added or rolled back, so every
+            page re-syncs on its next tick. Without changes, readers treat
+            everything as changed.
+        '''
+        with self._lock:
+            current = self._snapshot
+            snapshot = self._publish(PoolSnapshot(current.version + 1, current.data, current.fetched_at, changes, current.view))
+        self._notify(snapshot)
+
+    def _publish(self, snapshot: PoolSnapshot) -> PoolSnapshot:
+        # Called with _lock held
+        self._snapshot = snapshot
+        self._changesets.append((snapshot.version, snapshot.changes))
+        return snapshot
+
+    def changes_since(self, version) -> Optional[dict]:
+        '''Paths changed between version and the current snapshot, or None
+            when they are not known and everything has to count as changed
+        '''
+        with self._lock:
+            return changes_since(self._changesets, version)
+
+    def recent_changes(self) -> list:
+        '''The kept (version, changes) pairs, oldest first'''
+        with self._lock:
+            return list(self._changesets)
+
+    def request_poll(self):
+        '''Ask the poller thread to fetch now instead of at the next interval'''
+        self._wake.set()
+
+    def burst(self):
+        '''A command was sent: fetch now and, with a schedule, quickly for a while'''
+        if self.schedule is not None:
+            self.schedule.start_burst()
+        self.request_poll()
+
+    def touch(self):
+        '''A page is reading this poller's data.
+            Starts the poller if needed and, if the schedule had slowed down
+            for lack of readers, fetches straight away.
+        '''
+        was_idle = self.schedule is not None and self.schedule.is_idle(self)
+        self.last_client_seen = time.monotonic()
+        self.start()
+        if was_idle:
+            self.request_poll()
+
+    def add_listener(self, listener):
+        '''Call listener(snapshot) every time a changed snapshot is published'''
+        self._listeners.append(listener)
+
+    def add_sample_listener(self, listener):
+        '''Call listener(fetched_at, view) after every successful fetch, changed or not.
+            For consumers that need to know the readings were still current,
+            e.g. integrating pump watts over time.
+        '''
+        self._sample_listeners.append(listener)
+
+    def _notify_sample(self, fetched_at, view):
+        for listener in self._sample_listeners:
+            try:
+                listener(fetched_at, view)
+            except Exception:
+                logging.exception('Sample listener %s failed', listener, extra=RATE_LIMITED)
+
+    def _notify(self, snapshot):
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception:
+                logging.exception('Snapshot listener %s failed', listener, extra=RATE_LIMITED)
+
+    def start(self):
+        '''Start the background thread. Safe to call more than once.'''
+        if self.interval <= 0:
+            return
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='pool-data-poller', daemon=True)
+            self._thread.start()
+        logging.info('Started pool data poller for %s, interval %ss', self.api_url, self.interval)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            self.poll_once()
+            # Keep the cadence regardless of how long the fetch took
+            self._wake.wait(max(0, self._next_interval() - (time.monotonic() - started)))
+            self._wake.clear()
+
+    def _next_interval(self) -> float:
+        if self.schedule is None:
+            return self.interval
+        interval, reason = self.schedule.next_interval(self)
+        if reason != self.schedule_reason:
+            logging.debug('Polling %s every %.1fs (%s)', self.api_url, interval, reason)
+        self.effective_interval = interval
+        self.schedule_reason = reason
+        return interval
+
+    def is_stale(self, stale_interval) -> bool:
+        '''True when the last successful fetch is older than stale_interval'''
+        if self.last_success is None:
+            return True
+        return bool((datetime.now() - self.last_success) > stale_interval)
+
+    def stats(self) -> dict:
+        return {
+            'version': self._snapshot.version,
+            'last_attempt': self.last_attempt,
+            'last_success': self.last_success,
+            'fetch_latency': self.last_latency,
+            'consecutive_failures': self.consecutive_failures,
+            'total_failures': self.total_failures,
+            'total_polls': self.total_polls,
+            'unchanged_polls': self.unchanged_polls,
+            'effective_interval': self.effective_interval,
+            'schedule_reason': self.schedule_reason,
+            'circuit_open': self.client.breaker.is_open,
+        }
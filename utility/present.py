@@ -1,18 +1,30 @@
-def body_present(body_name: str, pool_data: dict) -> bool:
-    for body in pool_data['status']['bodies']:
-        if body['name'] == body_name:
-            return True
-    return False
+from utility.view_model import PoolView
 
-def need_ui(pool_data: dict, ui_int: int) -> bool:
-    for config in pool_data['controllerConfig']['bodyArray']:
-        if config['interface'] == ui_int:
-            return True
-    return False
+def body_present(body_name: str, view: PoolView) -> bool:
+    return body_name in view.bodies_by_name
+
+def need_ui(view: PoolView, ui_int: int) -> bool:
+    return bool(view.interface_circuits(ui_int))
+
+def body_active(view: PoolView, body_name: str) -> bool:
+    body = view.body(body_name)
+    return bool(body and body.active)
+
+def body_setpoint(view: PoolView, body_name: str):
+    body = view.body(body_name)
+    return body.heater.setpoint_current if body else None
+
+def body_heat_mode(view: PoolView, body_name: str) -> int:
+    body = view.body(body_name)
+    return body.heater.mode_code if body else 0
+
+def circuit_state(view: PoolView, circuit_id: int):
+    circuit = view.circuit(circuit_id)
+    return circuit.state if circuit else None
 
 
 # Data I will need later for lights...
 # light_config['name'] = config['name']
 # light_config['present'] = True
 # light_config['circuitId'] = config['circuitId']
-# light_config['function'] = config['function']
\ No newline at end of file
+# light_config['function'] = config['function']
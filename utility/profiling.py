@@ -0,0 +1,184 @@
+import functools
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from contextlib import contextmanager
+
+# Leaf functions of threads that are waiting, not working; their samples are
+# left out of flame graphs unless asked for
+IDLE_FUNCTIONS = frozenset({'wait', 'select', 'poll', 'accept', 'readinto', 'recv_into', '_wait_for_tstate_lock'})
+
+class Profiler:
+    '''Opt-in profiling of a running server.
+        While enabled:
+        - every wrapped call (Dash callbacks, card builders, backend calls)
+          records its wall time, CPU time of its thread and the change in
+          allocated memory blocks (process wide, so only indicative when
+          other threads are busy at the same time)
+        - a sampler thread records the stack of every thread each
+          sample_interval seconds, kept for the last window seconds, which
+          collapsed() turns into flame graph input
+        - with trace_memory, tracemalloc tracks where memory was allocated
+        While disabled, a wrapped call costs one attribute check.
+    '''
+    def __init__(self, sample_interval: float = 0.01, window: float = 300):
+        self.enabled = False
+        self.sample_interval = sample_interval
+        self.window = window
+        self.started = None
+        # (kind, name) -> [count, wall, max wall, cpu, allocated blocks]
+        self._calls = {}
+        # (whole second, Counter of collapsed stacks) for the last window seconds
+        self._samples = deque()
+        self._sampler = None
+        self._lock = threading.Lock()
+
+    def start(self, sample_interval: float = None, trace_memory: bool = False):
+        '''Clear what was recorded before and start recording'''
+        with self._lock:
+            if sample_interval:
+                self.sample_interval = sample_interval
+            self._calls = {}
+            self._samples.clear()
+            self.started = time.time()
+            self.enabled = True
+            if trace_memory and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            if self._sampler is None or not self._sampler.is_alive():
+                self._sampler = threading.Thread(target=self._sample_loop, name='profile-sampler', daemon=True)
+                self._sampler.start()
+
+    def stop(self):
+        '''Stop recording; what was recorded can still be read'''
+        with self._lock:
+            self.enabled = False
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+    def wrap(self, kind: str, name: str, function):
+        '''function, recorded as kind/name while profiling is enabled'''
+        @functools.wraps(function)
+        def profiled(*args, **kwargs):
+            if not self.enabled:
+                return function(*args, **kwargs)
+            with self.span(kind, name):
+                return function(*args, **kwargs)
+        return profiled
+
+    @contextmanager
+    def span(self, kind: str, name: str, cpu: bool = True):
+        '''Record the block as one call of kind/name.
+            Pass cpu=False for coroutines, whose thread runs other tasks while they wait.
+        '''
+        blocks = sys.getallocatedblocks()
+        cpu_started = time.thread_time() if cpu else None
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - started
+            cpu_time = time.thread_time() - cpu_started if cpu else 0
+            self.record(kind, name, wall, cpu_time, sys.getallocatedblocks() - blocks)
+
+    def record(self, kind: str, name: str, wall: float, cpu: float = 0, blocks: int = 0):
+        with self._lock:
+            call = self._calls.get((kind, name))
+            if call is None:
+                call = self._calls[(kind, name)] = [0, 0.0, 0.0, 0.0, 0]
+            call[0] += 1
+            call[1] += wall
+            call[2] = max(call[2], wall)
+            call[3] += cpu
+            call[4] += blocks
+
+    def call_stats(self) -> list:
+        '''Per kind/name totals and means, slowest in total first'''
+        with self._lock:
+            calls = {key: list(call) for key, call in self._calls.items()}
+        stats = [
+            {
+                'kind': kind,
+                'name': name,
+                'count': count,
+                'wall_total': wall,
+                'wall_mean': wall / count,
+                'wall_max': wall_max,
+                'cpu_total': cpu,
+                'cpu_mean': cpu / count,
+                'blocks_mean': blocks / count
+            }
+            for (kind, name), (count, wall, wall_max, cpu, blocks) in calls.items()
+        ]
+        return sorted(stats, key=lambda stat: stat['wall_total'], reverse=True)
+
+    def collapsed(self, seconds: float = None, idle: bool = False) -> str:
+        '''Stacks sampled over the last seconds in the collapsed format,
+            "thread;outer;...;inner count" per line, as read by flamegraph.pl,
+            speedscope and most other flame graph tools.
+        '''
+        since = time.time() - (seconds if seconds else self.window)
+        totals = Counter()
+        with self._lock:
+            for second, stacks in self._samples:
+                if second >= int(since):
+                    totals.update(stacks)
+        if not idle:
+            totals = Counter({stack: count for stack, count in totals.items()
+                              if stack.rsplit(';', 1)[-1].split(' ', 1)[0] not in IDLE_FUNCTIONS})
+        return ''.join(f'{stack} {count}\n' for stack, count in totals.most_common())
+
+    def memory_top(self, limit: int = 25) -> list:
+        '''Source lines holding the most traced memory, when tracing memory'''
+        if not tracemalloc.is_tracing():
+            return []
+        top = tracemalloc.take_snapshot().statistics('lineno')[:limit]
+        return [{'where': str(stat.traceback), 'kib': stat.size / 1024, 'blocks': stat.count} for stat in top]
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        names = {}
+        while self.enabled:
+            now = time.time()
+            stacks = Counter()
+            frames = sys._current_frames()
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stacks[_collapse(names.get(ident, str(ident)), frame)] += 1
+            # Frames keep their locals alive
+            frames = frame = None
+            second = int(now)
+            with self._lock:
+                if self._samples and self._samples[-1][0] == second:
+                    self._samples[-1][1].update(stacks)
+                else:
+                    self._samples.append((second, stacks))
+                while self._samples and self._samples[0][0] < now - self.window:
+                    self._samples.popleft()
+            time.sleep(self.sample_interval)
+
+def _collapse(thread_name: str, frame) -> str:
+    '''thread;outermost;...;innermost, one "function (file:line)" per frame'''
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    frames.append(thread_name.replace(';', ':').replace(' ', '_'))
+    return ';'.join(reversed(frames))
+
+PROFILER = Profiler(
+    sample_interval=float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.01)),
+    window=float(os.getenv('PROFILE_WINDOW', 300))
+)
+
+def profiled(kind: str = 'builder'):
+    '''Record every call of the decorated function while PROFILER is enabled'''
+    def decorator(function):
+        return PROFILER.wrap(kind, function.__qualname__, function)
+    return decorator
@@ -0,0 +1,64 @@
+import json
+import logging
+import queue
+import threading
+
+class EventBroadcaster:
+    '''Fan snapshot change events out to Server-Sent Events subscribers.
+        Register publish() as a poller listener; every open /events stream
+        gets its own bounded queue, so a slow tablet only drops its own
+        oldest events instead of holding up the poller.
+    '''
+    def __init__(self, heartbeat: float = 15, max_queued: int = 16):
+        self.heartbeat = heartbeat
+        self.max_queued = max_queued
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    @property
+    def client_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, snapshot):
+        event = {
+            'version': snapshot.version,
+            'paths': None if snapshot.changes is None else sorted(snapshot.changes)
+        }
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # Only the newest version matters, drop the oldest event
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                subscriber.put_nowait(event)
+
+    def stream(self, version_source):
+        '''Generator of SSE frames for one client.
+            version_source() returns the current snapshot version, sent with
+            heartbeats so idle pages can still notice stale data.
+        '''
+        subscriber = queue.Queue(maxsize=self.max_queued)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        logging.debug('Push client connected, %s connected', self.client_count)
+        try:
+            # Tell the page which version is current as soon as it connects
+            yield _frame({'version': version_source(), 'heartbeat': True})
+            while True:
+                try:
+                    event = subscriber.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    event = {'version': version_source(), 'heartbeat': True}
+                yield _frame(event)
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+            logging.debug('Push client disconnected, %s connected', self.client_count)
+
+def _frame(event: dict) -> str:
+    return f'data: {json.dumps(event)}\n\n'
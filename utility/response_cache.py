@@ -0,0 +1,79 @@
+import gzip
+import threading
+from collections import OrderedDict
+
+from utility.metrics import Counter
+
+try:
+    # Optional, smaller than gzip for JSON; used when the browser accepts it
+    import brotli
+except ImportError:
+    brotli = None
+
+RESPONSE_CACHE_LOOKUPS = Counter(
+    'screenlogic_response_cache_total', 'Cached callback response lookups by result', ('result',)
+)
+
+class CachedResponse:
+    '''One serialized response, plus its compressed forms (made on first use)'''
+    __slots__ = ('body', '_encoded', '_lock')
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: str) -> bytes:
+        with self._lock:
+            data = self._encoded.get(encoding)
+            if data is None:
+                if encoding == 'br':
+                    data = brotli.compress(self.body, quality=5)
+                else:
+                    data = gzip.compress(self.body, compresslevel=6)
+                self._encoded[encoding] = data
+            return data
+
+class ResponseCache:
+    '''Bounded LRU of serialized callback responses.
+        Clients asking for the same thing in the same state (e.g. every page
+        catching up to the same snapshot version) get the bytes built for the
+        first of them, compressed at most once per encoding.
+    '''
+    def __init__(self, maxsize: int = 64, compress_min: int = 1024):
+        self.maxsize = maxsize
+        # Responses smaller than this are sent uncompressed
+        self.compress_min = compress_min
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        RESPONSE_CACHE_LOOKUPS.inc(result='miss' if entry is None else 'hit')
+        return entry
+
+    def put(self, key, body: bytes) -> CachedResponse:
+        entry = CachedResponse(body)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def encoding_for(self, entry: CachedResponse, accept_encoding: str):
+        '''Best encoding the client accepts for entry, None to send it as is'''
+        if len(entry.body) < self.compress_min:
+            return None
+        accepted = {part.split(';')[0].strip() for part in accept_encoding.lower().split(',')}
+        if brotli is not None and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted:
+            return 'gzip'
+        return None
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,93 @@
+import json
+import logging
+import os
+import threading
+
+from utility.present import body_active, body_heat_mode, body_setpoint, circuit_state
+from utility.view_model import INTERFACE_FEATURE
+
+class SceneStore:
+    '''Named scenes (batches of operations, see utility.batch) per installation,
+        kept in a JSON file {"installation": {"scene": [operation, ...]}}.
+        The file is read again when it changes on disk, so scenes saved by
+        another worker process, or edited by hand, show up without a restart.
+    '''
+    def __init__(self, path: str):
+        self.path = path
+        self._scenes = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def scenes(self, installation: str) -> dict:
+        '''Scene name -> operations for installation'''
+        with self._lock:
+            self._reload()
+            return dict(self._scenes.get(installation, {}))
+
+    def get(self, installation: str, name: str):
+        return self.scenes(installation).get(name)
+
+    def save(self, installation: str, name: str, operations: list):
+        with self._lock:
+            self._reload()
+            self._scenes.setdefault(installation, {})[name] = operations
+            self._write()
+
+    def delete(self, installation: str, name: str) -> bool:
+        with self._lock:
+            self._reload()
+            scenes = self._scenes.get(installation, {})
+            if scenes.pop(name, None) is None:
+                return False
+            self._write()
+            return True
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            self._scenes, self._mtime = {}, None
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path) as f:
+                self._scenes = json.load(f)
+        except (OSError, ValueError):
+            logging.exception('Could not read scenes from %s', self.path)
+            return
+        self._mtime = mtime
+
+    def _write(self):
+        # Readers in other processes see either the old file or the new one
+        temporary = f'{self.path}.{os.getpid()}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(self._scenes, f, indent=2, sort_keys=True)
+        os.replace(temporary, self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+def scene_from_view(view, state_store, body_names: list, lights=None) -> list:
+    '''Operations that bring the installation back to what the UI shows now:
+        each body on or off with its heater mode and setpoint, and every
+        feature circuit. Pending commands count as done. lights, a
+        LIGHT_COMMANDS name, adds a lights command.
+    '''
+    operations = []
+    for name in body_names:
+        body = view.body(name)
+        if body is None:
+            continue
+        operations.append({'type': 'body', 'body': name,
+                           'value': int(state_store.value(('body', name), body_active(view, name)))})
+        if body.heater.options:
+            operations.append({'type': 'mode', 'body': name,
+                               'value': state_store.value(('mode', name), body_heat_mode(view, name))})
+        setpoint = state_store.value(('setpoint', name), body_setpoint(view, name))
+        if setpoint is not None:
+            operations.append({'type': 'setpoint', 'body': name, 'value': setpoint})
+    for circuit in view.interface_circuits(INTERFACE_FEATURE):
+        state = state_store.value(('circuit', circuit.circuit_id), circuit_state(view, circuit.circuit_id))
+        operations.append({'type': 'circuit', 'circuit_id': circuit.circuit_id, 'value': int(bool(state))})
+    if lights:
+        operations.append({'type': 'lights', 'value': lights})
+    return operations
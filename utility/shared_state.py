@@ -0,0 +1,473 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from utility.async_runner import get_loop, submit
+from utility.backend_client import json_loads
+from utility.batch import parse_operations, run_batch
+from utility.energy import EnergyMeter
+from utility.history import HistoryStore
+from utility.history_charts import HistoryCharts
+from utility.installation import Installation
+from utility.logs import RATE_LIMITED
+from utility.metrics import REGISTRY, with_labels
+from utility.poller import PoolSnapshot, changes_since
+from utility.view_model import PoolView
+
+# Multi-worker mode: one owner process polls every bridge, records history
+# and sends every command; the web workers render pages from the snapshots
+# it writes to SHARED_STATE_DIR and send their commands to it over a unix socket.
+
+def snapshot_path(directory: str, name: str) -> str:
+    return os.path.join(directory, f'{name}.snapshot.json')
+
+def status_path(directory: str, name: str) -> str:
+    return os.path.join(directory, f'{name}.status.json')
+
+def command_socket_path(directory: str) -> str:
+    return os.path.join(directory, 'commands.sock')
+
+def metrics_path(directory: str) -> str:
+    return os.path.join(directory, 'owner.metrics.json')
+
+def read_owner_metrics(directory: str) -> list:
+    '''The owner's metric families, as last written by its SnapshotPublisher'''
+    try:
+        with open(metrics_path(directory)) as f:
+            return json_loads(f.read())
+    except FileNotFoundError:
+        return []
+
+def _timestamp(value: datetime):
+    return value.timestamp() if value is not None else None
+
+def _datetime(value):
+    return datetime.fromtimestamp(value) if value is not None else None
+
+def _write_atomic(path: str, document):
+    '''Readers see either the old file or the new one, never a partial write'''
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(document, f, separators=(',', ':'))
+    os.replace(temporary, path)
+
+class SnapshotPublisher:
+    '''Owner side: write each installation's snapshot and poll status to files.
+        The snapshot file, with the payload, pending command overlays and
+        command errors, is written when a new version is published; the
+        small status file whenever the poll statistics change. Writing
+        happens on this thread, so the poll loop never waits on disk.
+        The owner serves no HTTP, so its metrics (polls, bridge calls,
+        commands) go to a file too, every metrics_interval seconds, and the
+        workers add them to their /metrics.
+    '''
+    def __init__(self, directory: str, installations: dict, interval: float = 0.25, metrics_interval: float = 5):
+        self.directory = directory
+        self.installations = installations
+        self.interval = interval
+        self.metrics_interval = metrics_interval
+        self._written = {}
+        self._metrics_written = None
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        for installation in self.installations.values():
+            installation.poller.add_listener(lambda snapshot: self._wake.set())
+        self.publish()
+        self._thread = threading.Thread(target=self._run, name='snapshot-publisher', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.publish()
+            except OSError:
+                logging.exception('Failed to write shared snapshots to %s', self.directory, extra=RATE_LIMITED)
+
+    def publish(self):
+        for name, installation in self.installations.items():
+            poller = installation.poller
+            snapshot = poller.snapshot
+            written_version, written_status = self._written.get(name, (None, None))
+            if snapshot.version != written_version:
+                error_seq, errors = installation.state_store.recent_errors()
+                _write_atomic(snapshot_path(self.directory, name), {
+                    'version': snapshot.version,
+                    'fetched_at': _timestamp(snapshot.fetched_at),
+                    'changes': None if snapshot.changes is None else sorted(snapshot.changes),
+                    'recent_changes': [
+                        [version, None if changes is None else sorted(changes)] for version, changes in poller.recent_changes()
+                    ],
+                    'data': snapshot.data,
+                    'pending': [[kind, target, value] for (kind, target), value in installation.state_store.pending_values()],
+                    'error_seq': error_seq,
+                    'errors': errors
+                })
+            stats = poller.stats()
+            status = dict(
+                stats,
+                last_attempt=_timestamp(stats['last_attempt']),
+                last_success=_timestamp(stats['last_success'])
+            )
+            if status != written_status:
+                _write_atomic(status_path(self.directory, name), status)
+            self._written[name] = (snapshot.version, status)
+        now = time.monotonic()
+        if self._metrics_written is None or now - self._metrics_written >= self.metrics_interval:
+            _write_atomic(metrics_path(self.directory), with_labels(REGISTRY.collect(), process='owner'))
+            self._metrics_written = now
+
+class CommandServer:
+    '''Owner side: run the commands worker processes send over a unix socket.
+        Each request is one JSON line and gets one JSON line back. Requests
+        are handled on the background event loop, one at a time in the order
+        they arrive, and go through the owner's Installation exactly as a
+        click on a single-process server does.
+    '''
+    def __init__(self, path: str, installations: dict):
+        self.path = path
+        self.installations = installations
+        self._server = None
+
+    def start(self):
+        asyncio.run_coroutine_threadsafe(self._start(), get_loop()).result(timeout=10)
+        logging.info('Accepting commands from workers on %s', self.path)
+
+    async def _start(self):
+        if os.path.exists(self.path):
+            # Left behind by an owner that did not shut down cleanly
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, self.path)
+
+    async def _handle(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                try:
+                    message = json.loads(line)
+                    if message.get('op') == 'batch':
+                        reply = await self.run_batch(message)
+                    else:
+                        reply = self.run(message)
+                except Exception as err:
+                    logging.exception('Worker command %s failed', line[:200])
+                    reply = {'ok': False, 'error': str(err)}
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def run_batch(self, message: dict) -> dict:
+        installation = self.installations[message['installation']]
+        operations = parse_operations(message['operations'], installation.poller.view)
+        results = await run_batch(installation, operations, installation.batch_concurrency, message['stop_on_failure'])
+        return {'ok': True, 'results': results}
+
+    def run(self, message: dict) -> dict:
+        installation = self.installations[message['installation']]
+        op = message['op']
+        if op == 'touch':
+            installation.poller.touch()
+        elif op == 'circuit':
+            installation.send_circuit_command(
+                tuple(message['key']), message['circuit_id'], message['state'], message['description']
+            )
+        elif op == 'heater':
+            installation.send_heater_command(tuple(message['key']), message['value'], message['description'])
+        else:
+            raise ValueError(f'Unknown command {op!r}')
+        return {'ok': True}
+
+class OwnerClient:
+    '''Worker side: send requests to the owner's CommandServer.
+        Keeps one connection open and reconnects once when it was dropped,
+        e.g. because the owner restarted.
+    '''
+    def __init__(self, path: str, timeout: float = 5):
+        self.path = path
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._lock = None
+
+    async def call(self, message: dict) -> dict:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._writer is None:
+                        self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+                    self._writer.write(json.dumps(message).encode() + b'\n')
+                    await self._writer.drain()
+                    line = await asyncio.wait_for(self._reader.readline(), self.timeout)
+                    if not line:
+                        raise ConnectionError('The owner process closed the connection')
+                    return json.loads(line)
+                except (OSError, asyncio.TimeoutError):
+                    if self._writer is not None:
+                        self._writer.close()
+                    self._reader = self._writer = None
+                    if attempt:
+                        raise
+
+    async def call_alone(self, message: dict, timeout: float) -> dict:
+        '''Send one request on a connection of its own, for requests that take
+            a while (a batch) and shouldn't hold up the shared connection
+        '''
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        try:
+            writer.write(json.dumps(message).encode() + b'\n')
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), timeout)
+            if not line:
+                raise ConnectionError('The owner process closed the connection')
+            return json.loads(line)
+        finally:
+            writer.close()
+
+    def send(self, message: dict, description: str):
+        '''Send message from the background loop without waiting for the answer'''
+        def done(reply):
+            if not reply or not reply.get('ok'):
+                logging.error('%s was not accepted by the owner process: %s', description,
+                              reply.get('error') if reply else 'no answer', extra=RATE_LIMITED)
+        submit(self.call(message), done)
+
+class SharedSnapshotPoller:
+    '''Worker side stand-in for PoolDataPoller.
+        Follows the files the owner's SnapshotPublisher writes instead of
+        fetching /all, with the owner's version numbers, so a browser can be
+        served by any worker from one tick to the next. Listeners are called
+        in this process for every new version it sees.
+    '''
+    def __init__(self, name: str, directory: str, owner: OwnerClient, interval: float,
+                 check_interval: float = 0.25, touch_interval: float = 5):
+        self.name = name
+        self.directory = directory
+        self.owner = owner
+        self.interval = interval
+        self.check_interval = check_interval
+        self.touch_interval = touch_interval
+        self._snapshot = PoolSnapshot()
+        self._changesets = []
+        self._stamps = {}
+        self._listeners = []
+        self._thread_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._last_forwarded_touch = 0
+        # Pending command overlays and errors, as published by the owner
+        self.pending = {}
+        self.error_seq = 0
+        self.errors = []
+        # Poll statistics of the owner's poller
+        self.last_attempt = None
+        self.last_success = None
+        self.last_latency = None
+        self.consecutive_failures = 0
+        self.last_client_seen = None
+        self._stats = {
+            'fetch_latency': None, 'consecutive_failures': 0, 'total_failures': 0, 'total_polls': 0,
+            'unchanged_polls': 0, 'effective_interval': interval, 'schedule_reason': 'owner', 'circuit_open': False
+        }
+
+    @property
+    def snapshot(self) -> PoolSnapshot:
+        return self._snapshot
+
+    def changes_since(self, version):
+        return changes_since(self._changesets, version)
+
+    @property
+    def data(self) -> dict:
+        return self._snapshot.data
+
+    @property
+    def view(self) -> PoolView:
+        return self._snapshot.view
+
+    def _changed(self, path: str) -> bool:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if self._stamps.get(path) == stamp:
+            return False
+        self._stamps[path] = stamp
+        return True
+
+    def refresh(self):
+        '''Load whatever the owner wrote since the last call'''
+        with self._refresh_lock:
+            status_file = status_path(self.directory, self.name)
+            if self._changed(status_file):
+                with open(status_file, 'rb') as f:
+                    stats = json_loads(f.read())
+                self.last_attempt = _datetime(stats['last_attempt'])
+                self.last_success = _datetime(stats['last_success'])
+                self.last_latency = stats['fetch_latency']
+                self.consecutive_failures = stats['consecutive_failures']
+                self._stats = stats
+            snapshot_file = snapshot_path(self.directory, self.name)
+            if not self._changed(snapshot_file):
+                return
+            with open(snapshot_file, 'rb') as f:
+                document = json_loads(f.read())
+            current = self._snapshot
+            if document['version'] == current.version:
+                return
+            data = document['data']
+            if data == current.data:
+                # A republish for a command: same readings, new overlays
+                view = current.view
+            else:
+                view = PoolView.from_payload(data) if data else None
+            changes = document['changes']
+            self.pending = {(kind, target): value for kind, target, value in document['pending']}
+            self.error_seq = document['error_seq']
+            self.errors = [tuple(error) for error in document['errors']]
+            # Workers may skip versions, so the owner sends its recent changesets
+            self._changesets = [
+                (version, None if paths is None else dict.fromkeys(paths)) for version, paths in document['recent_changes']
+            ]
+            self._snapshot = PoolSnapshot(
+                document['version'], data, _datetime(document['fetched_at']),
+                None if changes is None else dict.fromkeys(changes), view
+            )
+        self._notify(self._snapshot)
+
+    def add_listener(self, listener):
+        '''Call listener(snapshot) for every new version this worker sees'''
+        self._listeners.append(listener)
+
+    def _notify(self, snapshot):
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception:
+                logging.exception('Snapshot listener %s failed', listener, extra=RATE_LIMITED)
+
+    def touch(self):
+        '''A page is reading this data; tell the owner, at most every touch_interval seconds'''
+        now = time.monotonic()
+        self.last_client_seen = now
+        self.start()
+        if now - self._last_forwarded_touch > self.touch_interval:
+            self._last_forwarded_touch = now
+            self.owner.send({'op': 'touch', 'installation': self.name}, f'Touch of {self.name}')
+
+    def start(self):
+        '''Start following the owner's files. Safe to call more than once.'''
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            # Pages built right after startup already get what the owner has
+            self._refresh_logged()
+            self._thread = threading.Thread(target=self._run, name='shared-snapshot-reader', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            self._refresh_logged()
+
+    def _refresh_logged(self):
+        try:
+            self.refresh()
+        except (OSError, ValueError, KeyError):
+            logging.warning('Could not read the shared snapshot of %s', self.name, exc_info=True, extra=RATE_LIMITED)
+
+    def is_stale(self, stale_interval) -> bool:
+        '''True when the owner's last successful fetch is older than stale_interval'''
+        if self.last_success is None:
+            return True
+        return bool((datetime.now() - self.last_success) > stale_interval)
+
+    def stats(self) -> dict:
+        return dict(self._stats, version=self._snapshot.version, last_attempt=self.last_attempt, last_success=self.last_success)
+
+class SharedStateStore:
+    '''Worker side stand-in for PoolStateStore.
+        Pending command overlays and errors live in the owner's state store
+        and arrive with its snapshots, so every worker shows the same ones.
+    '''
+    def __init__(self, poller: SharedSnapshotPoller):
+        self.poller = poller
+
+    def value(self, key: tuple, polled_value):
+        '''Value to display for key: the pending command's, else the polled one'''
+        return self.poller.pending.get(key, polled_value)
+
+    def reconcile(self, snapshot=None):
+        '''The owner reconciles commands against its own polls'''
+
+    def command_finished(self, key: tuple, value, success: bool):
+        '''Results are handled by the owner and arrive with its snapshots'''
+
+    def errors_since(self, seq):
+        '''Messages newer than seq, plus the sequence number to ask with next time'''
+        error_seq = self.poller.error_seq
+        if seq is None:
+            return error_seq, []
+        return error_seq, [message for error, message in self.poller.errors if error > seq]
+
+class WorkerInstallation(Installation):
+    '''An Installation in a web worker process.
+        Reads the owner's snapshots instead of polling and forwards commands
+        to the owner, so the bridge sees one client however many workers
+        there are. History is read from the owner's database.
+    '''
+    def __init__(self, name: str, api_url: str, poll_interval: float, directory: str, owner: OwnerClient):
+        self.directory = directory
+        self.owner = owner
+        super().__init__(name, api_url, poll_interval)
+
+    def _create_poller(self, poll_interval: float, schedule):
+        return SharedSnapshotPoller(self.name, self.directory, self.owner, poll_interval)
+
+    def _create_state_store(self, poll_interval: float):
+        return SharedStateStore(self.poller)
+
+    def enable_history(self, path: str, tariff, max_gap: float):
+        '''Read history and pump energy from the database the owner writes'''
+        self.history = HistoryStore(path)
+        self.history_charts = HistoryCharts(self.history)
+        self.energy = EnergyMeter(self.history, tariff, max_gap=max_gap)
+
+    def send_circuit_command(self, key, circuit_id, new_state, description):
+        self.owner.send({
+            'op': 'circuit', 'installation': self.name, 'key': list(key),
+            'circuit_id': circuit_id, 'state': new_state, 'description': description
+        }, description)
+
+    def run_batch(self, operations, stop_on_failure: bool = True):
+        '''Have the owner run the batch; a Future of its per-operation results'''
+        async def forward():
+            reply = await self.owner.call_alone({
+                'op': 'batch', 'installation': self.name, 'stop_on_failure': stop_on_failure,
+                'operations': [operation.as_dict() for operation in operations]
+            }, timeout=120)
+            if not reply.get('ok'):
+                raise RuntimeError(reply.get('error', 'The owner process rejected the batch'))
+            return reply['results']
+        return submit(forward())
+
+    def send_heater_command(self, key, value, description):
+        self.owner.send({
+            'op': 'heater', 'installation': self.name, 'key': list(key), 'value': value, 'description': description
+        }, description)
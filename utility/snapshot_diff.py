@@ -0,0 +1,56 @@
+import re
+
+# Sentinel for a value that is only present on one side of a diff
+MISSING = object()
+# Path segments: dotted keys and [n] list indexes
+_SEGMENT = re.compile(r'\[[^\]]*\]|[^.\[]+')
+
+def diff_snapshots(old, new, path: str = '') -> dict:
+    '''Compare two ScreenLogic payloads and return the changed leaf paths.
+        Paths use dotted keys and [n] list indexes, e.g.
+        status.bodies[0].waterTemp or status.pumps.0.pumpWatts.
+        The result maps each path to an (old, new) tuple; keys that only
+        exist on one side use MISSING for the other value.
+    '''
+    changes = {}
+    _diff(old, new, path, changes)
+    return changes
+
+def _diff(old, new, path, changes):
+    if old is new:
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old.keys() | new.keys():
+            _diff(old.get(key, MISSING), new.get(key, MISSING), f'{path}.{key}' if path else str(key), changes)
+    elif isinstance(old, list) and isinstance(new, list):
+        for i in range(max(len(old), len(new))):
+            _diff(
+                old[i] if i < len(old) else MISSING,
+                new[i] if i < len(new) else MISSING,
+                f'{path}[{i}]', changes
+            )
+    elif old != new or type(old) is not type(new):
+        changes[path] = (old, new)
+
+def changed_under(changes: dict, *prefixes: str) -> bool:
+    '''True if any changed path is at, below or above one of the given paths.
+        A change above a path (e.g. all of 'status' replaced) covers it too.
+        [*] matches any list index, e.g. status.bodies[*].waterTemp.
+    '''
+    prefixes = [_segments(prefix) for prefix in prefixes]
+    for path in changes:
+        path = _segments(path)
+        for prefix in prefixes:
+            if _overlaps(path, prefix):
+                return True
+    return False
+
+def _segments(path: str) -> list:
+    return _SEGMENT.findall(path)
+
+def _overlaps(path: list, other: list) -> bool:
+    '''True when one path is the other or lies below it'''
+    return all(
+        a == b or (a == '[*]' and b.startswith('[')) or (b == '[*]' and a.startswith('['))
+        for a, b in zip(path, other)
+    )
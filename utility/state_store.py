@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from utility.async_runner import call_off_loop
+from utility.present import body_active, body_heat_mode, body_setpoint, circuit_state
+
+# Where the polled value for each kind of overlay key lives in the payload.
+# Keys are (kind, target) tuples, e.g. ('circuit', 7) or ('setpoint', 'spa').
+POLLED_VALUES = {
+    'circuit': circuit_state,
+    'body': body_active,
+    'setpoint': body_setpoint,
+    'mode': body_heat_mode
+}
+PAYLOAD_PATHS = {
+    'circuit': 'controllerConfig.bodyArray[*].state',
+    'body': 'status.bodies[*].active',
+    'setpoint': 'status.bodies[*].heater.setpoint.current',
+    'mode': 'status.bodies[*].modeCode'
+}
+
+@dataclass
+class PendingCommand:
+    key: tuple
+    value: object
+    previous: object
+    description: str
+    deadline: float
+    # Set when the backend accepted this command; polls only confirm finished commands
+    finished: bool = False
+
+class PoolStateStore:
+    '''Polled pool state plus overlays for commands that are still in flight.
+        expect() makes the UI show a commanded value straight away. The
+        overlay is dropped once its command has finished and a polled
+        snapshot shows the value (confirmed), or rolled back with an error
+        when the command fails or is not confirmed before its deadline. A
+        poll that happens to show the value while the command is still on
+        its way (e.g. an earlier command for the same key) confirms nothing.
+    '''
+    def __init__(self, poller, confirm_timeout: float = 15, max_errors: int = 20):
+        self.poller = poller
+        self.confirm_timeout = confirm_timeout
+        self._pending = {}
+        self._errors = deque(maxlen=max_errors)
+        self._error_seq = 0
+        self._lock = threading.Lock()
+        poller.add_listener(self.reconcile)
+
+    def value(self, key: tuple, polled_value):
+        '''Value to display for key: the pending command's, else the polled one'''
+        pending = self._pending.get(key)
+        return polled_value if pending is None else pending.value
+
+    def expect(self, key: tuple, value, description: str):
+        '''Record a command that was just sent, replacing any older one for key'''
+        kind, target = key
+        with self._lock:
+            older = self._pending.get(key)
+            if older:
+                previous = older.previous
+            else:
+                previous = POLLED_VALUES[kind](self.poller.view, target) if self.poller.view else None
+            self._pending[key] = PendingCommand(key, value, previous, description, time.monotonic() + self.confirm_timeout)
+        # Let every other page show the pending value too
+        call_off_loop(self.poller.republish, {PAYLOAD_PATHS[kind]: (previous, value)})
+
+    def command_finished(self, key: tuple, value, success: bool):
+        '''Called when the backend answered; failures roll back immediately'''
+        with self._lock:
+            pending = self._pending.get(key)
+            # A newer command for the same key owns the overlay now
+            if pending is None or pending.value != value:
+                pending = None
+            elif success:
+                pending.finished = True
+        if success:
+            # The data may already show it; otherwise confirm quickly
+            # instead of waiting for the next interval
+            self.reconcile()
+            self.poller.burst()
+        elif pending is not None:
+            self._roll_back([pending], 'was rejected by the controller')
+
+    def reconcile(self, snapshot=None):
+        '''Drop overlays the polled data confirms and roll back expired ones'''
+        view = (snapshot or self.poller.snapshot).view
+        if view is None:
+            return
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for key, pending in list(self._pending.items()):
+                kind, target = key
+                if pending.finished and POLLED_VALUES[kind](view, target) == pending.value:
+                    del self._pending[key]
+                elif now > pending.deadline:
+                    expired.append(pending)
+        if expired:
+            self._roll_back(expired, 'was not confirmed by the controller')
+
+    def _roll_back(self, commands, reason):
+        changes = {}
+        with self._lock:
+            for pending in commands:
+                if self._pending.get(pending.key) is not pending:
+                    continue
+                del self._pending[pending.key]
+                self._add_error(f'{pending.description} {reason}')
+                changes[PAYLOAD_PATHS[pending.key[0]]] = (pending.value, pending.previous)
+        if changes:
+            call_off_loop(self.poller.republish, changes)
+
+    def report_error(self, message: str):
+        '''Show an error on every page for a command with no overlay to roll back'''
+        with self._lock:
+            self._add_error(message)
+        # A new version with no changes, so pages pick the error up straight away
+        call_off_loop(self.poller.republish, {})
+
+    def _add_error(self, message: str):
+        self._error_seq += 1
+        self._errors.append((self._error_seq, message))
+        logging.error(message)
+
+    def pending_values(self) -> list:
+        '''[(key, value)] of the commands still in flight'''
+        with self._lock:
+            return [(key, pending.value) for key, pending in self._pending.items()]
+
+    def recent_errors(self) -> tuple:
+        '''(latest sequence number, [(seq, message)]) of the errors still kept'''
+        with self._lock:
+            return self._error_seq, list(self._errors)
+
+    def errors_since(self, seq):
+        '''Messages newer than seq, plus the sequence number to ask with next time'''
+        with self._lock:
+            if seq is None:
+                return self._error_seq, []
+            messages = [message for error_seq, message in self._errors if error_seq > seq]
+            return self._error_seq, messages
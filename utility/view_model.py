@@ -0,0 +1,177 @@
+from dataclasses import dataclass
+from typing import Optional
+
+# controllerConfig.bodyArray 'interface' values the UI cares about
+INTERFACE_FEATURE = 2
+INTERFACE_LIGHT = 3
+
+class InvalidPayload(ValueError):
+    '''The /all payload is missing something the UI needs'''
+
+@dataclass(frozen=True)
+class Meta:
+    __slots__ = ('server_name', 'freeze_mode', 'service_mode', 'cleaner_delay', 'lights_on', 'air_temp', 'temp_scale')
+    server_name: str
+    freeze_mode: bool
+    service_mode: bool
+    cleaner_delay: bool
+    lights_on: bool
+    air_temp: int
+    temp_scale: str
+
+@dataclass(frozen=True)
+class Circuit:
+    __slots__ = ('circuit_id', 'name', 'name_index', 'interface', 'function', 'state')
+    circuit_id: int
+    name: str
+    name_index: int
+    interface: int
+    function: int
+    state: bool
+
+@dataclass(frozen=True)
+class HeaterSettings:
+    '''What a body's heater controls render, kept apart from the
+        fast-changing body readings so the controls only rebuild when these do.
+    '''
+    __slots__ = ('body_name', 'temp_scale', 'options', 'mode_code', 'setpoint_min', 'setpoint_max', 'setpoint_current')
+    body_name: str
+    temp_scale: str
+    # Heating equipment present, e.g. ('heater', 'solar'), in payload order
+    options: tuple
+    mode_code: int
+    setpoint_min: Optional[int]
+    setpoint_max: Optional[int]
+    setpoint_current: Optional[int]
+
+@dataclass(frozen=True)
+class Body:
+    __slots__ = (
+        'name', 'circuit_id', 'interface_id', 'active', 'water_temp', 'temp_scale',
+        'heater_active', 'heater_present', 'heater'
+    )
+    name: str
+    circuit_id: int
+    interface_id: int
+    active: bool
+    water_temp: int
+    temp_scale: str
+    heater_active: bool
+    # True when a (non-solar) heater is installed
+    heater_present: bool
+    heater: HeaterSettings
+
+@dataclass(frozen=True)
+class Pump:
+    __slots__ = ('key', 'type_name', 'running', 'rpm', 'watts')
+    key: str
+    type_name: str
+    running: bool
+    rpm: int
+    watts: int
+
+class PoolView:
+    '''Parsed, read-only view of one /all payload.
+        Built once per snapshot; UI builders and callbacks use its records
+        and indexes instead of walking the raw JSON.
+    '''
+    __slots__ = (
+        'meta', 'bodies', 'circuits', 'pumps',
+        'bodies_by_name', 'circuits_by_id', 'circuits_by_interface', 'body_controls', 'pumps_by_key'
+    )
+
+    def __init__(self, meta: Meta, bodies: tuple, circuits: tuple, pumps: tuple):
+        self.meta = meta
+        self.bodies = bodies
+        self.circuits = circuits
+        self.pumps = pumps
+        self.bodies_by_name = {body.name: body for body in bodies}
+        self.circuits_by_id = {circuit.circuit_id: circuit for circuit in circuits}
+        by_interface = {}
+        for circuit in circuits:
+            by_interface.setdefault(circuit.interface, []).append(circuit)
+        self.circuits_by_interface = {interface: tuple(group) for interface, group in by_interface.items()}
+        # A body card shows the other circuits on its interface, in nameIndex order
+        self.body_controls = {
+            body.name: tuple(sorted(
+                (circuit for circuit in self.circuits_by_interface.get(body.interface_id, ())
+                    if circuit.name.lower() != body.name),
+                key=lambda circuit: circuit.name_index
+            ))
+            for body in bodies
+        }
+        self.pumps_by_key = {pump.key: pump for pump in pumps}
+
+    @classmethod
+    def from_payload(cls, pool_data: dict) -> 'PoolView':
+        '''Parse and validate an /all payload'''
+        try:
+            meta = pool_data['meta']
+            return cls(
+                Meta(
+                    server_name=meta['server']['name'],
+                    freeze_mode=bool(meta['freezeMode']),
+                    service_mode=bool(meta['serviceMode']),
+                    cleaner_delay=bool(meta['cleanerDelay']),
+                    lights_on=bool(meta['lightsOn']),
+                    air_temp=meta['airTemp'],
+                    temp_scale=meta['tempScale']
+                ),
+                tuple(_parse_body(body) for body in pool_data['status']['bodies']),
+                tuple(_parse_circuit(circuit) for circuit in pool_data['controllerConfig']['bodyArray']),
+                tuple(_parse_pump(key, pump) for key, pump in pool_data['status'].get('pumps', {}).items())
+            )
+        except (KeyError, TypeError, AttributeError) as err:
+            raise InvalidPayload(f'Unexpected /all payload, missing {err}') from err
+
+    def body(self, name: str) -> Optional[Body]:
+        return self.bodies_by_name.get(name)
+
+    def circuit(self, circuit_id: int) -> Optional[Circuit]:
+        return self.circuits_by_id.get(circuit_id)
+
+    def interface_circuits(self, interface: int) -> tuple:
+        return self.circuits_by_interface.get(interface, ())
+
+def _parse_body(body: dict) -> Body:
+    heater = body.get('heater', {})
+    equipment = heater.get('equipPresent', {})
+    setpoint = heater.get('setpoint', {})
+    return Body(
+        name=body['name'],
+        circuit_id=body.get('circuitId'),
+        interface_id=body['interfaceId'],
+        active=bool(body['active']),
+        water_temp=body['waterTemp'],
+        temp_scale=body['tempScale'],
+        heater_active=bool(heater['active']),
+        heater_present=bool(equipment.get('heater')),
+        heater=HeaterSettings(
+            body_name=body['name'],
+            temp_scale=body['tempScale'],
+            options=tuple(key for key, present in equipment.items() if present and not key.endswith('isheater')),
+            mode_code=body.get('modeCode', 0),
+            setpoint_min=setpoint.get('min'),
+            setpoint_max=setpoint.get('max'),
+            setpoint_current=setpoint.get('current')
+        )
+    )
+
+def _parse_circuit(circuit: dict) -> Circuit:
+    return Circuit(
+        circuit_id=circuit['circuitId'],
+        name=circuit['name'],
+        name_index=circuit.get('nameIndex'),
+        interface=circuit['interface'],
+        function=circuit.get('function'),
+        state=bool(circuit.get('state'))
+    )
+
+def _parse_pump(key: str, pump: dict) -> Pump:
+    return Pump(
+        key=key,
+        type_name=pump.get('pumpTypeName'),
+        running=bool(pump.get('isRunning')),
+        rpm=pump.get('pumpRPMs'),
+        watts=pump.get('pumpWatts')
+    )